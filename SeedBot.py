@@ -1,27 +1,133 @@
-import pyautogui
 import cv2
-import numpy as np
+import math
 import time
 import os
 import re
 import shutil
-from PIL import Image
+import traceback
 import pytesseract
 import datetime
-from mousekey import MouseKey
-from tabulate import tabulate
-from collections import defaultdict
+from backends import FramePool, LiveBackend
+from matcher import RarityMatcher
+from ocr import OcrCache, OcrPool
+from digits import DigitReader
+from settle import SettleWaiter
+from inputs import InputLayer
+from scroll import ScrollTracker
+from scanstate import (BUYING, CLOSING, READING, SCROLLING, SELECTING, Checkpoint, LostPosition,
+                       ScanMachine, Watchdog)
+from pipeline import ScanPipeline
+from layout import ShopLayout
+from names import load_seed_names, name_key
+from tracking import SeedTotals, TrackingStore
+from recorder import DebugRecorder
+from scheduler import RestockScheduler
+from calibration import CalibrationCache, detect, scale_templates
+from metrics import Metrics
 
-# --- MOUSEKEY SETUP ---
-mkey = MouseKey()
-mkey.enable_failsafekill('ctrl+e')  # Emergency kill: press ctrl+e
+# --- SCREEN/INPUT BACKEND ---
+# Created on first use so the bot can be driven headlessly (see backends.py).
+backend = None
+
+def get_backend():
+    global backend
+    if backend is None:
+        backend = LiveBackend(failsafe_hotkey='ctrl+e')  # Emergency kill: press ctrl+e
+    return backend
+
+def set_backend(new_backend):
+    """Route all captures and clicks through new_backend"""
+    global backend
+    backend = new_backend
+    if input_layer is not None:
+        input_layer.position = None  # a new screen, the cursor could be anywhere
+
+# --- OCR ---
+ocr_pool = None
+
+def get_ocr_pool():
+    global ocr_pool
+    if ocr_pool is None:
+        cache = OcrCache(
+            max_entries=OCR_CACHE_SIZE,
+            path=OCR_CACHE_FILE,
+            perceptual_configs=[NAME_OCR_CONFIG],
+        )
+        ocr_pool = OcrPool(workers=OCR_WORKERS, cache=cache)
+        ocr_pool.warm_up([NAME_OCR_CONFIG, STOCK_OCR_CONFIG, RESTOCK_OCR_CONFIG])
+    return ocr_pool
+
+def save_ocr_cache():
+    """Print OCR cache statistics and persist it so the next start is warm"""
+    if ocr_pool is None or ocr_pool.cache is None:
+        return
+    stats = ocr_pool.cache.stats()
+    print(f"OCR cache: {stats['entries']} entries, {stats['hits']} hits, "
+          f"{stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+    ocr_pool.cache.save()
+
+digit_reader = None
+digit_reader_loaded = False
+
+def get_digit_reader():
+    """Glyph-template reader for stock counts and the timer, or None if no glyphs are bootstrapped"""
+    global digit_reader, digit_reader_loaded
+    if not digit_reader_loaded:
+        digit_reader = DigitReader.load(DIGIT_GLYPHS_FILE)
+        digit_reader_loaded = True
+    return digit_reader
+
+def read_digits(img):
+    """Text of the first word of a numeric crop, or None if the glyph reader isn't confident"""
+    reader = get_digit_reader()
+    if reader is None:
+        return None
+    text, confidence = reader.read(img)
+    if confidence < DIGIT_MIN_CONFIDENCE:
+        return None
+    return text
 
 # --- CONFIGURATION ---
 pytesseract.pytesseract.tesseract_cmd = r'D:\Tesseract\tesseract.exe'
 
+# OCR settings: worker threads for the resident OCR pool and the tesseract
+# config used for each field
+OCR_WORKERS = 2
+NAME_OCR_CONFIG = '--psm 7'
+STOCK_OCR_CONFIG = '--psm 7 digits'
+RESTOCK_OCR_CONFIG = '--psm 7 -c tessedit_char_whitelist=0123456789:'
+# Name and stock reads are cached by crop hash; set OCR_CACHE_FILE to None to
+# keep the cache in memory only
+OCR_CACHE_SIZE = 2048
+OCR_CACHE_FILE = "ocr_cache.json"
+
+# Seed names as read are resolved to the closest canonical name: those listed
+# in SEED_NAMES_FILE and those seen SEED_NAMES_MIN_SEEN times in the tracking
+# history, within SEED_NAME_MAX_EDIT_RATIO edits per character. Names that
+# don't resolve are kept as read and listed after each scan; only those more
+# than SEED_NAME_MAX_EDIT_RATIO away from every canonical name can become one.
+SEED_NAMES_FILE = "seed_names.txt"
+SEED_NAMES_MIN_SEEN = 3
+SEED_NAME_MAX_EDIT_RATIO = 0.25
+
 BUY_RARITIES = ["Divine", "Mythical"]
 TEMPLATE_FOLDER = "templates"
 
+# Stock counts and the restock timer are read with glyph templates (built with
+# `python -m digits bootstrap debug`), falling back to Tesseract below this
+# confidence
+DIGIT_GLYPHS_FILE = os.path.join(TEMPLATE_FOLDER, "glyphs.npz")
+DIGIT_MIN_CONFIDENCE = 0.75
+
+# All screen coordinates below are measured on a REFERENCE_SCREEN display. On
+# the first start on a display, the bot finds the shop's scale and position by
+# matching the rarity templates at several sizes (open the shop with the list
+# scrolled to the top), rescales the coordinates and templates, and caches the
+# result per screen size in CALIBRATION_FILE. Delete the file to recalibrate.
+CALIBRATE = True
+REFERENCE_SCREEN = (1920, 1080)
+CALIBRATION_FILE = "calibration.json"
+
 # Global bounds for seed detection
 MIN_Y = 494
 MAX_Y = 900
@@ -29,39 +135,196 @@ MAX_Y = 900
 # Define the shop region - full region for scanning
 FULL_SHOP_REGION = (600, 250, 750, 650)  # (x, y, w, h) of the shop window
 
-# Point to click to scroll back to top
+# Point to click to scroll back to top. The list's position is tracked by
+# registering consecutive captures, so only as many clicks as it takes to get
+# back to the top are made (rows / SCROLL_ROWS_PER_CLICK, plus one to be sure);
+# SCROLL_UP_CLICKS when the position is lost.
 SCROLL_UP_POINT = (964, 330)
 SCROLL_UP_CLICKS = 18
+SCROLL_ROWS_PER_CLICK = 1
 
 # Restock time box coordinates
 RESTOCK_TIME_REGION = (855, 246, 97, 39)  # (x, y, width, height)
 
+# The restock timer is read RESTOCK_SAMPLES times and readings more than
+# RESTOCK_TOLERANCE seconds off the others are dropped. The bot wakes up
+# RESTOCK_PREWARM_LEAD seconds before the restock and scans as soon as the
+# timer resets (or RESTOCK_LATE_LIMIT seconds after it should have).
+RESTOCK_SAMPLES = 5
+RESTOCK_SAMPLE_INTERVAL = 0.25
+RESTOCK_TOLERANCE = 1.5
+RESTOCK_PREWARM_LEAD = 3.0
+RESTOCK_POLL_INTERVAL = 0.1
+RESTOCK_LATE_LIMIT = 10.0
+RESTOCK_DEFAULT_WAIT = 60  # when the timer can't be read at all
+
 FIRST_SEED_SLOT = (1183, 519)  # Center of the first rarity box (absolute screen coordinates)
 MAX_SEEDS = 30
 NEXT_SEED_OFFSET_Y = 150  # Distance to move down for selecting the next seed
 
+# After each click the bot waits for the UI to stop animating instead of
+# sleeping a fixed time: SETTLE_REGION (the rarity box column) is polled until
+# it stays unchanged for SETTLE_STABLE_TIME seconds, at most SETTLE_TIMEOUT
+SETTLE_REGION = (1085, 470, 200, 430)
+SETTLE_MIN_WAIT = 0.05
+SETTLE_STABLE_TIME = 0.08
+SETTLE_TIMEOUT = 1.5
+
+# How the cursor gets to a click: "natural" moves it there in small steps like
+# a person every time, "fast" teleports it and sends the clicks in one batch,
+# "auto" taps repeat clicks within INPUT_FAST_DISTANCE pixels of the cursor
+# (buy button, scroll arrow) and moves naturally for everything else.
+INPUT_MODE = "auto"
+INPUT_FAST_DISTANCE = 8
+INPUT_TAP_INTERVAL = 0.05  # between repeated fast clicks
+
 # Offsets relative to the center of the rarity box (measured in screen coordinates)
 BUY_BUTTON_OFFSET = (-421, 112)
 STOCK_BOX_OFFSET = (-312, -58)
 
+# Purchases: buy clicks per burst before the stock counter is re-read, cursor
+# delay of each click, the most seeds bought per visit, and how many re-reads
+# without the stock dropping (out of currency) end the purchase
+PURCHASE_BURST = 5
+PURCHASE_CLICK_DELAY = 0.05
+PURCHASE_MAX = 50
+PURCHASE_STALL_READS = 2
+
 # For OCR cropping (relative to rarity box center, adjust as needed)
 SEED_ENTRY_OFFSET = (-576, -178)
 SEED_ENTRY_SIZE = (682, 219)
 NAME_OFFSET = (-364, -172, 457, 63)
 STOCK_OFFSET = (-367, -75, 149, 36)
 
+# Name and stock text of a collapsed (not selected) entry, relative to its
+# rarity box center. Used by the multi-entry scan, which reads every visible
+# entry from one capture and only clicks the ones it needs to buy.
+ROW_NAME_OFFSET = (-565, -52, 430, 44)
+ROW_STOCK_OFFSET = (-565, 0, 160, 36)
+MULTI_ENTRY_SCAN = True
+# Worker threads reading names and stock while the multi-entry scan keeps clicking
+RECOGNITION_WORKERS = 1
+
+# Targeted scan: once full scans have confirmed the seed order
+# LAYOUT_MIN_CONFIRMATIONS times (stored in LAYOUT_FILE), jump straight to the
+# seeds in BUY_RARITIES instead of walking the whole list. A full scan still
+# runs every TARGETED_FULL_SCAN_EVERY cycles to keep the stock history complete.
+TARGETED_SCAN = True
+LAYOUT_FILE = "shop_layout.json"
+LAYOUT_MIN_CONFIRMATIONS = 2
+TARGETED_FULL_SCAN_EVERY = 10
+
+# The single-entry scan is a state machine that checkpoints every row read and
+# every seed bought. When a state fails, or runs longer than its limit in
+# SCAN_STATE_LIMITS (seconds), the bot finds out where the list is from one
+# capture and resumes from the next row. It gives the scan up after
+# SCAN_MAX_RECOVERIES failures in a row without getting any further.
+SCAN_STATE_LIMITS = {"selecting": 20, "reading": 5, "buying": 30, "closing": 5, "scrolling": 15}
+SCAN_MAX_RECOVERIES = 3
+
+# Tracking data is appended to this SQLite database after every scan instead
+# of rewriting the CSV files; they are exported from it on exit or with
+# `python -m tracking export`.
+TRACKING_DB = "seed_tracking.db"
+
+# The last DEBUG_BUFFER_FRAMES captures and crops (up to DEBUG_BUFFER_MB) are
+# kept in memory and only written to DEBUG_FOLDER when something goes wrong, or
+# all of them as they are taken with DEBUG_MODE. The folder is cleared at
+# startup and keeps only the last DEBUG_FOLDER_MAX_FILES images written.
+DEBUG_FOLDER = "debug"
+DEBUG_BUFFER_FRAMES = 100
+DEBUG_BUFFER_MB = 128
+DEBUG_FOLDER_MAX_FILES = 1000
+
+# Captures are written into reused buffers instead of a new image each time;
+# this many are kept per capture size, enough for the pages still being read.
+CAPTURE_BUFFERS = 16
+
+# Stage timings (capture, matching, OCR, clicks, ...) and counters, printed
+# after every scan and exported as a trace (`python -m metrics chrome
+# trace.jsonl trace.json` to open it in chrome://tracing) and a Prometheus
+# text file. Costs next to nothing when disabled.
+METRICS_ENABLED = False
+METRICS_TRACE_FILE = "trace.jsonl"
+METRICS_PROMETHEUS_FILE = "seedbot.prom"
+
 DEBUG_MODE = False
 
+metrics = Metrics(enabled=METRICS_ENABLED)
+frame_pool = FramePool(max_buffers=CAPTURE_BUFFERS)
+
 # --- TRACKING DATA ---
-seeds_in_stock = []  # Will contain [timestamp, name, rarity, stock]
-seeds_purchased = []  # Will contain [timestamp, name, rarity]
+# Records not yet written to the tracking store; flush_tracking_data() empties them.
+seeds_in_stock = []  # Will contain Observation(timestamp, name, rarity, stock)
+seeds_purchased = []  # Will contain Purchase(timestamp, name, rarity)
+
+tracking_store = None
+seed_totals = None
+
+def get_tracking_store():
+    global tracking_store
+    if tracking_store is None:
+        tracking_store = TrackingStore(TRACKING_DB)
+    return tracking_store
+
+def get_seed_totals():
+    """Running per-seed totals, starting from what the tracking store already holds"""
+    global seed_totals
+    if seed_totals is None:
+        store = get_tracking_store()
+        seed_totals = SeedTotals()
+        seed_totals.load(store.stock_totals(), store.purchase_totals())
+    return seed_totals
+
+seed_names = None
+
+def get_seed_names():
+    """Canonical seed names from SEED_NAMES_FILE and the tracking history"""
+    global seed_names
+    if seed_names is None:
+        seed_names = load_seed_names(SEED_NAMES_FILE, get_tracking_store().name_counts(),
+                                      max_edit_ratio=SEED_NAME_MAX_EDIT_RATIO, min_seen=SEED_NAMES_MIN_SEEN)
+    return seed_names
+
+def canonical_name(text):
+    """The canonical seed name for an OCR read, or the read itself (stripped) if it doesn't resolve"""
+    return get_seed_names().resolve(text).name
+
+def seed_id(name, rarity):
+    """Key a seed is deduplicated on within a scan"""
+    return f"{name_key(name)}|{rarity}"
+
+def record_observation(name, rarity, stock):
+    """Record a seed seen in stock"""
+    metrics.count("seeds_scanned")
+    seeds_in_stock.append(get_seed_totals().observation(time.time(), name, rarity, stock))
+
+def discard_observations(start):
+    """Take back the observations recorded after the first start in seeds_in_stock"""
+    totals = get_seed_totals()
+    for observation in seeds_in_stock[start:]:
+        totals.retract(observation)
+    del seeds_in_stock[start:]
+
+def record_purchase(name, rarity):
+    """Record one seed bought"""
+    metrics.count("purchases")
+    seeds_purchased.append(get_seed_totals().purchase(time.time(), name, rarity))
+
+def flush_tracking_data():
+    """Append the rows collected since the last flush to the tracking store"""
+    if not seeds_in_stock and not seeds_purchased:
+        return
+    get_tracking_store().append(seeds_in_stock, seeds_purchased)
+    del seeds_in_stock[:]
+    del seeds_purchased[:]
 
 def clear_debug_folder():
     """Delete everything in the debug folder"""
-    if os.path.exists("debug"):
+    if os.path.exists(DEBUG_FOLDER):
         print("Clearing debug folder...")
-        for file in os.listdir("debug"):
-            file_path = os.path.join("debug", file)
+        for file in os.listdir(DEBUG_FOLDER):
+            file_path = os.path.join(DEBUG_FOLDER, file)
             try:
                 if os.path.isfile(file_path):
                     os.unlink(file_path)
@@ -70,40 +333,115 @@ def clear_debug_folder():
             except Exception as e:
                 print(f"Error deleting {file_path}: {e}")
     else:
-        os.makedirs("debug")
+        os.makedirs(DEBUG_FOLDER)
         print("Created new debug folder.")
 
-def reliable_click(x, y, delay=0.4):
-    mkey.left_click_xy_natural(
-        int(x), int(y),
-        delay=delay,
-        min_variation=-2,
-        max_variation=2,
-        use_every=3,
-        sleeptime=(0.01, 0.015),
-        print_coords=False,
-        percent=90,
-    )
-    time.sleep(0.4)  # Wait after click for UI to update
+shop_layout = None
+targeted_scans_since_full = 0
+
+def get_shop_layout():
+    global shop_layout
+    if shop_layout is None:
+        shop_layout = ShopLayout(LAYOUT_FILE, min_confirmations=LAYOUT_MIN_CONFIRMATIONS)
+    return shop_layout
+
+scan_pipeline = None
+
+def get_scan_pipeline():
+    global scan_pipeline
+    if scan_pipeline is None:
+        scan_pipeline = ScanPipeline(workers=RECOGNITION_WORKERS)
+    return scan_pipeline
+
+settle_waiter = None
+
+def get_settle_waiter():
+    global settle_waiter
+    if settle_waiter is None:
+        settle_waiter = SettleWaiter(
+            capture=grab_frame,
+            region=SETTLE_REGION,
+            min_wait=SETTLE_MIN_WAIT,
+            stable_time=SETTLE_STABLE_TIME,
+            timeout=SETTLE_TIMEOUT,
+        )
+    return settle_waiter
+
+input_layer = None
+
+def get_input():
+    global input_layer
+    if input_layer is None:
+        input_layer = InputLayer(
+            get_backend,
+            mode=INPUT_MODE,
+            fast_distance=INPUT_FAST_DISTANCE,
+            tap_interval=INPUT_TAP_INTERVAL,
+        )
+    return input_layer
+
+@metrics.timed("settle")
+def wait_for_ui(label="ui", region=None):
+    """Wait until the UI has stopped animating (see settle.py)"""
+    return get_settle_waiter().wait(label=label, region=region)
+
+def reliable_click(x, y, delay=0.4, label="click", settle_region=None, count=1):
+    check_watchdog()
+    metrics.count("clicks", count)
+    with metrics.span("click"):
+        get_input().click(x, y, delay=delay, count=count)
+    wait_for_ui(label, settle_region)  # Wait after click for UI to update
 
-def click_multiple(x, y, count, delay=0.2):
-    """Click at the same position multiple times"""
-    for i in range(count):
-        reliable_click(x, y, delay=delay)
-        time.sleep(0.1)  # Short delay between clicks
+def click_multiple(x, y, count, delay=0.2, label="click"):
+    """Click at the same position multiple times, waiting for the UI once at the end"""
+    reliable_click(x, y, delay=delay, label=label, count=count)
 
 def click_seed(seed_center):
-    reliable_click(seed_center[0], seed_center[1])
+    reliable_click(seed_center[0], seed_center[1], label="seed")
 
 def click_buy_button(rarity_center):
     x, y = rarity_center
     bx, by = BUY_BUTTON_OFFSET
-    reliable_click(x + bx, y + by)
+    reliable_click(x + bx, y + by, label="buy", settle_region=get_stock_text_region(rarity_center))
 
 def click_stock_box(rarity_center):
     x, y = rarity_center
     sx, sy = STOCK_BOX_OFFSET
-    reliable_click(x + sx, y + sy)
+    reliable_click(x + sx, y + sy, label="close")
+
+def scroll_to_top(rows=None):
+    """Scroll up rows rows of the list, or all the way if rows is None"""
+    if rows is None:
+        clicks = SCROLL_UP_CLICKS
+    elif rows <= 0:
+        return
+    else:
+        clicks = min(SCROLL_UP_CLICKS, math.ceil(rows / SCROLL_ROWS_PER_CLICK) + 1)
+    click_multiple(SCROLL_UP_POINT[0], SCROLL_UP_POINT[1], clicks, label="scroll")
+
+def return_to_top(tracker):
+    """Scroll back to the top from the tracked position and check it got there"""
+    rows = tracker.rows()
+    scroll_to_top(rows)
+    if rows is not None and not tracker.at_top(capture_shop()):
+        print("Not back at the top of the list, scrolling all the way up.")
+        scroll_to_top()
+
+row_pitch = None  # measured distance between collapsed rows, see get_row_pitch()
+
+def get_row_pitch():
+    """Pixels from one collapsed row to the next: measured on the last full scan, else NEXT_SEED_OFFSET_Y"""
+    return row_pitch or NEXT_SEED_OFFSET_Y
+
+def get_scroll_tracker():
+    """A tracker for the list in FULL_SHOP_REGION captures, registering only the list below the header"""
+    viewport_top = max(0, FIRST_SEED_SLOT[1] - NEXT_SEED_OFFSET_Y // 2 - FULL_SHOP_REGION[1])
+    return ScrollTracker(get_row_pitch(), viewport_top=viewport_top)
+
+def get_stock_text_region(rarity_center):
+    """Screen region (x, y, w, h) of the stock text of a selected seed"""
+    dx, dy, w, h = STOCK_OFFSET
+    return (rarity_center[0] + dx, rarity_center[1] + dy, w, h)
 
 def get_stock_box_center(rarity_center):
     x, y = rarity_center
@@ -120,28 +458,46 @@ def safe_crop(img, x, y, w, h):
         return None
     return img[y:y+h, x:x+w]
 
+debug_recorder = None
+
+def get_debug_recorder():
+    global debug_recorder
+    if debug_recorder is None:
+        debug_recorder = DebugRecorder(
+            folder=DEBUG_FOLDER,
+            max_frames=DEBUG_BUFFER_FRAMES,
+            max_bytes=DEBUG_BUFFER_MB * 1024 * 1024,
+            write_all=DEBUG_MODE,
+            max_files=DEBUG_FOLDER_MAX_FILES,
+        )
+    return debug_recorder
+
+def debug_anomaly(reason):
+    """Write the buffered debug frames leading up to a problem"""
+    metrics.count("anomalies")
+    get_debug_recorder().flush(reason)
+
+def grab_frame(region=None):
+    """Capture region as a BGR array, into a pooled buffer when its size is known"""
+    if region is None:
+        return get_backend().grab()
+    x, y, w, h = region
+    return get_backend().grab(region, out=frame_pool.get((int(h), int(w), 3)))
+
 screenshot_counter = 0
 
+@metrics.timed("capture")
 def take_screenshot(region=None, label="screenshot"):
+    """Capture region as a BGR array and keep a copy for the debug recorder"""
     global screenshot_counter
-    img = pyautogui.screenshot(region=region)
-    if not os.path.exists("debug"):
-        os.makedirs("debug")
+    img = grab_frame(region)
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"debug/{label}_{timestamp}_{screenshot_counter}.png"
-    img.save(filename)
+    get_debug_recorder().add(f"{label}_{timestamp}_{screenshot_counter}.png", img)
     screenshot_counter += 1
     return img
 
 def save_debug_image(img, name):
-    if not DEBUG_MODE:
-        return
-    if not os.path.exists("debug"):
-        os.makedirs("debug")
-    if isinstance(img, np.ndarray):
-        cv2.imwrite(f"debug/{name}.png", img)
-    else:
-        img.save(f"debug/{name}.png")
+    get_debug_recorder().add(f"{name}.png", img)
 
 def load_templates():
     templates = {}
@@ -153,27 +509,83 @@ def load_templates():
             print(f"Template not found: {path}")
     return templates
 
+def build_rarity_matcher(templates, threshold=0.85):
+    """Precompile the templates into a matcher restricted to the MIN_Y..MAX_Y band"""
+    band = (MIN_Y - FULL_SHOP_REGION[1], MAX_Y - FULL_SHOP_REGION[1])
+    return RarityMatcher(templates, band=band, threshold=threshold)
+
+rarity_matcher = None
+
+def get_rarity_matcher():
+    """The rarity matcher, decoded and compiled once and kept for the whole session"""
+    global rarity_matcher
+    if rarity_matcher is None:
+        scale = ui_transform.scale if ui_transform else 1.0
+        rarity_matcher = build_rarity_matcher(scale_templates(load_templates(), scale))
+    return rarity_matcher
+
+# How each screen coordinate is rescaled by calibration
+SCREEN_GEOMETRY = {
+    "MIN_Y": "y", "MAX_Y": "y",
+    "FULL_SHOP_REGION": "region", "RESTOCK_TIME_REGION": "region", "SETTLE_REGION": "region",
+    "SCROLL_UP_POINT": "point", "FIRST_SEED_SLOT": "point",
+    "NEXT_SEED_OFFSET_Y": "length",
+    "BUY_BUTTON_OFFSET": "vector", "STOCK_BOX_OFFSET": "vector",
+    "SEED_ENTRY_OFFSET": "vector", "SEED_ENTRY_SIZE": "vector",
+    "NAME_OFFSET": "vector", "STOCK_OFFSET": "vector", "ROW_NAME_OFFSET": "vector", "ROW_STOCK_OFFSET": "vector",
+}
+reference_geometry = None  # the configured values, before calibration
+ui_transform = None
+
+def apply_transform(transform):
+    """Rescale every screen coordinate from the reference display with transform"""
+    global reference_geometry, ui_transform, rarity_matcher, settle_waiter, row_pitch
+    if reference_geometry is None:
+        reference_geometry = {name: globals()[name] for name in SCREEN_GEOMETRY}
+    for name, kind in SCREEN_GEOMETRY.items():
+        globals()[name] = getattr(transform, kind)(reference_geometry[name])
+    ui_transform = transform
+    # Built from the old coordinates and template size
+    rarity_matcher = None
+    settle_waiter = None
+    row_pitch = None
+
+def calibrate(force=False):
+    """
+    Find how the shop is scaled and placed on this display (or take it from
+    CALIBRATION_FILE) and apply it. Returns the Transform, or None if the
+    shop couldn't be found and the configured coordinates are kept.
+    """
+    screen = grab_frame()
+    key = f"{screen.shape[1]}x{screen.shape[0]}"
+    cache = CalibrationCache(CALIBRATION_FILE)
+    transform = None if force else cache.get(key)
+    if transform is None:
+        print(f"Calibrating for a {key} screen...")
+        first_slot = (reference_geometry or globals())["FIRST_SEED_SLOT"]
+        transform = detect(screen, load_templates(), first_slot)
+        if transform is None:
+            print("Calibration failed: couldn't find the seed shop. Using the configured coordinates.")
+            return None
+        cache.put(key, transform)
+    print(f"Screen calibration: {transform}")
+    apply_transform(transform)
+    return transform
+
+@metrics.timed("find_rarity_boxes")
 def find_rarity_boxes(shop_img, templates, threshold=0.85):
-    found = []
-    shop_gray = cv2.cvtColor(shop_img, cv2.COLOR_BGR2GRAY)
-    
-    for rarity, template in templates.items():
-        if template is None:
-            continue
-        template_gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
-        res = cv2.matchTemplate(shop_gray, template_gray, cv2.TM_CCOEFF_NORMED)
-        loc = np.where(res >= threshold)
-        w, h = template_gray.shape[::-1]
-        for pt in zip(*loc[::-1]):
-            center_x = pt[0] + w // 2
-            center_y = pt[1] + h // 2
-            # Adjust the center_y to be in the original screen coordinates
-            screen_center_y = center_y + FULL_SHOP_REGION[1]
-            # Only add if within the valid Y range
-            if MIN_Y <= screen_center_y <= MAX_Y:
-                found.append({'rarity': rarity, 'center': (center_x, center_y), 'size': (w, h)})
-    found = non_max_suppression(found, overlapThresh=0.5)
-    return found
+    """
+    Find the rarity boxes in a BGR shop image.
+
+    templates is either a RarityMatcher from build_rarity_matcher or the raw
+    dict from load_templates (compiled on the fly, which is slower). Returns
+    one box per location with the best-scoring rarity, sorted top to bottom.
+    """
+    if isinstance(templates, RarityMatcher):
+        matcher = templates
+    else:
+        matcher = build_rarity_matcher(templates, threshold=threshold)
+    return matcher.find(shop_img)
 
 def non_max_suppression(boxes, overlapThresh=0.5):
     if len(boxes) == 0:
@@ -185,62 +597,108 @@ def non_max_suppression(boxes, overlapThresh=0.5):
             pick.append(box)
     return pick
 
-def get_stock(shop_img, rarity_center, stock_offset):
-    dx, dy, w, h = stock_offset
+def crop_relative(shop_img, rarity_center, offset, label):
+    """Crop (dx, dy, w, h) relative to a rarity box center given in screen coordinates"""
+    dx, dy, w, h = offset
     x, y = rarity_center
     shop_x = x - FULL_SHOP_REGION[0]
     shop_y = y - FULL_SHOP_REGION[1]
-    stock_x = int(shop_x + dx)
-    stock_y = int(shop_y + dy)
-    stock_region = safe_crop(shop_img, stock_x, stock_y, w, h)
-    if stock_region is None:
-        print(f"Stock region out of bounds at ({stock_x},{stock_y},{w},{h})")
+    crop_x = int(shop_x + dx)
+    crop_y = int(shop_y + dy)
+    region = safe_crop(shop_img, crop_x, crop_y, w, h)
+    if region is None:
+        print(f"{label} region out of bounds at ({crop_x},{crop_y},{w},{h})")
         return None
-    save_debug_image(stock_region, f"stock_{x}_{y}")
-    pil_img = Image.fromarray(stock_region)
-    text = pytesseract.image_to_string(pil_img, config='--psm 7 digits')
+    save_debug_image(region, f"{label.lower()}_{x}_{y}")
+    return region
+
+def parse_stock(text):
     try:
         return int(''.join(filter(str.isdigit, text)))
     except:
         return None
 
+def get_stock(shop_img, rarity_center, stock_offset):
+    stock_region = crop_relative(shop_img, rarity_center, stock_offset, "Stock")
+    if stock_region is None:
+        return None
+    text = read_digits(stock_region)
+    if text is None:
+        metrics.count("ocr_reads")
+        with metrics.span("ocr"):
+            text = get_ocr_pool().read(stock_region, STOCK_OCR_CONFIG)
+    return parse_stock(text)
+
 def get_name(shop_img, rarity_center, name_offset):
-    dx, dy, w, h = name_offset
-    x, y = rarity_center
-    shop_x = x - FULL_SHOP_REGION[0]
-    shop_y = y - FULL_SHOP_REGION[1]
-    name_x = int(shop_x + dx)
-    name_y = int(shop_y + dy)
-    name_region = safe_crop(shop_img, name_x, name_y, w, h)
+    name_region = crop_relative(shop_img, rarity_center, name_offset, "Name")
     if name_region is None:
-        print(f"Name region out of bounds at ({name_x},{name_y},{w},{h})")
         return ""
-    save_debug_image(name_region, f"name_{x}_{y}")
-    pil_img = Image.fromarray(name_region)
-    text = pytesseract.image_to_string(pil_img, config='--psm 7')
-    return text.strip()
+    metrics.count("ocr_reads")
+    with metrics.span("ocr"):
+        return canonical_name(get_ocr_pool().read(name_region, NAME_OCR_CONFIG))
+
+def get_name_and_stock(shop_img, rarity_center):
+    """Read the name and stock of the selected seed (see read_entries)"""
+    return read_entries(shop_img, [rarity_center], NAME_OFFSET, STOCK_OFFSET)[0]
 
-def get_restock_time():
-    """Get the restock time directly from the UI using OCR"""
+def read_entries(shop_img, rarity_centers, name_offset, stock_offset):
+    """
+    Read the (name, stock) of several entries of one shop capture. Stocks go
+    through the glyph reader first; whatever still needs Tesseract is
+    submitted to the OCR pool as one batch.
+    """
+    jobs = []
+    pending = []
+    for rarity_center in rarity_centers:
+        name_region = crop_relative(shop_img, rarity_center, name_offset, "Name")
+        stock_region = crop_relative(shop_img, rarity_center, stock_offset, "Stock")
+        stock_text = read_digits(stock_region) if stock_region is not None else None
+        name_job = stock_job = None
+        if name_region is not None:
+            name_job = len(jobs)
+            jobs.append((name_region, NAME_OCR_CONFIG))
+        if stock_region is not None and stock_text is None:
+            stock_job = len(jobs)
+            jobs.append((stock_region, STOCK_OCR_CONFIG))
+        pending.append((name_job, stock_job, stock_text))
+    metrics.count("ocr_reads", len(jobs))
+    with metrics.span("ocr"):
+        texts = get_ocr_pool().read_batch(jobs)
+    results = []
+    for name_job, stock_job, stock_text in pending:
+        name = canonical_name(texts[name_job]) if name_job is not None else ""
+        if stock_job is not None:
+            stock_text = texts[stock_job]
+        stock = parse_stock(stock_text) if stock_text is not None else None
+        if stock is None:
+            debug_anomaly(f"unreadable stock for '{name}'")
+        results.append((name, stock))
+    return results
+
+@metrics.timed("restock_timer")
+def get_restock_time(restock_img=None, verbose=True):
+    """Get the restock time directly from the UI using OCR; restock_img is a BGR capture of the timer"""
     try:
         # Take a screenshot of the restock time region
-        restock_img = take_screenshot(RESTOCK_TIME_REGION, label="restock_time")
-        save_debug_image(restock_img, "restock_time")
+        if restock_img is None:
+            restock_img = take_screenshot(RESTOCK_TIME_REGION, label="restock_time")
+            save_debug_image(restock_img, "restock_time")
         
         # Convert to high contrast image to improve OCR
-        restock_np = np.array(restock_img)
-        restock_gray = cv2.cvtColor(restock_np, cv2.COLOR_RGB2GRAY)
+        restock_gray = cv2.cvtColor(restock_img, cv2.COLOR_BGR2GRAY)
         _, restock_thresh = cv2.threshold(restock_gray, 150, 255, cv2.THRESH_BINARY)
         save_debug_image(restock_thresh, "restock_time_thresh")
         
-        # Convert back to PIL for OCR
-        restock_pil = Image.fromarray(restock_thresh)
-        
-        # Extract text with OCR
-        text = pytesseract.image_to_string(restock_pil, config='--psm 7 -c tessedit_char_whitelist=0123456789:')
+        # Extract text with the glyph reader, or OCR if it isn't confident
+        text = read_digits(restock_gray)
+        if text is None:
+            metrics.count("ocr_reads")
+            with metrics.span("ocr"):
+                text = get_ocr_pool().read(restock_thresh, RESTOCK_OCR_CONFIG, cache=False)
         text = text.strip()
         
-        print(f"Detected restock time: '{text}'")
+        if verbose:
+            print(f"Detected restock time: '{text}'")
         
         # Extract minutes and seconds
         time_pattern = r'(\d+):(\d+)'
@@ -250,7 +708,8 @@ def get_restock_time():
             minutes = int(match.group(1))
             seconds = int(match.group(2))
             total_seconds = (minutes * 60) + seconds
-            print(f"Parsed restock time: {minutes}m {seconds}s = {total_seconds} seconds")
+            if verbose:
+                print(f"Parsed restock time: {minutes}m {seconds}s = {total_seconds} seconds")
             return total_seconds
         else:
             # As a fallback, try to extract only the numbers
@@ -263,58 +722,128 @@ def get_restock_time():
                     minutes = int(digits[0:2])
                     seconds = int(digits[2:4])
                 total_seconds = (minutes * 60) + seconds
-                print(f"Fallback parsing restock time: {minutes}m {seconds}s = {total_seconds} seconds")
+                if verbose:
+                    print(f"Fallback parsing restock time: {minutes}m {seconds}s = {total_seconds} seconds")
                 return total_seconds
             
-            print("Could not parse restock time.")
+            if verbose:
+                print("Could not parse restock time.")
             return None
     except Exception as e:
-        print(f"Error getting restock time: {e}")
+        if verbose:
+            print(f"Error getting restock time: {e}")
         return None
 
-def buy_seed(rarity_center, name, rarity, stock):
+@metrics.timed("read_stock")
+def read_stock_now(rarity_center):
+    """Capture just the stock text of the selected seed and read it"""
+    region = get_stock_text_region(rarity_center)
+    stock_region = take_screenshot(region, label="stock")
+    text = read_digits(stock_region)
+    if text is None:
+        metrics.count("ocr_reads")
+        with metrics.span("ocr"):
+            text = get_ocr_pool().read(stock_region, STOCK_OCR_CONFIG)
+    return parse_stock(text)
+
+def purchase_urgency(rarity):
+    """Input urgency of buying a seed: rarer seeds in BUY_RARITIES first, all ahead of scanning"""
+    return BUY_RARITIES.index(rarity) if rarity in BUY_RARITIES else len(BUY_RARITIES)
+
+@metrics.timed("buy_seed")
+def buy_seed(rarity_center, name, rarity, stock, limit=PURCHASE_MAX, on_purchase=None):
     """
     Buy all available seeds of the given rarity.
+
+    Clicks the buy button in bursts of PURCHASE_BURST and re-reads the stock
+    counter after each burst. Stops as soon as the stock reaches zero, or when
+    it stops dropping (out of currency). Every purchase the counter confirms
+    is recorded in seeds_purchased, but never more than the clicks sent since
+    the last confirmed read: other players buy from the same stock. Clicks
+    that aren't confirmed yet count against limit, so a slow read never
+    buys past it.
     
     Args:
         rarity_center: (x, y) coordinates of the rarity icon
         name: Name of the seed
         rarity: Rarity of the seed
         stock: Number of seeds in stock
+        limit: Most seeds to buy
+        on_purchase: Called with the number of seeds each confirmed burst bought
+
+    Returns the number of seeds bought.
     """
     global seeds_purchased
     
     if not rarity_center or stock <= 0:
-        return
+        return 0
     
     # Add an offset to click the buy button from the rarity icon position
     buy_x = rarity_center[0] + BUY_BUTTON_OFFSET[0]
     buy_y = rarity_center[1] + BUY_BUTTON_OFFSET[1]
-    
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    stock_region = get_stock_text_region(rarity_center)
     
     # Buy all seeds in stock (up to a reasonable limit for safety)
-    max_attempts = min(stock, 50)
+    max_purchases = min(stock, limit)
     purchases_made = 0
+    remaining = stock
+    clicks = 0
+    unconfirmed = 0  # clicks sent that no stock read has confirmed yet
+    stalled_reads = 0
     
-    print(f"Attempting to buy {max_attempts} {name} seeds (Rarity: {rarity})")
+    print(f"Attempting to buy {max_purchases} {name} seeds (Rarity: {rarity})")
     
-    for i in range(max_attempts):
-        # Click the buy button
-        reliable_click(buy_x, buy_y)
-        time.sleep(0.5)
+    while purchases_made < max_purchases and clicks < 2 * PURCHASE_MAX:
+        check_watchdog()
+        burst = min(PURCHASE_BURST, max_purchases - purchases_made - unconfirmed)
+        if burst > 0:
+            metrics.count("clicks", burst)
+            with metrics.span("click"), get_backend().urgency(purchase_urgency(rarity)):
+                get_input().click(buy_x, buy_y, delay=PURCHASE_CLICK_DELAY, count=burst)
+            clicks += burst
+            unconfirmed += burst
+        # else: the clicks already sent could use up the limit, read again before any more
+        wait_for_ui("buy", stock_region)
+
+        current = read_stock_now(rarity_center)
+        if current is None or current >= remaining:
+            stalled_reads += 1
+            if stalled_reads >= PURCHASE_STALL_READS:
+                if current is None:
+                    print("Could not read the stock counter, stopping purchases.")
+                else:
+                    print(f"Stock stuck at {current}, probably out of currency.")
+                debug_anomaly(f"purchase of {name} stopped")
+                break
+            continue
+        stalled_reads = 0
+
+        # The rest of the drop was bought by other players
+        bought = min(remaining - current, unconfirmed)
+        # Clicks the counter doesn't show yet may still land: keep them outstanding
+        unconfirmed -= bought
+        for i in range(bought):
+            record_purchase(name, rarity)
+        if on_purchase is not None:
+            on_purchase(bought)
+        purchases_made += bought
+        remaining = current
+        if remaining <= 0:
+            break
     
     print(f"Successfully purchased {purchases_made} {name} seeds")
+    return purchases_made
 
 
+@metrics.timed("process_seed")
 def process_seed(templates, return_all=False):
     # Take a screenshot of the full shop region
-    shop_img_pil = take_screenshot(FULL_SHOP_REGION, label="shop_window")
-    shop_img = cv2.cvtColor(np.array(shop_img_pil), cv2.COLOR_RGB2BGR)
+    shop_img = capture_shop()
 
     found = find_rarity_boxes(shop_img, templates)
     if not found:
         print("No rarity box found!")
+        debug_anomaly("no rarity box")
         if return_all:
             return "", "", None, None, []
         else:
@@ -325,8 +854,7 @@ def process_seed(templates, return_all=False):
     rarity_center = rarity_box['center']
     rarity = rarity_box['rarity']
 
-    name = get_name(shop_img, rarity_center, NAME_OFFSET)
-    stock = get_stock(shop_img, rarity_center, STOCK_OFFSET)
+    name, stock = get_name_and_stock(shop_img, rarity_center)
     print(f"Seed: '{name}' | Rarity: {rarity} | Stock: {stock}")
 
     shop_x = rarity_center[0] - FULL_SHOP_REGION[0]
@@ -342,46 +870,65 @@ def process_seed(templates, return_all=False):
     else:
         return name, rarity, stock, rarity_center
 
+def capture_shop():
+    """Screenshot of the shop window as a BGR array"""
+    return take_screenshot(FULL_SHOP_REGION, label="shop_window")
+
+def read_visible_entries(templates):
+    """
+    Capture the shop once and read every visible collapsed entry.
+
+    Returns a list of {'name', 'rarity', 'stock', 'center'} dicts, top to
+    bottom, with centers in screen coordinates.
+    """
+    shop_img = capture_shop()
+    return recognize_entries(shop_img, find_rarity_boxes(shop_img, templates))
+
+@metrics.timed("recognize_entries")
+def recognize_entries(shop_img, found):
+    """Read the name and stock of the collapsed entries at the rarity boxes in found"""
+    centers = [(box['center'][0] + FULL_SHOP_REGION[0], box['center'][1] + FULL_SHOP_REGION[1])
+               for box in found]
+    texts = read_entries(shop_img, centers, ROW_NAME_OFFSET, ROW_STOCK_OFFSET)
+    entries = []
+    for box, center, (name, stock) in zip(found, centers, texts):
+        entries.append({'name': name, 'rarity': box['rarity'], 'stock': stock, 'center': center})
+    return entries
+
 def aggregate_seeds(seed_list):
     """
-    Aggregates a list of seed data by name and rarity.
-    
-    For seeds_in_stock: [timestamp, name, rarity, stock]
-    For seeds_purchased: [timestamp, name, rarity]
+    Aggregates a list of Observation or Purchase records by name and rarity.
     
-    Returns list of [name, rarity, count]
+    Returns list of [name, rarity, count]: total stock for observations,
+    number bought for purchases. Reports use the running totals from
+    get_seed_totals() instead of calling this on the full history.
     """
-    aggregated = defaultdict(int)
-    
-    # For seeds_in_stock
-    if len(seed_list) > 0 and len(seed_list[0]) == 4:
-        for timestamp, name, rarity, stock in seed_list:
-            key = f"{name}|{rarity}"
-            # For in_stock, use the stock value if available
-            stock_value = stock if stock is not None else 0
-            aggregated[key] += stock_value
-    # For seeds_purchased
-    else:
-        for timestamp, name, rarity in seed_list:
-            key = f"{name}|{rarity}"
-            # For purchased, count occurrences
-            aggregated[key] += 1
-    
-    # Convert to list format
-    result = []
-    for key, count in aggregated.items():
-        name, rarity = key.split('|', 1)
-        result.append([name, rarity, count])
-    
-    # Sort by rarity and name
-    result.sort(key=lambda x: (x[1], x[0]))
-    return result
+    totals = SeedTotals()
+    if seed_list and hasattr(seed_list[0], "stock"):
+        totals.load([[seed.name, seed.rarity, seed.stock or 0] for seed in seed_list], [])
+        return totals.stock_rows()
+    totals.load([], [[seed.name, seed.rarity, 1] for seed in seed_list])
+    return totals.purchase_rows()
+
+def report_metrics():
+    """Print the stage timings and export them, if metrics are enabled"""
+    if not metrics.enabled:
+        return
+    metrics.report()
+    if METRICS_TRACE_FILE:
+        metrics.export_trace(METRICS_TRACE_FILE)
+    if METRICS_PROMETHEUS_FILE:
+        metrics.export_prometheus(METRICS_PROMETHEUS_FILE)
 
 def print_tracking_tables():
     """Print tables with tracking information"""
+    from tabulate import tabulate  # only needed for reports, keeps startup fast
+    flush_tracking_data()
+    totals = get_seed_totals()
+
     print("\n--- SEEDS IN STOCK (AGGREGATED) ---")
-    if seeds_in_stock:
-        agg_in_stock = aggregate_seeds(seeds_in_stock)
+    agg_in_stock = totals.stock_rows()
+    if agg_in_stock:
         print(tabulate(agg_in_stock, 
                       headers=["Name", "Rarity", "Stock"],
                       tablefmt="grid"))
@@ -389,244 +936,539 @@ def print_tracking_tables():
         print("No seeds were detected in stock.")
         
     print("\n--- SEEDS PURCHASED (AGGREGATED) ---")
-    if seeds_purchased:
-        agg_purchased = aggregate_seeds(seeds_purchased)
+    agg_purchased = totals.purchase_rows()
+    if agg_purchased:
         print(tabulate(agg_purchased, 
                       headers=["Name", "Rarity", "Count"],
                       tablefmt="grid"))
     else:
         print("No seeds were purchased.")
-    
-    # Save all tables to CSV
-    save_tracking_data_to_csv()
 
 def save_tracking_data_to_csv():
-    """Save all tracking data to CSV files"""
-    # Save raw data
-    if seeds_in_stock:
-        with open("seeds_in_stock_raw.csv", "w") as f:
-            f.write("Timestamp,Name,Rarity,Stock\n")
-            for seed in seeds_in_stock:
-                f.write(f"{seed[0]},\"{seed[1]}\",{seed[2]},{seed[3]}\n")
-    
-    if seeds_purchased:
-        with open("seeds_purchased_raw.csv", "w") as f:
-            f.write("Timestamp,Name,Rarity\n")
-            for seed in seeds_purchased:
-                f.write(f"{seed[0]},\"{seed[1]}\",{seed[2]}\n")
-    
-    # Save aggregated data
-    if seeds_in_stock:
-        agg_in_stock = aggregate_seeds(seeds_in_stock)
-        with open("seeds_in_stock_aggregated.csv", "w") as f:
-            f.write("Name,Rarity,Stock\n")
-            for seed in agg_in_stock:
-                f.write(f"\"{seed[0]}\",{seed[1]},{seed[2]}\n")
-    
-    if seeds_purchased:
-        agg_purchased = aggregate_seeds(seeds_purchased)
-        with open("seeds_purchased_aggregated.csv", "w") as f:
-            f.write("Name,Rarity,Count\n")
-            for seed in agg_purchased:
-                f.write(f"\"{seed[0]}\",{seed[1]},{seed[2]}\n")
-    
-    # Save combined data (all raw data in one file)
-    with open("all_seed_data.csv", "w") as f:
-        f.write("Type,Timestamp,Name,Rarity,Stock/Count\n")
-        for seed in seeds_in_stock:
-            stock = seed[3] if seed[3] is not None else 0
-            f.write(f"In_Stock,{seed[0]},\"{seed[1]}\",{seed[2]},{stock}\n")
-        for seed in seeds_purchased:
-            f.write(f"Purchased,{seed[0]},\"{seed[1]}\",{seed[2]},1\n")
+    """Export all tracking data from the tracking store to CSV files"""
+    flush_tracking_data()
+    get_tracking_store().export_csv()
+
+scan_machine = None  # state machine of the last single-entry scan
+
+def check_watchdog():
+    """Raise StateTimeout if the running scan state is over its time limit (see scanstate.py)"""
+    if scan_machine is not None:
+        scan_machine.watchdog.check()
 
+@metrics.timed("scan_all_seeds")
 def scan_all_seeds(templates):
-    global seeds_in_stock, seeds_purchased
-    processed_seeds = set()  # Track which seeds we've already processed by name+rarity
-    
-    # Click the first seed to start
+    """
+    Single-entry scan: select every seed in turn, read it, buy it if its
+    rarity is in BUY_RARITIES and close it. Selecting a seed scrolls it to
+    the top of the list as far as the list goes, so the next one is clicked
+    a row below where the seed just read was.
+
+    Runs as a state machine (see scanstate.py) that checkpoints every row
+    read and every seed bought. When a state fails, recover_scan() finds
+    out where the list is from one capture and the scan carries on from the
+    next row instead of starting over.
+
+    Returns False if the scan was given up (SCAN_MAX_RECOVERIES failures in a row).
+    """
+    global scan_machine
+    checkpoint = Checkpoint()
+    current = {}  # the selected seed, as read
+
+    def selecting():
+        row = checkpoint.next_row()
+        if row >= MAX_SEEDS:
+            checkpoint.done = True
+            return SCROLLING
+        if current.get('row') == row - 1:
+            # The row below the one just read and closed
+            x, y = current['rarity_center']
+            click_seed((x, y + get_row_pitch()))
+            checkpoint.selected = row
+            return READING
+        if row < checkpoint.top:
+            scroll_to_top(checkpoint.top)
+            checkpoint.top = 0
+        # Only after a recovery: hop down the bottom slot until the row is on screen
+        max_hop = visible_rows() - 1
+        while row - checkpoint.top > max_hop:
+            click_seed((FIRST_SEED_SLOT[0], FIRST_SEED_SLOT[1] + max_hop * get_row_pitch()))
+            click_stock_box(FIRST_SEED_SLOT)
+            checkpoint.top += max_hop
+        slot = row - checkpoint.top
+        click_seed((FIRST_SEED_SLOT[0], FIRST_SEED_SLOT[1] + slot * get_row_pitch()))
+        checkpoint.selected = row
+        return READING
+
+    def reading():
+        name, rarity, stock, rarity_center, found = process_seed(templates, return_all=True)
+        if not rarity_center:
+            raise LostPosition("no rarity box")
+        if not is_selected(found):
+            raise LostPosition("no seed opened")
+        if not name or "none" in name.lower():
+            raise LostPosition(f"unreadable name '{name}'")
+        seed = seed_id(name, rarity)
+        row = checkpoint.selected
+        if row < len(checkpoint.rows):
+            # Back on a row read before, to finish buying it
+            if checkpoint.rows[row] != seed:
+                raise LostPosition(f"expected {checkpoint.rows[row]} in row {row}, found {seed}")
+        elif checkpoint.position(seed) is not None:
+            raise LostPosition(f"'{name}' ({rarity}) was already read")
+        else:
+            checkpoint.rows.append(seed)
+            record_observation(name, rarity, stock)
+        # At the end of the list it can't scroll the selected row up to the first slot
+        checkpoint.top = row - max(0, int(round((rarity_center[1] - FIRST_SEED_SLOT[1]) / get_row_pitch())))
+        current.update(row=row, name=name, rarity=rarity, stock=stock, rarity_center=rarity_center, found=found)
+        if rarity in BUY_RARITIES and stock and stock > 0:
+            if checkpoint.purchase is None:
+                checkpoint.purchase = [row, seed, 0]
+            return BUYING
+        checkpoint.purchase = None
+        return CLOSING
+
+    def buying():
+        def bought(count):
+            checkpoint.purchase[2] += count
+        buy_seed(current['rarity_center'], current['name'], current['rarity'], current['stock'],
+                 limit=PURCHASE_MAX - checkpoint.purchase[2], on_purchase=bought)
+        checkpoint.purchase = None
+        return CLOSING
+
+    def closing():
+        click_stock_box(current['rarity_center'])
+        if is_last_entry(current['found'], current['rarity_center']):
+            checkpoint.done = True
+            return SCROLLING
+        return SELECTING
+
+    def scrolling():
+        if checkpoint.top > 0:
+            scroll_to_top(checkpoint.top)
+            if locate_top_row(templates, checkpoint)[0] != 0:
+                print("Not back at the top of the list, scrolling all the way up.")
+                scroll_to_top()
+        checkpoint.top = 0
+        # Leave the first seed selected, ready for the next scan
+        click_seed(FIRST_SEED_SLOT)
+        return None
+
+    def recover(state, error):
+        current.clear()  # whatever was read may have moved
+        debug_anomaly(f"scan failed while {state}")
+        return recover_scan(templates, checkpoint)
+
+    scan_machine = ScanMachine(
+        {SELECTING: selecting, READING: reading, BUYING: buying, CLOSING: closing, SCROLLING: scrolling},
+        recover,
+        Watchdog(SCAN_STATE_LIMITS),
+        max_recoveries=SCAN_MAX_RECOVERIES,
+        progress=lambda: (len(checkpoint.rows), checkpoint.purchase and checkpoint.purchase[2]),
+    )
+    if scan_machine.run(SELECTING):
+        return True
+    scroll_to_top()
     click_seed(FIRST_SEED_SLOT)
-    time.sleep(0.7)
-    name, rarity, stock, rarity_center, _ = process_seed(templates, return_all=True)
-    
-    # Track this first seed
+    return False
+
+def is_selected(found):
+    """True if the first entry in a capture's rarity boxes is open: the next box is more than a row below it"""
+    return len(found) < 2 or found[1]['center'][1] - found[0]['center'][1] > 1.5 * get_row_pitch()
+
+def locate_top_row(templates, checkpoint):
+    """
+    From one capture: (row, center, selected) of the entry in the first
+    slot. row is recognized by the entry's name among the rows read so far,
+    or in the learned layout, and is None if it can't be; center is None if
+    no entry is recognizable at all.
+    """
+    shop_img = capture_shop()
+    found = find_rarity_boxes(shop_img, templates)
+    if not found:
+        return None, None, False
+    box = found[0]
+    center = (box['center'][0] + FULL_SHOP_REGION[0], box['center'][1] + FULL_SHOP_REGION[1])
+    selected = is_selected(found)
+    name = get_name(shop_img, center, NAME_OFFSET if selected else ROW_NAME_OFFSET)
+    row = None
+    if name:
+        row = checkpoint.position(seed_id(name, box['rarity']))
+        if row is None:
+            row = get_shop_layout().position(name, box['rarity'])
+    return row, center, selected
+
+def recover_scan(templates, checkpoint):
+    """
+    Find out where the list is after a scan state failed, from one capture,
+    close whatever is open and return the state to resume from: the next
+    row, or scrolling back up if every row has been read. Only if the row in
+    the first slot can't be recognized is the list scrolled all the way up,
+    and the scan hops down to the next row from there.
+    """
+    top, center, selected = locate_top_row(templates, checkpoint)
+    if center is None:
+        # Nothing recognizable: close whatever may be open over the list
+        click_stock_box(FIRST_SEED_SLOT)
+    elif selected:
+        click_stock_box(center)
+
+    if top is None:
+        print("Couldn't tell where the list is, scrolling back to the top.")
+        scroll_to_top()
+        top = 0
+    checkpoint.top = top
+    if checkpoint.done:
+        print(f"Row {top} is at the top of the list, scrolling back up.")
+        return SCROLLING
+    print(f"Row {top} is at the top of the list, resuming from row {checkpoint.next_row()}.")
+    return SELECTING
+
+def is_last_entry(found, rarity_center):
+    """True if no rarity box shows below the selected entry at rarity_center, i.e. the list ends with it"""
+    return not any(box['center'][1] > rarity_center[1] + get_row_pitch() / 2 for box in found)
+
+@metrics.timed("scan_visible_pages")
+def scan_visible_pages(templates):
+    """
+    Multi-entry scan: read the name, stock and rarity of every visible entry
+    from one capture, click only the entries that need buying, and move on to
+    the next page only when every visible entry has been read.
+
+    Rarity boxes are found on the clicking thread (they're cheap and decide
+    whether a page can contain a purchase); reading names and stock runs on
+    the scan pipeline's recognition workers. Pages without a rarity from
+    BUY_RARITIES are not waited for: the bot moves on while they're read and
+    their results are recorded later, in page order.
+
+    Returns True if the scan got to the end of the list, False if it stopped
+    short (nothing recognizable on screen, or MAX_SEEDS pages).
+    """
+    global row_pitch
+    pipeline = get_scan_pipeline()
+    tracker = get_scroll_tracker()
+    processed_seeds = set()  # name|rarity of every seed recorded this scan
+    attempted = set()  # name|rarity of every seed we already tried to buy
+    end_of_list = False
+    complete = False
+
+    # Start from a known state: select the first seed, then close it
+    click_seed(FIRST_SEED_SLOT)
+    name, rarity, stock, rarity_center = process_seed(templates)
+    if not rarity_center:
+        scroll_to_top()
+        click_seed(FIRST_SEED_SLOT)
+        return False
     if name and rarity:
-        seed_identifier = f"{name.strip().lower()}|{rarity}"
+        seed_identifier = seed_id(name, rarity)
         processed_seeds.add(seed_identifier)
-        
-        # Track seed in stock
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        seeds_in_stock.append([timestamp, name, rarity, stock])
-    
-    # Buy first seed if appropriate
-    if rarity in BUY_RARITIES and stock and stock > 0:
-        buy_seed(rarity_center, name, rarity, stock)
-        time.sleep(0.7)
-    
-    # CHANGED: Only AFTER buying, close the menu
-    time.sleep(0.7)
+        record_observation(name, rarity, stock)
+        if rarity in BUY_RARITIES and stock and stock > 0:
+            attempted.add(seed_identifier)
+            buy_seed(rarity_center, name, rarity, stock)
     click_stock_box(rarity_center)
-    time.sleep(1.0)
-    
-    # Check if the first seed is Cacao (last seed)
-    if name and "cacao" in name.lower():
-        # Scroll back to top
-        click_multiple(SCROLL_UP_POINT[0], SCROLL_UP_POINT[1], SCROLL_UP_CLICKS)
-        # ADDED: Click first seed again to reset
-        time.sleep(0.5)
-        click_seed(FIRST_SEED_SLOT)
-        return
-    
-    # Stop if no valid seed detected
-    if not name or name.lower() == "none":
-        # Scroll back to top
-        click_multiple(SCROLL_UP_POINT[0], SCROLL_UP_POINT[1], SCROLL_UP_CLICKS)
-        # ADDED: Click first seed again to reset
-        time.sleep(0.5)
-        click_seed(FIRST_SEED_SLOT)
-        return
-    
-    # Keep track of consecutive iterations with no new seeds
-    no_new_seeds_count = 0
-    max_no_new_seeds = 3  # Stop after this many consecutive iterations without new seeds
-    
-    # Start with the first seed's position
-    last_seed_x, last_seed_y = FIRST_SEED_SLOT
-    
-    for i in range(2, MAX_SEEDS + 1):
-        # Calculate position for next seed (below the previous one)
-        next_seed_x = last_seed_x
-        next_seed_y = last_seed_y + NEXT_SEED_OFFSET_Y
-        
-        # ADDED: Check before clicking next seed
-        # If we've already found Cacao seed as the previous seed, don't continue
-        if name and "cacao" in name.lower():
+
+    def commit_page(entries, advanced):
+        """Decision stage: record a page's seeds, called in page order"""
+        nonlocal end_of_list
+        found_new = False
+        for entry in entries:
+            print(f"Seed: '{entry['name']}' | Rarity: {entry['rarity']} | Stock: {entry['stock']}")
+            if not entry['name'] or "none" in entry['name'].lower():
+                continue
+            seed_identifier = seed_id(entry['name'], entry['rarity'])
+            entry['id'] = seed_identifier
+            if seed_identifier not in processed_seeds:
+                found_new = True
+                processed_seeds.add(seed_identifier)
+                record_observation(entry['name'], entry['rarity'], entry['stock'])
+        # Moved down a page but nothing new is visible: end of the list
+        if advanced and not found_new:
+            end_of_list = True
+
+    advanced = True
+    expected_rows = 0  # rows the last page turn should have scrolled
+    for i in range(2 * MAX_SEEDS):
+        pipeline.commit_ready()
+        if end_of_list:
+            complete = True
             break
-        
-        # Click at the calculated position to select next seed
-        reliable_click(next_seed_x, next_seed_y)
-        time.sleep(0.7)
-        
-        # Get seed information
-        name, detected_rarity, stock, rarity_center, _ = process_seed(templates, return_all=True)
-        
-        # Check if we've found Cacao Seed (last seed)
-        if name and "cacao" in name.lower():
-            # Process this last seed
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            seeds_in_stock.append([timestamp, name, detected_rarity, stock])
-            
-            # Buy this seed if appropriate
-            if detected_rarity in BUY_RARITIES and stock and stock > 0:
-                buy_seed(rarity_center, name, detected_rarity, stock)
-                time.sleep(0.7)
-            
-            # CHANGED: Only close menu after buying
-            time.sleep(0.7)
-            click_stock_box(rarity_center)
-            time.sleep(1.0)
-            
-            # Scroll back to top
-            click_multiple(SCROLL_UP_POINT[0], SCROLL_UP_POINT[1], SCROLL_UP_CLICKS)
-            # ADDED: Click first seed again to reset
-            time.sleep(0.5)
-            click_seed(FIRST_SEED_SLOT)
-            return
-        
-        # Check if we got a valid seed
-        if not name or name.lower() == "none" or "none" in name.lower():
-            no_new_seeds_count += 1
-            if no_new_seeds_count >= max_no_new_seeds:
-                break
-            continue
-        
-        # Create a unique identifier for this seed
-        seed_identifier = f"{name.strip().lower()}|{detected_rarity}"
-        
-        # Check if we've already processed this seed
-        if seed_identifier in processed_seeds:
-            no_new_seeds_count += 1
-            continue
-        
-        # This is a new seed
-        no_new_seeds_count = 0  # Reset counter when we find a new seed
-        processed_seeds.add(seed_identifier)
-        
-        # Track seed in stock
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        seeds_in_stock.append([timestamp, name, detected_rarity, stock])
-        
-        # Update the last seed position for the next iteration
-        if rarity_center:
-            last_seed_x, last_seed_y = rarity_center
+        shop_img = capture_shop()
+        found = find_rarity_boxes(shop_img, templates)
+        if not found:
+            break
+        # The page doesn't fill the viewport: it's the end of the list
+        last_page = len(found) < visible_rows()
+        if i == 0:
+            tracker.reset(shop_img)
+            tracker.measure_pitch([box['center'] for box in found])
+            row_pitch = tracker.pitch
         else:
-            last_seed_x, last_seed_y = next_seed_x, next_seed_y
-        
-        # Buy if appropriate
-        if detected_rarity in BUY_RARITIES and stock and stock > 0:
-            buy_seed(rarity_center, name, detected_rarity, stock)
-            time.sleep(0.7)
-        
-        # CHANGED: Only close menu after buying
-        time.sleep(0.7)
-        click_stock_box(rarity_center)
-        time.sleep(1.0)
-        
-        # If we've processed a large number of seeds, we might want to stop
-        if i >= MAX_SEEDS:
+            shift = tracker.update(shop_img)
+            # Moved down a page but the list didn't move: end of the list
+            if advanced and shift == 0:
+                complete = True
+                break
+            # The list scrolled less than a full page: this is its last page
+            if advanced and tracker.stalled(expected_rows):
+                last_page = True
+
+        page = pipeline.submit(recognize_entries, shop_img, found,
+                               on_commit=lambda entries, advanced=advanced: commit_page(entries, advanced))
+        advanced = False
+
+        if any(box['rarity'] in BUY_RARITIES for box in found):
+            # A purchase is possible on this page: wait for it to be read
+            entries = pipeline.wait(page)
+            to_buy = [entry for entry in entries
+                      if 'id' in entry and entry['id'] not in attempted
+                      and entry['rarity'] in BUY_RARITIES and entry['stock'] and entry['stock'] > 0]
+            if to_buy:
+                # Selecting an entry scrolls it to the top, taking the rows above it out of
+                # view, so the topmost one goes first; the rest are bought from the next capture
+                entry = to_buy[0]
+                attempted.add(entry['id'])
+                with get_backend().urgency(purchase_urgency(entry['rarity'])):
+                    # Select it and confirm it's the right seed in the expanded view
+                    click_seed(entry['center'])
+                    name, rarity, stock, rarity_center = process_seed(templates)
+                    if rarity_center:
+                        if rarity in BUY_RARITIES and stock and stock > 0:
+                            buy_seed(rarity_center, name, rarity, stock)
+                        click_stock_box(rarity_center)
+                # The list moved, capture it again
+                continue
+        if last_page:
+            complete = True
             break
-    
+
+        # Next page: selecting the bottom entry scrolls it to the top
+        bottom = found[-1]['center']
+        click_seed((bottom[0] + FULL_SHOP_REGION[0], bottom[1] + FULL_SHOP_REGION[1]))
+        click_stock_box(FIRST_SEED_SLOT)
+        advanced = True
+        expected_rows = len(found) - 1
+
+    pipeline.wait_all()
+
     # Scroll back to top after finishing
-    click_multiple(SCROLL_UP_POINT[0], SCROLL_UP_POINT[1], SCROLL_UP_CLICKS)
-    # ADDED: Click first seed again to reset
-    time.sleep(0.5)
+    return_to_top(tracker)
     click_seed(FIRST_SEED_SLOT)
+    # The last pages can still show the end of the list as they're recorded
+    return complete or end_of_list
 
+def visible_rows():
+    """Number of seed rows whose rarity box fits in the MIN_Y..MAX_Y band"""
+    return int((MAX_Y - FIRST_SEED_SLOT[1]) // get_row_pitch()) + 1
 
-def main():
+@metrics.timed("scan_targeted")
+def scan_targeted(templates, layout):
+    """
+    Targeted scan: go straight to the positions the learned layout gives for
+    seeds in BUY_RARITIES and read their collapsed rows, opening only those
+    with stock to buy, skipping every other row. From the top of the list,
+    selecting the seed in visible slot k scrolls it to the top, so any
+    position is reached by hopping down the bottom slot.
+
+    Returns False (after resetting to the top) as soon as a seed doesn't match
+    the layout, so the caller can fall back to a full scan.
+    """
+    targets = layout.targets(BUY_RARITIES)
+    max_hop = visible_rows() - 1
+
+    def give_up(rarity_center=None):
+        if rarity_center:
+            click_stock_box(rarity_center)
+        scroll_to_top()
+        click_seed(FIRST_SEED_SLOT)
+        return False
+
+    # Start from a known state: select the first seed, check it and close it
+    click_seed(FIRST_SEED_SLOT)
+    name, rarity, stock, rarity_center = process_seed(templates)
+    if not rarity_center or not layout.matches(0, name, rarity):
+        return give_up()
+    click_stock_box(rarity_center)
+    top = 0
+    page = None  # collapsed entries on screen, read once per list position
+
+    for position, expected_name, expected_rarity in targets:
+        if position - top > max_hop:
+            while position - top > max_hop:
+                click_seed((FIRST_SEED_SLOT[0], FIRST_SEED_SLOT[1] + max_hop * get_row_pitch()))
+                click_stock_box(FIRST_SEED_SLOT)
+                top += max_hop
+            page = None
+        if page is None:
+            page = read_visible_entries(templates)
+        slot = position - top
+        entry = page[slot] if slot < len(page) else {'name': "", 'rarity': None, 'stock': None}
+        if not layout.matches(position, entry['name'], entry['rarity']):
+            print(f"Expected '{expected_name}' ({expected_rarity}) at position {position}, "
+                  f"found '{entry['name']}' ({entry['rarity']}).")
+            return give_up()
+        if entry['stock'] == 0:
+            # Nothing to buy: no need to open it
+            record_observation(entry['name'], entry['rarity'], 0)
+            continue
+
+        click_seed(entry['center'])
+        name, rarity, stock, rarity_center = process_seed(templates)
+        if not rarity_center or not layout.matches(position, name, rarity):
+            print(f"Expected '{expected_name}' ({expected_rarity}) at position {position}, "
+                  f"found '{name}' ({rarity}).")
+            return give_up(rarity_center)
+        record_observation(name, rarity, stock)
+        if stock and stock > 0:
+            buy_seed(rarity_center, name, rarity, stock)
+        click_stock_box(rarity_center)
+        # Selecting scrolled the row up as far as the list goes
+        top = position - max(0, int(round((rarity_center[1] - FIRST_SEED_SLOT[1]) / get_row_pitch())))
+        page = None
+
+    # Scroll back to top after finishing: the list is top rows down
+    scroll_to_top(top)
+    click_seed(FIRST_SEED_SLOT)
+    return True
+
+def scan_shop(templates):
+    """
+    Run one scan of the shop: a targeted scan when the learned layout is
+    trusted, otherwise a full walk with the configured scan mode, which is
+    also used to learn the layout.
+    """
+    global targeted_scans_since_full
+    layout = get_shop_layout()
+    start = len(seeds_in_stock)
+    if TARGETED_SCAN and layout.trusted() and targeted_scans_since_full < TARGETED_FULL_SCAN_EVERY:
+        if scan_targeted(templates, layout):
+            targeted_scans_since_full += 1
+            return
+        print("Shop layout changed, falling back to a full scan.")
+        layout.invalidate()
+        # The full scan sees those seeds again: keep only its observations
+        discard_observations(start)
+
+    if MULTI_ENTRY_SCAN:
+        complete = scan_visible_pages(templates)
+    else:
+        complete = scan_all_seeds(templates)
+    targeted_scans_since_full = 0
+    # A scan that stopped short would teach a layout missing the last rows
+    if complete:
+        layout.learn([(seed.name, seed.rarity) for seed in seeds_in_stock[start:]])
+
+restock_scheduler = None
+
+def get_restock_scheduler():
+    global restock_scheduler
+    if restock_scheduler is None:
+        restock_scheduler = RestockScheduler(
+            read_timer=lambda img: get_restock_time(img, verbose=False),
+            capture=lambda: grab_frame(RESTOCK_TIME_REGION),
+            samples=RESTOCK_SAMPLES,
+            sample_interval=RESTOCK_SAMPLE_INTERVAL,
+            tolerance=RESTOCK_TOLERANCE,
+            prewarm_lead=RESTOCK_PREWARM_LEAD,
+            poll_interval=RESTOCK_POLL_INTERVAL,
+            late_limit=RESTOCK_LATE_LIMIT,
+        )
+    return restock_scheduler
+
+def prewarm_scan(templates):
+    """Get everything the next scan needs loaded and run once before the restock"""
+    get_ocr_pool()
+    get_digit_reader()
+    find_rarity_boxes(capture_shop(), templates)
+
+@metrics.timed("restock_wait")
+def wait_for_restock(templates):
+    """Sleep until the shop restocks, with the next scan warmed up"""
+    scheduler = get_restock_scheduler()
+    deadline = scheduler.estimate()
+    if deadline is None:
+        print(f"\nCouldn't read restock time. Waiting {RESTOCK_DEFAULT_WAIT} seconds before next scan...")
+        time.sleep(RESTOCK_DEFAULT_WAIT)
+        return
+
+    print(f"\nRestock timer says {scheduler.seconds_left(deadline):.0f} seconds until next restock "
+          f"({len(scheduler.readings)} readings, {scheduler.rejected} rejected).")
+    result = scheduler.wait(
+        deadline,
+        prewarm=lambda: prewarm_scan(templates),
+        progress=lambda left: print(f"Restock in {left:.0f} seconds..."),
+    )
+    if result == "restocked":
+        print("Shop restocked.")
+    else:
+        print("Didn't see the restock timer reset, scanning anyway.")
+
+def run(cycles=None):
+    """Scan, wait for the restock and scan again, cycles times (forever if None)"""
+    if CALIBRATE:
+        calibrate()
+    templates = get_rarity_matcher()
+    # Clear the debug folder once; the debug recorder's cap bounds it from here
+    clear_debug_folder()
+
+    cycle = 0
     while True:
-        # Clear debug folder at the start of each run
-        clear_debug_folder()
-        
         print("\n===== STARTING NEW SCAN =====")
-        print("Starting in 5 seconds... Switch to Roblox window!")
-        for i in range(5, 0, -1):
-            print(f"{i}...")
-            time.sleep(1)
-            
-        templates = load_templates()
-        scan_all_seeds(templates)
+        try:
+            scan_shop(templates)
+        except Exception:
+            # Keep what was recorded and wait for the next restock as usual
+            traceback.print_exc()
+            debug_anomaly("scan failed")
+            scroll_to_top()
+            click_seed(FIRST_SEED_SLOT)
         
         # Print tracking information
         print_tracking_tables()
+        save_ocr_cache()
+        get_seed_names().report()
+        get_settle_waiter().report()
+        if input_layer is not None:
+            input_layer.report()
+        if scan_pipeline is not None:
+            scan_pipeline.report()
+        if scan_machine is not None:
+            scan_machine.report()
+        report_metrics()
+
+        cycle += 1
+        if cycles is not None and cycle >= cycles:
+            return
         
-        # Get the restock time AFTER scanning all seeds
+        # Wait for the restock AFTER scanning all seeds
         print("\nChecking restock timer...")
-        restock_seconds = get_restock_time()
-        
-        # Check if we should wait for restock
-        if restock_seconds:
-            buffer_time = 5  # Add a few seconds buffer
-            wait_time = restock_seconds + buffer_time
-            
-            print(f"\nRestock timer says {restock_seconds} seconds until next restock.")
-            print(f"Waiting {wait_time} seconds before next scan...")
-            
-            # Wait until restock
-            for remaining in range(wait_time, 0, -1):
-                if remaining % 30 == 0 or remaining <= 10:  # Show countdown every 30 sec and final 10 sec
-                    print(f"Restock in {remaining} seconds...")
-                time.sleep(1)
-        else:
-            # If restock time couldn't be read, wait a default time
-            default_wait = 60
-            print(f"\nCouldn't read restock time. Waiting {default_wait} seconds before next scan...")
-            time.sleep(default_wait)
+        wait_for_restock(templates)
+
+def shutdown(reason, export_csv=True):
+    """Save everything still in memory on the way out"""
+    print_tracking_tables()
+    # Ensure we save data on exit
+    if export_csv:
+        save_tracking_data_to_csv()
+    else:
+        flush_tracking_data()
+    save_ocr_cache()
+    report_metrics()
+    if debug_recorder is not None:
+        debug_recorder.flush(reason)
+        debug_recorder.close()
+
+def main():
+    print("Starting in 5 seconds... Switch to Roblox window!")
+    for i in range(5, 0, -1):
+        print(f"{i}...")
+        time.sleep(1)
+    run()
 
 if __name__ == "__main__":
     try:
         main()
     except KeyboardInterrupt:
         print("\nScript stopped by user.")
-        print_tracking_tables()
-        # Ensure we save data on exit
-        save_tracking_data_to_csv()
+        shutdown("stopped by user")
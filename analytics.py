@@ -0,0 +1,446 @@
+"""
+Historical analytics over the tracking database.
+
+The observation and purchase logs are copied into a column store next to
+the database (seed_tracking.columns/): one flat binary file per column,
+appended to as the database grows and memory-mapped when read, so reports
+over months of history never go through SQLite or a Python loop per row.
+Seeds are stored as integer codes, and every report is a vectorized
+group-by over those codes (bincount, or reduceat over restocks sorted by
+hour).
+
+Observations are grouped into restocks by time: a gap of more than `gap`
+seconds (RESTOCK_GAP by default) between two observations starts a new
+restock. Scans of several windows during the same restock count as one.
+
+    python -m analytics                           # every report
+    python -m analytics appearance stock          # only these
+    python -m analytics hours --seed "Cacao Seed" # one seed by hour of day
+
+From Python:
+
+    history = analytics.load("seed_tracking.db")
+    rates = analytics.appearance(history)   # {"seed": [...], "rate": array, ...}
+"""
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+import numpy as np
+
+from tracking import TIMESTAMP_FORMAT
+
+REPORTS = ("appearance", "stock", "hours", "purchases")
+RESTOCK_GAP = 120  # seconds without observations that separate two restocks
+FETCH_ROWS = 100000
+# Highest stock a seed can really have; anything above it is an OCR misread
+# and counts as unread, so one bad digit can't blow up the stock histogram
+MAX_STOCK = 999
+
+# (table, column, dtype) of every column kept in the store; stock is -1 when unread
+COLUMNS = {
+    "observations": [("timestamp", np.float64), ("seed", np.int32), ("stock", np.int32)],
+    "purchases": [("timestamp", np.float64), ("seed", np.int32)],
+}
+
+
+def _epoch(timestamp):
+    if isinstance(timestamp, str):
+        # Rows written before timestamps were stored as epoch seconds
+        return datetime.datetime.strptime(timestamp, TIMESTAMP_FORMAT).timestamp()
+    return timestamp
+
+
+class ColumnStore:
+    """The tracking database's rows as memory-mappable column files, kept up to date incrementally"""
+
+    def __init__(self, db_path, folder=None):
+        self.db_path = db_path
+        self.folder = folder or os.path.splitext(db_path)[0] + ".columns"
+        self.meta_path = os.path.join(self.folder, "meta.json")
+        self.meta = {"seeds": [], "last_id": {table: 0 for table in COLUMNS},
+                     "rows": {table: 0 for table in COLUMNS}}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.meta = json.load(f)
+
+    def _path(self, table, column):
+        return os.path.join(self.folder, f"{table}.{column}.bin")
+
+    def refresh(self):
+        """Append the rows added to the database since the last refresh; returns how many"""
+        os.makedirs(self.folder, exist_ok=True)
+        seeds = self.meta["seeds"]
+        codes = {(name, rarity): code for code, (name, rarity) in enumerate(seeds)}
+
+        def code(name, rarity):
+            key = (name, rarity)
+            if key not in codes:
+                codes[key] = len(seeds)
+                seeds.append([name, rarity])
+            return codes[key]
+
+        added = 0
+        conn = sqlite3.connect(self.db_path)
+        try:
+            for table, columns in COLUMNS.items():
+                rows = self.meta["rows"][table]
+                # Drop whatever a refresh that didn't finish wrote past the last recorded row
+                for column, dtype in columns:
+                    path = self._path(table, column)
+                    if os.path.exists(path) and os.path.getsize(path) > rows * np.dtype(dtype).itemsize:
+                        os.truncate(path, rows * np.dtype(dtype).itemsize)
+                fields = "id, timestamp, name, rarity" + (", stock" if table == "observations" else "")
+                cursor = conn.execute(f"SELECT {fields} FROM {table} WHERE id > ? ORDER BY id",
+                                      (self.meta["last_id"][table],))
+                while True:
+                    batch = cursor.fetchmany(FETCH_ROWS)
+                    if not batch:
+                        break
+                    values = {
+                        "timestamp": np.array([_epoch(row[1]) for row in batch], dtype=np.float64),
+                        "seed": np.array([code(row[2], row[3]) for row in batch], dtype=np.int32),
+                    }
+                    if table == "observations":
+                        values["stock"] = np.array([-1 if row[4] is None else row[4] for row in batch],
+                                                   dtype=np.int32)
+                    for column, dtype in columns:
+                        with open(self._path(table, column), "ab") as f:
+                            values[column].astype(dtype, copy=False).tofile(f)
+                    self.meta["rows"][table] += len(batch)
+                    self.meta["last_id"][table] = batch[-1][0]
+                    added += len(batch)
+                    self._save_meta()
+        finally:
+            conn.close()
+        return added
+
+    def _save_meta(self):
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.meta_path)
+
+    def column(self, table, column):
+        """A column as a read-only memory-mapped array"""
+        dtype = dict(COLUMNS[table])[column]
+        rows = self.meta["rows"][table]
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._path(table, column), dtype=dtype, mode="r", shape=(rows,))
+
+    def history(self):
+        return History(
+            [tuple(seed) for seed in self.meta["seeds"]],
+            self.column("observations", "timestamp"),
+            self.column("observations", "seed"),
+            self.column("observations", "stock"),
+            self.column("purchases", "timestamp"),
+            self.column("purchases", "seed"),
+        )
+
+    def clear(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+        self.__init__(self.db_path, self.folder)
+
+
+class History:
+    """Observations and purchases as columns; seed codes index seeds, a list of (name, rarity)"""
+
+    def __init__(self, seeds, obs_time, obs_seed, obs_stock, buy_time, buy_seed):
+        self.seeds = list(seeds)
+        self.obs_time = obs_time
+        self.obs_seed = obs_seed
+        self.obs_stock = obs_stock
+        self.buy_time = buy_time
+        self.buy_seed = buy_seed
+        self._restocks = {}
+        self._presence = {}
+
+    def merge_names(self, names):
+        """
+        History with every seed name resolved by a names.SeedNames, so rows
+        of one seed stored under OCR misreads count as that seed
+        """
+        merged = []
+        codes = {}
+        remap = np.empty(len(self.seeds), dtype=np.int32)
+        for code, (name, rarity) in enumerate(self.seeds):
+            key = (names.resolve(name, count=False).name, rarity)
+            if key not in codes:
+                codes[key] = len(merged)
+                merged.append(key)
+            remap[code] = codes[key]
+        if len(merged) == len(self.seeds):
+            # Nothing merged, at most renamed
+            return History(merged, self.obs_time, self.obs_seed, self.obs_stock, self.buy_time, self.buy_seed)
+        return History(merged, self.obs_time, remap[self.obs_seed], self.obs_stock,
+                       self.buy_time, remap[self.buy_seed])
+
+    def restocks(self, gap=RESTOCK_GAP):
+        """
+        (restock of every observation, start time of every restock), with
+        the observations in time order, plus that order (None if already sorted)
+        """
+        if gap not in self._restocks:
+            t = self.obs_time
+            order = None
+            if len(t) > 1 and (t[1:] < t[:-1]).any():
+                order = np.argsort(t, kind="stable")
+                t = t[order]
+            breaks = np.diff(t) > gap
+            restock = np.zeros(len(t), dtype=np.int64)
+            np.cumsum(breaks, out=restock[1:])
+            starts = t[np.concatenate(([True], breaks))] if len(t) else np.empty(0)
+            self._restocks[gap] = (restock, starts, order)
+        return self._restocks[gap]
+
+    def _sorted(self, column, order):
+        return column if order is None else column[order]
+
+    def presence(self, gap=RESTOCK_GAP):
+        """
+        (listed, in_stock): restocks x seeds boolean tables of which seeds
+        were seen, and with stock; computed once per gap, so treat as read-only
+        """
+        if gap not in self._presence:
+            restock, starts, order = self.restocks(gap)
+            seeds = len(self.seeds)
+            key = restock * seeds + self._sorted(self.obs_seed, order)
+            listed = np.zeros(len(starts) * seeds, dtype=bool)
+            listed[key] = True
+            in_stock = np.zeros(len(starts) * seeds, dtype=bool)
+            in_stock[key[self._sorted(self.obs_stock, order) > 0]] = True
+            self._presence[gap] = (listed.reshape(-1, seeds), in_stock.reshape(-1, seeds))
+        return self._presence[gap]
+
+
+def _ratio(a, b):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(b > 0, a / np.maximum(b, 1), np.nan)
+
+
+def _table(history, **columns):
+    names, rarities = zip(*history.seeds) if history.seeds else ((), ())
+    return {"seed": list(names), "rarity": list(rarities), **columns}
+
+
+def appearance(history, gap=RESTOCK_GAP):
+    """
+    Per seed: restocks it was listed in, restocks it had stock in, and
+    rate = in stock / listed. Targeted scans only look at some seeds, so
+    the rate is out of the restocks the seed was actually checked in;
+    overall is out of every restock.
+    """
+    listed, in_stock = history.presence(gap)
+    listed_count = listed.sum(axis=0)
+    in_stock_count = in_stock.sum(axis=0)
+    return _table(history, listed=listed_count, in_stock=in_stock_count,
+                  rate=_ratio(in_stock_count, listed_count),
+                  overall=_ratio(in_stock_count, np.full(len(history.seeds), len(listed))))
+
+
+def stock_distribution(history, quantiles=(0.5, 0.9)):
+    """Per seed, over observations with a readable stock: count, mean, quantiles, max and share at zero"""
+    seeds = len(history.seeds)
+    readable = (history.obs_stock >= 0) & (history.obs_stock <= MAX_STOCK)
+    stock = history.obs_stock[readable]
+    seed = history.obs_seed[readable]
+    width = int(stock.max()) + 1 if len(stock) else 1
+    hist = np.bincount(seed.astype(np.int64) * width + stock, minlength=seeds * width).reshape(seeds, width)
+    count = hist.sum(axis=1)
+    values = np.arange(width)
+    cdf = hist.cumsum(axis=1)
+    columns = {"count": count, "mean": _ratio(hist @ values, count)}
+    for q in quantiles:
+        # Smallest stock with at least q of the observations at or below it
+        rank = np.maximum(np.ceil(q * count), 1)[:, None]
+        columns[f"p{round(q * 100)}"] = np.where(count > 0, (cdf < rank).sum(axis=1), -1)
+    columns["max"] = np.where(count > 0, width - 1 - np.argmax(hist[:, ::-1] > 0, axis=1), -1)
+    columns["zero"] = _ratio(hist[:, 0], count)
+    return _table(history, **columns)
+
+
+def local_hour(timestamps, utc_offset=None):
+    """Hour of the day (0-23) of epoch timestamps, at utc_offset seconds (default: the local offset now)"""
+    if utc_offset is None:
+        utc_offset = -(time.altzone if time.localtime().tm_isdst > 0 else time.timezone)
+    return ((np.asarray(timestamps) + utc_offset) // 3600 % 24).astype(np.int64)
+
+
+def hourly(history, gap=RESTOCK_GAP, utc_offset=None):
+    """
+    Per hour of the day (local time) and seed, from the restocks that
+    started in that hour: restocks listed, restocks in stock and their
+    ratio, each a 24 x seeds array
+    """
+    listed, in_stock = history.presence(gap)
+    _, starts, _ = history.restocks(gap)
+    hour = local_hour(starts, utc_offset)
+    order = np.argsort(hour, kind="stable")
+    restocks = np.bincount(hour, minlength=24)
+    hours = np.flatnonzero(restocks)
+    bounds = np.searchsorted(hour[order], hours)
+
+    def by_hour(table):
+        sums = np.zeros((24, table.shape[1]), dtype=np.int64)
+        if len(hours):
+            # Restocks sorted by hour: one run of rows per hour that has any
+            sums[hours] = np.add.reduceat(table[order].view(np.uint8), bounds, axis=0, dtype=np.int64)
+        return sums
+
+    listed_hours = by_hour(listed)
+    in_stock_hours = by_hour(in_stock)
+    return _table(history, restocks=restocks, listed=listed_hours, in_stock=in_stock_hours,
+                  rate=_ratio(in_stock_hours, listed_hours))
+
+
+def purchase_success(history, gap=RESTOCK_GAP):
+    """
+    Per seed: restocks it had stock in, restocks it was bought in, their
+    ratio, and seeds bought out of all stock seen
+    """
+    seeds = len(history.seeds)
+    _, in_stock = history.presence(gap)
+    _, starts, _ = history.restocks(gap)
+    stock = history.obs_stock
+    counted = (stock > 0) & (stock <= MAX_STOCK)
+    stock_units = np.bincount(history.obs_seed[counted], weights=stock[counted], minlength=seeds)
+    bought = np.bincount(history.buy_seed, minlength=seeds)
+
+    # The restock a purchase belongs to is the last one that started before it
+    buy_restock = np.searchsorted(starts, history.buy_time, side="right") - 1
+    valid = buy_restock >= 0
+    bought_in = np.zeros(len(starts) * seeds, dtype=bool)
+    bought_in[buy_restock[valid] * seeds + history.buy_seed[valid]] = True
+    bought_restocks = bought_in.reshape(-1, seeds).sum(axis=0)
+    in_stock_count = in_stock.sum(axis=0)
+    return _table(history, in_stock=in_stock_count, bought_in=bought_restocks,
+                  success=_ratio(bought_restocks, in_stock_count),
+                  bought=bought, stock_seen=stock_units.astype(np.int64),
+                  share=_ratio(bought, stock_units))
+
+
+def load(db_path="seed_tracking.db", names_path=None, refresh=True):
+    """
+    History of a tracking database, through its column store (refreshed
+    first unless refresh is False). With names_path, seed names are merged
+    through the canonical seed names (see names.py).
+    """
+    store = ColumnStore(db_path)
+    if refresh:
+        store.refresh()
+    history = store.history()
+    if names_path:
+        from names import load_seed_names
+        history = history.merge_names(load_seed_names(names_path))
+    return history
+
+
+def summary(history, gap=RESTOCK_GAP):
+    """Every report: {name: table}"""
+    return {
+        "appearance": appearance(history, gap),
+        "stock": stock_distribution(history),
+        "hours": hourly(history, gap),
+        "purchases": purchase_success(history, gap),
+    }
+
+
+def _percent(value):
+    return "" if np.isnan(value) else f"{value:.1%}"
+
+
+def _print(table, columns, headers, rows=None):
+    from tabulate import tabulate
+    rows = range(len(table["seed"])) if rows is None else rows
+    print(tabulate([[table["seed"][i], table["rarity"][i]] + [fmt(table[column][i]) for column, fmt in columns]
+                    for i in rows],
+                   headers=["Name", "Rarity"] + headers, tablefmt="grid"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed history reports")
+    parser.add_argument("reports", nargs="*", metavar="report",
+                        help=f"reports to print: {', '.join(REPORTS)} (default: all)")
+    parser.add_argument("--db", default="seed_tracking.db", help="tracking database")
+    parser.add_argument("--names", default="seed_names.txt", help="seed names file to merge misread names with")
+    parser.add_argument("--raw-names", action="store_true", help="report names exactly as recorded")
+    parser.add_argument("--gap", type=float, default=RESTOCK_GAP,
+                        help="seconds without observations that start a new restock")
+    parser.add_argument("--seed", help="for the hours report: print one seed's rate for every hour")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the column store from scratch")
+    args = parser.parse_args(argv)
+    reports = args.reports or REPORTS
+    for report in reports:
+        if report not in REPORTS:
+            parser.error(f"unknown report {report!r}, expected one of {', '.join(REPORTS)}")
+
+    if not os.path.exists(args.db):
+        parser.error(f"no tracking database at {args.db}")
+
+    start = time.perf_counter()
+    store = ColumnStore(args.db)
+    if args.rebuild:
+        store.clear()
+    added = store.refresh()
+    history = store.history()
+    if not args.raw_names and args.names and os.path.exists(args.names):
+        from names import load_seed_names
+        history = history.merge_names(load_seed_names(args.names))
+    loaded = time.perf_counter()
+
+    _, starts, _ = history.restocks(args.gap)
+    print(f"{len(history.obs_time)} observations, {len(history.buy_time)} purchases, "
+          f"{len(starts)} restocks, {len(history.seeds)} seeds ({added} new rows)")
+    ranked = None
+    if "appearance" in reports:
+        table = appearance(history, args.gap)
+        ranked = np.argsort(-np.nan_to_num(table["rate"]), kind="stable")
+        print("\n--- APPEARANCE PER RESTOCK ---")
+        _print(table, [("listed", str), ("in_stock", str), ("rate", _percent), ("overall", _percent)],
+               ["Listed", "In stock", "Rate", "Of all restocks"], ranked)
+    if "stock" in reports:
+        table = stock_distribution(history)
+        print("\n--- STOCK WHEN LISTED ---")
+        _print(table, [("count", str), ("mean", lambda v: "" if np.isnan(v) else f"{v:.2f}"),
+                       ("p50", str), ("p90", str), ("max", str), ("zero", _percent)],
+               ["Observations", "Mean", "Median", "p90", "Max", "Out of stock"], ranked)
+    if "hours" in reports:
+        table = hourly(history, args.gap)
+        if args.seed:
+            key = args.seed.strip().lower()
+            matches = [i for i, name in enumerate(table["seed"]) if name.lower() == key]
+            if not matches:
+                parser.error(f"no seed named {args.seed!r}")
+            from tabulate import tabulate
+            for i in matches:
+                print(f"\n--- {table['seed'][i].upper()} ({table['rarity'][i]}) BY HOUR ---")
+                print(tabulate([[f"{hour:02d}:00", table["listed"][hour, i], table["in_stock"][hour, i],
+                                 _percent(table["rate"][hour, i])] for hour in range(24)],
+                               headers=["Hour", "Listed", "In stock", "Rate"], tablefmt="grid"))
+        else:
+            best = np.argmax(np.nan_to_num(table["rate"], nan=-1), axis=0)
+            worst = np.argmin(np.nan_to_num(table["rate"], nan=2), axis=0)
+            table["best"] = [f"{hour:02d}:00 ({_percent(table['rate'][hour, i])})" for i, hour in enumerate(best)]
+            table["worst"] = [f"{hour:02d}:00 ({_percent(table['rate'][hour, i])})" for i, hour in enumerate(worst)]
+            print("\n--- TIME OF DAY (local) ---")
+            _print(table, [("best", str), ("worst", str)], ["Most often in stock", "Least often"], ranked)
+    if "purchases" in reports:
+        table = purchase_success(history, args.gap)
+        bought_rarities = {table["rarity"][i] for i in np.flatnonzero(table["bought"])}
+        rows = [i for i in (ranked if ranked is not None else range(len(table["seed"])))
+                if table["rarity"][i] in bought_rarities]
+        print("\n--- PURCHASES ---")
+        _print(table, [("in_stock", str), ("bought_in", str), ("success", _percent),
+                       ("bought", str), ("stock_seen", str), ("share", _percent)],
+               ["Restocks in stock", "Restocks bought", "Success", "Bought", "Stock seen", "Of stock"], rows)
+    print(f"\nLoaded in {loaded - start:.2f}s, reports in {time.perf_counter() - loaded:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
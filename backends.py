@@ -0,0 +1,455 @@
+"""
+Screen/input backends for SeedBot.
+
+Every capture and every click the bot makes goes through one of these, so a
+scan cycle can run against the live game, a recorded session or a synthetic
+shop drawn from the rarity templates.
+
+Recognition captures go through grab(), which writes a BGR array straight
+into a caller-supplied buffer (see FramePool) so a scan doesn't allocate a
+new frame for every capture.
+"""
+import contextlib
+import ctypes
+import json
+import os
+import sys
+import threading
+import time
+import types
+from collections import defaultdict
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+class FramePool:
+    """
+    Reusable capture buffers. A buffer is handed out again once nothing else
+    references it (no crop views, no page waiting to be recognized), so steady
+    state capturing allocates nothing. While frames are still in use, more
+    buffers are added, up to max_buffers per shape.
+    """
+
+    def __init__(self, max_buffers=16):
+        self.max_buffers = max_buffers
+        self.allocations = 0
+        self._buffers = defaultdict(list)
+        self._free_refs = self._refs([np.empty(1)], 0)  # count of a buffer only the pool holds
+
+    @staticmethod
+    def _refs(buffers, index):
+        return sys.getrefcount(buffers[index])
+
+    def get(self, shape, dtype=np.uint8):
+        """A buffer of shape that nothing else is using"""
+        buffers = self._buffers[(tuple(shape), np.dtype(dtype).str)]
+        for index in range(len(buffers)):
+            if self._refs(buffers, index) <= self._free_refs:
+                return buffers[index]
+        buf = np.empty(shape, dtype=dtype)
+        self.allocations += 1
+        if len(buffers) < self.max_buffers:
+            buffers.append(buf)
+        return buf
+
+
+class Backend:
+    """Base class: grab pixels from the screen and click on it."""
+
+    def screenshot(self, region=None):
+        """Return a PIL RGB image of region (x, y, w, h), or the full screen."""
+        raise NotImplementedError
+
+    def grab(self, region=None, out=None):
+        """
+        Return region as a BGR array, written into out when it is given and
+        has the right shape.
+        """
+        return cv2.cvtColor(np.asarray(self.screenshot(region)), cv2.COLOR_RGB2BGR, dst=out)
+
+    def click(self, x, y, delay=0.4):
+        """Left click at absolute screen coordinates (x, y)."""
+        raise NotImplementedError
+
+    def tap(self, x, y, count=1, interval=0.0, delay=0.0):
+        """
+        Fast click: put the cursor straight on (x, y) and click count times,
+        interval seconds apart, then pause delay seconds.
+        """
+        for i in range(count):
+            self.click(x, y, delay=interval if i < count - 1 else delay)
+
+    def urgency(self, level):
+        """
+        Context manager marking the clicks inside it as urgent (lower level is
+        more urgent). Only matters when several windows share the mouse, see
+        coordinator.py.
+        """
+        return contextlib.nullcontext()
+
+    def close(self):
+        pass
+
+
+class LiveBackend(Backend):
+    """
+    The real thing: pyautogui for capture, MouseKey for input. If the optional
+    mss package is installed, grab() reads the screen with it into the given
+    buffer instead of going through a PIL image.
+    """
+
+    def __init__(self, failsafe_hotkey='ctrl+e'):
+        import pyautogui
+        from mousekey import MouseKey
+        try:
+            import mss
+        except ImportError:
+            mss = None
+        self._pyautogui = pyautogui
+        self._mss = mss
+        self._local = threading.local()  # mss handles can't be shared between threads
+        self.mkey = MouseKey()
+        if failsafe_hotkey:
+            self.mkey.enable_failsafekill(failsafe_hotkey)  # Emergency kill
+
+    def screenshot(self, region=None):
+        return self._pyautogui.screenshot(region=region)
+
+    def grab(self, region=None, out=None):
+        if self._mss is None:
+            return super().grab(region, out)
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._local.sct = self._mss.mss()
+        if region is None:
+            monitor = sct.monitors[1]
+        else:
+            x, y, w, h = (int(v) for v in region)
+            monitor = {"left": x, "top": y, "width": w, "height": h}
+        shot = sct.grab(monitor)
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        return cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=out)
+
+    def click(self, x, y, delay=0.4):
+        self.mkey.left_click_xy_natural(
+            int(x), int(y),
+            delay=delay,
+            min_variation=-2,
+            max_variation=2,
+            use_every=3,
+            sleeptime=(0.01, 0.015),
+            print_coords=False,
+            percent=90,
+        )
+
+    def tap(self, x, y, count=1, interval=0.0, delay=0.0):
+        if sys.platform == "win32":
+            # Teleport, then inject the button events directly, all at once without an interval
+            ctypes.windll.user32.SetCursorPos(int(x), int(y))
+            batch = 1 if interval > 0 else count
+            for i in range(0, count, batch):
+                if i:
+                    time.sleep(interval)
+                _send_clicks(min(batch, count - i))
+        else:
+            self._pyautogui.click(int(x), int(y), clicks=count, interval=interval, _pause=False)
+        if delay:
+            time.sleep(delay)
+
+
+class _MOUSEINPUT(ctypes.Structure):
+    _fields_ = [("dx", ctypes.c_long), ("dy", ctypes.c_long), ("mouseData", ctypes.c_ulong),
+                ("dwFlags", ctypes.c_ulong), ("time", ctypes.c_ulong), ("dwExtraInfo", ctypes.c_size_t)]
+
+
+class _INPUT(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_ulong), ("mi", _MOUSEINPUT)]
+
+
+_INPUT_MOUSE = 0
+_MOUSEEVENTF_LEFTDOWN = 0x0002
+_MOUSEEVENTF_LEFTUP = 0x0004
+
+
+def _send_clicks(count):
+    """Left clicks at the cursor as one SendInput batch (Windows)"""
+    events = (_INPUT * (2 * count))()
+    for i in range(2 * count):
+        events[i].type = _INPUT_MOUSE
+        events[i].mi.dwFlags = _MOUSEEVENTF_LEFTUP if i % 2 else _MOUSEEVENTF_LEFTDOWN
+    ctypes.windll.user32.SendInput(len(events), events, ctypes.sizeof(_INPUT))
+
+
+def _region_key(region):
+    if region is None:
+        return "full"
+    return "_".join(str(int(v)) for v in region)
+
+
+class RecordingBackend(Backend):
+    """
+    Wraps another backend and writes every frame it captures to folder,
+    keyed by how many clicks had been made when it was taken. The folder can
+    later be played back with ReplayBackend.
+    """
+
+    def __init__(self, inner, folder):
+        self.inner = inner
+        self.folder = folder
+        self.clicks = 0
+        self.frames = {}
+        os.makedirs(folder, exist_ok=True)
+
+    def screenshot(self, region=None):
+        img = self.inner.screenshot(region)
+        filename = f"frame_{self.clicks:05d}_{_region_key(region)}.png"
+        img.save(os.path.join(self.folder, filename))
+        self.frames.setdefault(_region_key(region), {})[self.clicks] = filename
+        return img
+
+    def click(self, x, y, delay=0.4):
+        self.inner.click(x, y, delay=delay)
+        self.clicks += 1
+
+    def tap(self, x, y, count=1, interval=0.0, delay=0.0):
+        self.inner.tap(x, y, count=count, interval=interval, delay=delay)
+        self.clicks += count
+
+    def close(self):
+        with open(os.path.join(self.folder, "manifest.json"), "w") as f:
+            json.dump({"frames": self.frames}, f, indent=2)
+        self.inner.close()
+
+
+class ReplayBackend(Backend):
+    """
+    Serves frames recorded by RecordingBackend. The click state is the number
+    of clicks made so far; a capture returns the frame recorded for that state,
+    or the most recent one before it if the bot takes a different path than
+    the recording did.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.clicks = 0
+        self.click_log = []
+        with open(os.path.join(folder, "manifest.json")) as f:
+            manifest = json.load(f)
+        self.frames = {}
+        for key, by_click in manifest["frames"].items():
+            self.frames[key] = sorted((int(c), name) for c, name in by_click.items())
+        self._cache = {}
+
+    def screenshot(self, region=None):
+        key = _region_key(region)
+        recorded = self.frames.get(key)
+        if not recorded:
+            raise KeyError(f"No recorded frames for region {region}")
+        filename = recorded[0][1]
+        for clicks, name in recorded:
+            if clicks > self.clicks:
+                break
+            filename = name
+        if filename not in self._cache:
+            with Image.open(os.path.join(self.folder, filename)) as img:
+                self._cache[filename] = img.convert("RGB")
+        return self._cache[filename].copy()
+
+    def grab(self, region=None, out=None):
+        return cv2.cvtColor(np.asarray(self.screenshot(region)), cv2.COLOR_RGB2BGR, dst=out)
+
+    def click(self, x, y, delay=0.4):
+        self.click_log.append((int(x), int(y)))
+        self.clicks += 1
+
+
+DEFAULT_SHOP = [
+    ("Carrot Seed", "Common", 12),
+    ("Strawberry Seed", "Common", 8),
+    ("Blueberry Seed", "Uncommon", 5),
+    ("Orange Tulip Seed", "Uncommon", 3),
+    ("Tomato Seed", "Rare", 2),
+    ("Corn Seed", "Rare", 0),
+    ("Daffodil Seed", "Rare", 1),
+    ("Watermelon Seed", "Legendary", 0),
+    ("Pumpkin Seed", "Legendary", 1),
+    ("Apple Seed", "Legendary", 0),
+    ("Bamboo Seed", "Legendary", 4),
+    ("Coconut Seed", "Mythical", 0),
+    ("Cactus Seed", "Mythical", 1),
+    ("Dragon Fruit Seed", "Mythical", 0),
+    ("Mango Seed", "Mythical", 0),
+    ("Grape Seed", "Divine", 1),
+    ("Mushroom Seed", "Divine", 0),
+    ("Pepper Seed", "Divine", 0),
+    ("Cacao Seed", "Divine", 1),
+]
+
+
+class SyntheticShopBackend(Backend):
+    """
+    Draws the seed shop from the rarity templates instead of capturing it.
+
+    The list behaves like the game: clicking a seed row selects it and scrolls
+    it to the first slot, the stock box closes it again, the buy button takes
+    one from stock (until budget purchases have been made, if set) and the
+    scroll-up point moves the list up by one row. The restock timer counts
+    down from restock_seconds using the wall clock and starts over when it
+    runs out.
+    """
+
+    SCREEN_SIZE = (1920, 1080)
+    BACKGROUND = (52, 36, 28)
+    ENTRY_COLOR = (92, 64, 46)
+    TEXT_COLOR = (255, 255, 255)
+
+    def __init__(self, seeds=None, template_folder=None, restock_seconds=300, budget=None):
+        import SeedBot as bot
+        # The shop is drawn on the reference display, even after calibration
+        self.ref = types.SimpleNamespace(**(bot.reference_geometry or
+                                            {name: getattr(bot, name) for name in bot.SCREEN_GEOMETRY}))
+        self.seeds = [list(seed) for seed in (seeds or DEFAULT_SHOP)]
+        folder = template_folder or bot.TEMPLATE_FOLDER
+        self.templates = {}
+        for rarity in {seed[1] for seed in self.seeds}:
+            path = os.path.join(folder, f"{rarity.lower()}.png")
+            template = cv2.imread(path)
+            if template is None:
+                raise FileNotFoundError(path)
+            self.templates[rarity] = cv2.cvtColor(template, cv2.COLOR_BGR2RGB)
+        self.top = 0
+        self.selected = None
+        self.clicks = 0
+        self.purchases = []
+        self.budget = budget
+        self.restock_seconds = restock_seconds
+        self.deadline = time.time() + restock_seconds
+        self._frame = None
+
+    # -- state ---------------------------------------------------------------
+
+    def _row_center(self, slot):
+        x, y = self.ref.FIRST_SEED_SLOT
+        return x, y + slot * self.ref.NEXT_SEED_OFFSET_Y
+
+    def _visible_slots(self):
+        return (self.ref.MAX_Y - self.ref.FIRST_SEED_SLOT[1]) // self.ref.NEXT_SEED_OFFSET_Y + 1
+
+    def _near(self, x, y, point, radius):
+        return abs(x - point[0]) <= radius and abs(y - point[1]) <= radius
+
+    def click(self, x, y, delay=0.4):
+        self.clicks += 1
+        self._frame = None
+        top_center = self._row_center(0)
+
+        if self._near(x, y, self.ref.SCROLL_UP_POINT, 30):
+            self.top = max(0, self.top - 1)
+            return
+
+        if self.selected is not None:
+            bx, by = self.ref.BUY_BUTTON_OFFSET
+            sx, sy = self.ref.STOCK_BOX_OFFSET
+            if self._near(x, y, (top_center[0] + bx, top_center[1] + by), 40):
+                seed = self.seeds[self.selected]
+                affordable = self.budget is None or len(self.purchases) < self.budget
+                if seed[2] > 0 and affordable:
+                    seed[2] -= 1
+                    self.purchases.append((seed[0], seed[1]))
+                return
+            if self._near(x, y, (top_center[0] + sx, top_center[1] + sy), 40):
+                self.selected = None
+                return
+            return
+
+        for slot in range(self._visible_slots()):
+            index = self.top + slot
+            if index >= len(self.seeds):
+                break
+            cx, cy = self._row_center(slot)
+            if self._near(x, y, (cx, cy), 60):
+                self.selected = index
+                self.top = index
+                return
+
+    # -- rendering -----------------------------------------------------------
+
+    def _draw_template(self, frame, rarity, center):
+        template = self.templates[rarity]
+        th, tw = template.shape[:2]
+        tx, ty = center[0] - tw // 2, center[1] - th // 2
+        if ty < 0 or ty + th > frame.shape[0]:
+            return
+        frame[ty:ty + th, tx:tx + tw] = template
+
+    def _draw_row(self, frame, seed, center):
+        name, rarity, stock = seed
+        cx, cy = center
+        cv2.rectangle(frame, (cx - 580, cy - 60), (cx + 110, cy + 60), self.ENTRY_COLOR, -1)
+        self._draw_template(frame, rarity, center)
+        nx, ny, nw, nh = self.ref.ROW_NAME_OFFSET
+        cv2.putText(frame, name, (cx + nx + 6, cy + ny + nh - 12),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.9, self.TEXT_COLOR, 2, cv2.LINE_AA)
+        sx, sy, sw, sh = self.ref.ROW_STOCK_OFFSET
+        cv2.putText(frame, f"X{stock} Stock", (cx + sx + 4, cy + sy + sh - 8),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, self.TEXT_COLOR, 2, cv2.LINE_AA)
+
+    def _draw_selected(self, frame, seed, center):
+        name, rarity, stock = seed
+        cx, cy = center
+        ex, ey = cx + self.ref.SEED_ENTRY_OFFSET[0], cy + self.ref.SEED_ENTRY_OFFSET[1]
+        bx, by = self.ref.BUY_BUTTON_OFFSET
+        cv2.rectangle(frame, (ex, ey), (cx + 110, cy + by + 30), self.ENTRY_COLOR, -1)
+        self._draw_template(frame, rarity, center)
+        nx, ny, nw, nh = self.ref.NAME_OFFSET
+        cv2.putText(frame, name, (cx + nx + 6, cy + ny + nh - 18),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.1, self.TEXT_COLOR, 2, cv2.LINE_AA)
+        sx, sy, sw, sh = self.ref.STOCK_OFFSET
+        cv2.putText(frame, f"X{stock} Stock", (cx + sx + 4, cy + sy + sh - 8),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, self.TEXT_COLOR, 2, cv2.LINE_AA)
+        cv2.rectangle(frame, (cx + bx - 60, cy + by - 22), (cx + bx + 60, cy + by + 22),
+                      (40, 170, 60), -1)
+
+    def _draw_timer(self, frame):
+        remaining = int((self.deadline - time.time()) % self.restock_seconds)
+        x, y, w, h = self.ref.RESTOCK_TIME_REGION
+        cv2.rectangle(frame, (x, y), (x + w - 1, y + h - 1), (0, 0, 0), -1)
+        cv2.putText(frame, f"{remaining // 60}:{remaining % 60:02d}", (x + 8, y + h - 9),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.9, self.TEXT_COLOR, 2, cv2.LINE_AA)
+
+    def render(self):
+        """Return the full synthetic screen as an RGB array."""
+        if self._frame is None:
+            width, height = self.SCREEN_SIZE
+            frame = np.empty((height, width, 3), dtype=np.uint8)
+            frame[:] = self.BACKGROUND
+            y_shift = 0
+            for slot, index in enumerate(range(self.top, len(self.seeds))):
+                cx, cy = self._row_center(slot)
+                cy += y_shift
+                if cy - 200 > height:
+                    break
+                if index == self.selected:
+                    self._draw_selected(frame, self.seeds[index], (cx, cy))
+                    y_shift += self.ref.NEXT_SEED_OFFSET_Y
+                else:
+                    self._draw_row(frame, self.seeds[index], (cx, cy))
+            self._frame = frame
+        self._draw_timer(self._frame)
+        return self._frame
+
+    def screenshot(self, region=None):
+        frame = self.render()
+        if region is None:
+            return Image.fromarray(frame.copy())
+        x, y, w, h = (int(v) for v in region)
+        return Image.fromarray(np.ascontiguousarray(frame[y:y + h, x:x + w]))
+
+    def grab(self, region=None, out=None):
+        frame = self.render()
+        if region is not None:
+            x, y, w, h = (int(v) for v in region)
+            frame = frame[y:y + h, x:x + w]
+        return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=out)
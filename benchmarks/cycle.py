@@ -0,0 +1,99 @@
+"""
+End-to-end cycle benchmark: times scan_shop + get_restock_time against a
+headless backend, so cycle speed can be compared from one release to the next.
+
+    python -m benchmarks.cycle                          # synthetic shop
+    python -m benchmarks.cycle --replay recordings/run1 # recorded frames
+    python -m benchmarks.cycle --live --record recordings/run1
+
+Results are printed and, with --output, appended as one JSON object per line.
+The runs write their tracking data, layout and OCR cache to a temporary
+folder (see sandbox.py), never to the bot's own files.
+"""
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import time
+
+import SeedBot as bot
+from backends import LiveBackend, RecordingBackend, ReplayBackend, SyntheticShopBackend
+from benchmarks.sandbox import isolated_state
+
+
+def make_backend(args):
+    if args.live:
+        backend = LiveBackend()
+        if args.record:
+            backend = RecordingBackend(backend, args.record)
+        return backend
+    if args.replay:
+        return ReplayBackend(args.replay)
+    return SyntheticShopBackend()
+
+
+def run_cycle(templates):
+    """Run one scan cycle and return (scan_seconds, restock_seconds)"""
+    start = time.perf_counter()
+    bot.scan_shop(templates)
+    scanned = time.perf_counter()
+    bot.get_restock_time()
+    done = time.perf_counter()
+    return scanned - start, done - scanned
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--replay", metavar="DIR", help="replay frames recorded in DIR")
+    source.add_argument("--live", action="store_true", help="run against the live game window")
+    parser.add_argument("--record", metavar="DIR", help="with --live, record frames to DIR")
+    parser.add_argument("--runs", type=int, default=1, help="number of cycles to time")
+    parser.add_argument("--label", default="", help="tag stored with the result, e.g. a release")
+    parser.add_argument("--output", metavar="FILE", help="append the result to this JSON-lines file")
+    parser.add_argument("--tesseract", metavar="PATH", help="override the tesseract executable")
+    args = parser.parse_args(argv)
+
+    if args.tesseract:
+        bot.pytesseract.pytesseract.tesseract_cmd = args.tesseract
+
+    templates = bot.get_rarity_matcher()
+    scan_times = []
+    restock_times = []
+    with isolated_state():
+        for run in range(args.runs):
+            backend = make_backend(args)
+            bot.set_backend(backend)
+            bot.seeds_in_stock.clear()
+            bot.seeds_purchased.clear()
+            try:
+                scan_s, restock_s = run_cycle(templates)
+            finally:
+                backend.close()
+            scan_times.append(scan_s)
+            restock_times.append(restock_s)
+            print(f"Run {run + 1}: scan {scan_s:.3f}s | restock timer {restock_s:.3f}s | "
+                  f"{len(bot.seeds_in_stock)} seeds seen")
+
+    cycle_times = [s + r for s, r in zip(scan_times, restock_times)]
+    result = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "label": args.label,
+        "backend": "live" if args.live else "replay" if args.replay else "synthetic",
+        "python": platform.python_version(),
+        "runs": args.runs,
+        "scan_median_s": round(statistics.median(scan_times), 4),
+        "restock_median_s": round(statistics.median(restock_times), 4),
+        "cycle_median_s": round(statistics.median(cycle_times), 4),
+        "cycle_min_s": round(min(cycle_times), 4),
+    }
+    print(f"\nCycle median: {result['cycle_median_s']:.3f}s over {args.runs} run(s)")
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(result) + "\n")
+    return result
+
+
+if __name__ == "__main__":
+    main()
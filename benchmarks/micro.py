@@ -0,0 +1,279 @@
+"""
+Micro-benchmarks for the recognition and reporting hot paths, run offline
+against shop images drawn from templates/ (and, with --fixtures, shop
+captures saved in debug/).
+
+    python -m benchmarks.micro                                # run everything
+    python -m benchmarks.micro -k aggregate                   # only matching cases
+    python -m benchmarks.micro --save-baseline bench_baseline.json
+    python -m benchmarks.micro --compare bench_baseline.json --threshold 0.15
+
+Each case is timed in repeats of enough loops to take at least --min-time
+seconds; the median time per call is reported along with the spread
+(interquartile range) of the repeats. --compare exits with status 1 if any
+case got slower than the baseline by more than --threshold. Every case runs
+against a temporary folder (see sandbox.py), so the bot's own tracking
+database, layout and OCR cache are never touched.
+"""
+import argparse
+import gc
+import glob
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import SeedBot as bot
+import analytics
+from backends import DEFAULT_SHOP, FramePool, SyntheticShopBackend
+from benchmarks.sandbox import isolated_state
+from tracking import SeedTotals
+
+
+def measure(fn, repeats=7, min_time=0.05, max_loops=1000000):
+    """Seconds per call of fn: (median, iqr, min) over repeats, with garbage collection off like timeit"""
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _measure(fn, repeats, min_time, max_loops)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _measure(fn, repeats, min_time, max_loops):
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= max_loops:
+            break
+        loops = min(max_loops, loops * 10 if elapsed < min_time / 10 else loops * 2)
+    samples = [elapsed / loops]
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops)
+    q1, _, q3 = statistics.quantiles(samples, n=4) if len(samples) > 1 else (samples[0],) * 3
+    return statistics.median(samples), q3 - q1, min(samples)
+
+
+# -- fixtures ----------------------------------------------------------------
+
+def synthetic_shop(entries):
+    """BGR capture of FULL_SHOP_REGION showing the first entries of the default shop"""
+    backend = SyntheticShopBackend(seeds=DEFAULT_SHOP[:entries])
+    return backend.grab(bot.FULL_SHOP_REGION)
+
+
+def saved_shops(folder):
+    """Shop window captures written to folder by the debug recorder"""
+    shops = []
+    for path in sorted(glob.glob(os.path.join(folder, "shop_window_*.png")))[:10]:
+        img = cv2.imread(path)
+        if img is not None:
+            shops.append((os.path.basename(path), img))
+    return shops
+
+
+def observations(count, seed=0):
+    rng = random.Random(seed)
+    totals = SeedTotals()
+    return [totals.observation(1700000000.0 + i, *DEFAULT_SHOP[rng.randrange(len(DEFAULT_SHOP))][:2],
+                               rng.randrange(20))
+            for i in range(count)]
+
+
+def purchases(count, seed=1):
+    rng = random.Random(seed)
+    totals = SeedTotals()
+    return [totals.purchase(1700000000.0 + i, *DEFAULT_SHOP[rng.randrange(len(DEFAULT_SHOP))][:2])
+            for i in range(count)]
+
+
+def history_columns(count, seed=2):
+    """analytics.History arguments for count observations: every seed in each restock, five minutes apart"""
+    rng = np.random.default_rng(seed)
+    seeds = [(name, rarity) for name, rarity, _ in DEFAULT_SHOP]
+    restocks = count // len(seeds)
+    obs_time = np.sort(1700000000.0 + np.repeat(np.arange(restocks) * 300.0, len(seeds))
+                       + rng.random(restocks * len(seeds)) * 20)
+    obs_seed = np.tile(np.arange(len(seeds), dtype=np.int32), restocks)
+    obs_stock = rng.integers(-1, 8, len(obs_time)).astype(np.int32)
+    buy_time = np.sort(rng.choice(obs_time, len(obs_time) // 100)) + 5
+    buy_seed = rng.integers(0, len(seeds), len(buy_time)).astype(np.int32)
+    return seeds, obs_time, obs_seed, obs_stock, buy_time, buy_seed
+
+
+# -- cases -------------------------------------------------------------------
+
+def build_cases(args, folder):
+    """[(name, setup)] where setup() returns the function to time; folder is the sandbox folder"""
+    cases = []
+    templates = bot.get_rarity_matcher()
+
+    for entries in (1, 2, 3):
+        def setup(entries=entries):
+            shop = synthetic_shop(entries)
+            return lambda: bot.find_rarity_boxes(shop, templates)
+        cases.append((f"find_rarity_boxes[{entries} visible]", setup))
+
+    def setup_raw():
+        shop = synthetic_shop(3)
+        raw = bot.load_templates()
+        return lambda: bot.find_rarity_boxes(shop, raw)
+    cases.append(("find_rarity_boxes[uncompiled templates]", setup_raw))
+
+    if args.fixtures:
+        for name, shop in saved_shops(args.fixtures):
+            cases.append((f"find_rarity_boxes[{name}]",
+                          lambda shop=shop: (lambda: bot.find_rarity_boxes(shop, templates))))
+
+    def setup_capture_pil():
+        backend = SyntheticShopBackend()
+        backend.render()
+        return lambda: cv2.cvtColor(np.array(backend.screenshot(bot.FULL_SHOP_REGION)), cv2.COLOR_RGB2BGR)
+    cases.append(("capture[PIL image + conversion]", setup_capture_pil))
+
+    def setup_capture_pooled():
+        backend = SyntheticShopBackend()
+        backend.render()
+        pool = FramePool()
+        x, y, w, h = bot.FULL_SHOP_REGION
+        return lambda: backend.grab(bot.FULL_SHOP_REGION, out=pool.get((h, w, 3)))
+    cases.append(("capture[grab into pooled buffer]", setup_capture_pooled))
+
+    for count in (10, 100, 1000):
+        def setup(count=count):
+            rng = random.Random(count)
+            boxes = [{'rarity': 'Rare', 'center': (rng.randrange(700), rng.randrange(650)), 'score': 0.9}
+                     for _ in range(count)]
+            return lambda: bot.non_max_suppression(boxes)
+        cases.append((f"non_max_suppression[{count} boxes]", setup))
+
+    def setup_crop():
+        shop = synthetic_shop(3)
+        return lambda: bot.safe_crop(shop, 18, 216, 457, 63)
+    cases.append(("safe_crop", setup_crop))
+
+    def setup_name():
+        shop = synthetic_shop(1)
+        return lambda: bot.get_name(shop, bot.FIRST_SEED_SLOT, bot.ROW_NAME_OFFSET)
+    cases.append(("get_name[OCR cache warm]", setup_name))
+
+    def setup_stock():
+        shop = synthetic_shop(1)
+        return lambda: bot.get_stock(shop, bot.FIRST_SEED_SLOT, bot.ROW_STOCK_OFFSET)
+    cases.append(("get_stock[OCR cache warm]", setup_stock))
+
+    def setup_restock():
+        backend = SyntheticShopBackend()
+        timer = backend.grab(bot.RESTOCK_TIME_REGION)
+        if bot.get_restock_time(timer, verbose=False) is None:
+            raise RuntimeError("restock timer unreadable, is Tesseract installed?")
+        return lambda: bot.get_restock_time(timer, verbose=False)
+    cases.append(("get_restock_time", setup_restock))
+
+    for count in (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6):
+        def setup(count=count):
+            rows = observations(count)
+            return lambda: bot.aggregate_seeds(rows)
+        cases.append((f"aggregate_seeds[{count} rows]", setup))
+
+    for count in (10 ** 3, 10 ** 5):
+        def setup(count=count):
+            # A database of its own for each size, inside the sandbox
+            csv_folder = os.path.join(folder, f"csv_{count}")
+            os.makedirs(csv_folder, exist_ok=True)
+            if bot.tracking_store is not None:
+                bot.tracking_store.close()
+            bot.TRACKING_DB = os.path.join(csv_folder, "seed_tracking.db")
+            bot.tracking_store = None
+            bot.get_tracking_store().append(observations(count), purchases(count // 10))
+
+            def run():
+                cwd = os.getcwd()
+                os.chdir(csv_folder)
+                try:
+                    bot.save_tracking_data_to_csv()
+                finally:
+                    os.chdir(cwd)
+            return run
+        cases.append((f"save_tracking_data_to_csv[{count} rows]", setup))
+
+    for count in (10 ** 5, 10 ** 6, 10 ** 7):
+        def setup(count=count):
+            columns = history_columns(count)
+            # A new History per call: restocks and presence are cached on it
+            return lambda: analytics.summary(analytics.History(*columns))
+        cases.append((f"analytics.summary[{count} rows]", setup))
+    return cases
+
+
+def format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e3), ("us", 1e6)):
+        if seconds * scale >= 1:
+            return f"{seconds * scale:8.2f}{unit}"
+    return f"{seconds * 1e9:8.1f}ns"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-k", dest="filter", default="", help="only run cases containing this text")
+    parser.add_argument("--repeats", type=int, default=7, help="timed repeats per case")
+    parser.add_argument("--min-time", type=float, default=0.05, help="minimum seconds per repeat")
+    parser.add_argument("--fixtures", metavar="DIR", help="also time matching on shop captures in DIR")
+    parser.add_argument("--save-baseline", metavar="FILE", help="write the results as the new baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="slowdown vs the baseline that counts as a regression (0.15 = 15%%)")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    regressions = []
+    with isolated_state() as folder:
+        for name, setup in build_cases(args, folder):
+            if args.filter and args.filter not in name:
+                continue
+            try:
+                fn = setup()
+                fn()
+            except Exception as e:
+                print(f"{name:<45} skipped ({type(e).__name__}: {e})")
+                continue
+            median, iqr, best = measure(fn, repeats=args.repeats, min_time=args.min_time)
+            results[name] = {"median_s": median, "iqr_s": iqr, "min_s": best}
+            line = f"{name:<45} {format_time(median)} ±{format_time(iqr / 2).strip():>9}"
+            if name in baseline:
+                change = median / baseline[name]["median_s"] - 1
+                line += f"  {change:+7.1%} vs baseline"
+                if change > args.threshold:
+                    line += "  REGRESSION"
+                    regressions.append(name)
+            print(line)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+        print(f"\nSaved baseline to {args.save_baseline}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""
+Benchmark sandbox: points every file and folder the bot writes at a
+temporary folder for the duration of a benchmark, so timing a scan never
+touches the tracking database, learned layout, OCR cache, calibration or
+debug folder of the real bot in the working directory.
+
+    with isolated_state() as folder:
+        bot.scan_shop(templates)
+"""
+import contextlib
+import os
+import tempfile
+
+import SeedBot as bot
+
+# SeedBot settings naming a file or folder the bot writes to
+STATE_PATHS = ("TRACKING_DB", "LAYOUT_FILE", "OCR_CACHE_FILE", "CALIBRATION_FILE",
+               "METRICS_TRACE_FILE", "METRICS_PROMETHEUS_FILE", "DEBUG_FOLDER")
+# Objects SeedBot creates lazily from those paths, or from what they hold
+STATE_OBJECTS = ("tracking_store", "seed_totals", "seed_names", "shop_layout", "ocr_pool",
+                 "debug_recorder", "targeted_scans_since_full")
+
+
+@contextlib.contextmanager
+def isolated_state():
+    """Run the bot against a new temporary folder; yields the folder, everything is restored afterwards"""
+    saved = {name: getattr(bot, name) for name in STATE_PATHS + STATE_OBJECTS}
+    with tempfile.TemporaryDirectory(prefix="seedbot_bench_") as folder:
+        for name in STATE_PATHS:
+            # None turns a file off (e.g. OCR_CACHE_FILE): leave it off
+            if saved[name] is not None:
+                setattr(bot, name, os.path.join(folder, os.path.basename(saved[name])))
+        for name in STATE_OBJECTS:
+            setattr(bot, name, None)
+        bot.targeted_scans_since_full = 0
+        try:
+            yield folder
+        finally:
+            # Close what was opened in the folder before it's deleted
+            for name in ("tracking_store", "ocr_pool", "debug_recorder"):
+                opened = getattr(bot, name)
+                if opened is not None and opened is not saved[name]:
+                    opened.close()
+            for name, value in saved.items():
+                setattr(bot, name, value)
@@ -0,0 +1,84 @@
+"""
+Cold start benchmark: times a fresh interpreter from start to the first
+recognized shop capture, so slow imports or asset loading show up.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --live
+
+Each run starts a new Python process. The time is split into importing
+SeedBot, getting the matcher, OCR pool and glyph reader ready, and the first
+capture + rarity match. Results are printed and, with --output, appended as
+one JSON object per line.
+"""
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+import SeedBot as bot
+imported = time.perf_counter()
+if not {live}:
+    from backends import SyntheticShopBackend
+    bot.set_backend(SyntheticShopBackend())
+matcher = bot.get_rarity_matcher()
+bot.get_ocr_pool()
+bot.get_digit_reader()
+ready = time.perf_counter()
+found = bot.find_rarity_boxes(bot.capture_shop(), matcher)
+first = time.perf_counter()
+print(json.dumps({{"import_s": imported - start, "ready_s": ready - imported,
+                  "first_capture_s": first - ready, "boxes": len(found)}}))
+"""
+
+
+def run_once(live):
+    """Start a new interpreter and return its timings, plus the total wall time"""
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD.format(live=live)],
+                         capture_output=True, text=True, check=True).stdout
+    total = time.perf_counter() - start
+    timings = json.loads(out.strip().splitlines()[-1])
+    timings["total_s"] = total
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--live", action="store_true", help="capture the live game window")
+    parser.add_argument("--runs", type=int, default=3, help="number of cold starts to time")
+    parser.add_argument("--label", default="", help="tag stored with the result, e.g. a release")
+    parser.add_argument("--output", metavar="FILE", help="append the result to this JSON-lines file")
+    args = parser.parse_args(argv)
+
+    runs = []
+    for run in range(args.runs):
+        timings = run_once(args.live)
+        runs.append(timings)
+        print(f"Run {run + 1}: import {timings['import_s']:.3f}s | ready {timings['ready_s']:.3f}s | "
+              f"first capture {timings['first_capture_s']:.3f}s | total {timings['total_s']:.3f}s")
+
+    result = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "label": args.label,
+        "backend": "live" if args.live else "synthetic",
+        "python": platform.python_version(),
+        "runs": args.runs,
+    }
+    for key in ("import_s", "ready_s", "first_capture_s", "total_s"):
+        result[key.replace("_s", "_median_s")] = round(statistics.median(r[key] for r in runs), 4)
+    print(f"\nCold start median: {result['total_median_s']:.3f}s over {args.runs} run(s)")
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(result) + "\n")
+    return result
+
+
+if __name__ == "__main__":
+    main()
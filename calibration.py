@@ -0,0 +1,163 @@
+"""
+Screen calibration.
+
+All coordinates in SeedBot are measured on a reference display. Calibration
+finds how the shop is scaled and placed on the current display with a one-off
+multi-scale match of the rarity templates against a full screenshot, and
+returns a Transform that maps reference coordinates to screen coordinates.
+Transforms are cached per display (screen size), so the multi-scale search
+only runs the first time; scans then match templates rescaled once to the UI
+scale, at a single scale.
+"""
+import json
+import os
+
+import cv2
+import numpy as np
+
+from matcher import RarityMatcher
+
+
+class Transform:
+    """screen = scale * reference + offset"""
+
+    def __init__(self, scale=1.0, offset=(0.0, 0.0), score=None):
+        self.scale = float(scale)
+        self.offset = (float(offset[0]), float(offset[1]))
+        self.score = score
+
+    def is_identity(self):
+        return abs(self.scale - 1.0) < 1e-3 and abs(self.offset[0]) < 0.5 and abs(self.offset[1]) < 0.5
+
+    def length(self, value):
+        return int(round(value * self.scale))
+
+    def x(self, value):
+        return int(round(value * self.scale + self.offset[0]))
+
+    def y(self, value):
+        return int(round(value * self.scale + self.offset[1]))
+
+    def point(self, point):
+        """Absolute (x, y)"""
+        return (self.x(point[0]), self.y(point[1]))
+
+    def region(self, region):
+        """Absolute (x, y, w, h)"""
+        x, y, w, h = region
+        return (self.x(x), self.y(y), self.length(w), self.length(h))
+
+    def vector(self, vector):
+        """Relative (dx, dy), or a (w, h) size"""
+        return tuple(self.length(v) for v in vector)
+
+    def to_dict(self):
+        return {"scale": self.scale, "offset": list(self.offset), "score": self.score}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["scale"], data["offset"], data.get("score"))
+
+    def __repr__(self):
+        return f"Transform(scale={self.scale:.3f}, offset=({self.offset[0]:.1f}, {self.offset[1]:.1f}))"
+
+
+def scale_templates(templates, scale):
+    """Resize every template by scale (unchanged for scale 1)"""
+    if abs(scale - 1.0) < 1e-3:
+        return dict(templates)
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    return {rarity: cv2.resize(template, None, fx=scale, fy=scale, interpolation=interpolation)
+            for rarity, template in templates.items() if template is not None}
+
+
+def _best_scale(screen_gray, grays, scales, shrink):
+    """(score, scale) of the best match of any template over scales"""
+    small = cv2.resize(screen_gray, None, fx=1.0 / shrink, fy=1.0 / shrink,
+                       interpolation=cv2.INTER_AREA) if shrink > 1 else screen_gray
+    best = (-1.0, None)
+    for scale in scales:
+        factor = scale / shrink
+        for gray in grays:
+            template = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+            th, tw = template.shape
+            if th < 6 or tw < 6 or th > small.shape[0] or tw > small.shape[1]:
+                continue
+            score = float(cv2.matchTemplate(small, template, cv2.TM_CCOEFF_NORMED).max())
+            if score > best[0]:
+                best = (score, float(scale))
+    return best
+
+
+def detect(screen, templates, first_slot, scales=None, threshold=0.8):
+    """
+    Find the UI scale and placement on a full screenshot (BGR) showing the
+    shop with its list scrolled to the top.
+
+    The scale is searched coarse to fine over scales (default 0.5-2.0). The
+    offset comes from the top rarity box, which sits at first_slot on the
+    reference display. Returns a Transform, or None if no rarity box matches
+    at least threshold.
+    """
+    screen_gray = screen if screen.ndim == 2 else cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY)
+    grays = [t if t.ndim == 2 else cv2.cvtColor(t, cv2.COLOR_BGR2GRAY)
+             for t in templates.values() if t is not None]
+    if not grays:
+        return None
+    if scales is None:
+        scales = np.arange(0.5, 2.0001, 0.05)
+    score, scale = _best_scale(screen_gray, grays, scales, shrink=2)
+    if scale is None:
+        return None
+    fine = np.arange(scale - 0.05, scale + 0.0501, 0.01)
+    score, scale = _best_scale(screen_gray, grays, fine[fine > 0], shrink=1)
+    if scale is None or score < threshold:
+        return None
+
+    matcher = RarityMatcher(scale_templates(templates, scale), threshold=threshold)
+    boxes = matcher.find(screen)
+    if not boxes:
+        return None
+    top = boxes[0]
+    cx, cy = top['center']
+    offset = (cx - scale * first_slot[0], cy - scale * first_slot[1])
+    return Transform(scale, offset, score=round(top['score'], 3))
+
+
+class CalibrationCache:
+    """Transforms per display, stored as JSON"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.transforms = {}
+        if path:
+            self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.transforms = {key: Transform.from_dict(value) for key, value in data.items()}
+        except Exception as e:
+            print(f"Could not load calibration from {self.path}: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({key: t.to_dict() for key, t in self.transforms.items()}, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def get(self, key):
+        return self.transforms.get(key)
+
+    def put(self, key, transform):
+        self.transforms[key] = transform
+        self.save()
+
+    def forget(self, key):
+        if self.transforms.pop(key, None) is not None:
+            self.save()
@@ -0,0 +1,359 @@
+"""
+Multi-window coordinator.
+
+Runs one SeedBot per game window, so several accounts can be scanned from one
+machine. Every window gets its own worker process (SeedBot keeps its scan
+state in module globals) with its own capture region and scan state, so
+windows capture and recognize in parallel. They all share one mouse: a window
+that wants to click asks the input arbiter in the coordinating process, which
+hands the mouse out one click at a time, most urgent request first. Buying a
+Divine seed beats buying a Mythical one, which beats scanning; on a tie the
+window that clicked last goes again, so the game's focus changes as rarely as
+possible.
+
+    python -m coordinator windows.json
+    python -m coordinator --synthetic 3 --cycles 1
+
+windows.json lists the windows as [{"name": "alt1", "region": [x, y, w, h]}];
+all coordinates in SeedBot are then relative to a window's top left corner.
+--synthetic runs that many synthetic shops instead of the live screen, with
+their tracking database, layouts, OCR caches and debug folders in a temporary
+folder that is deleted afterwards.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from backends import Backend
+
+SCAN_URGENCY = 100  # clicks made while scanning, behind every purchase
+
+
+class ShopWindow:
+    """A game window: where it is on the screen and, optionally, where to click to focus it"""
+
+    def __init__(self, name, region, focus_point=None):
+        self.name = name
+        self.region = tuple(int(v) for v in region)  # (x, y, w, h)
+        self.focus_point = tuple(focus_point) if focus_point else None  # relative to the window
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["name"], data["region"], data.get("focus_point"))
+
+    def __repr__(self):
+        return f"ShopWindow({self.name!r}, region={self.region})"
+
+
+def load_windows(path):
+    with open(path) as f:
+        return [ShopWindow.from_dict(data) for data in json.load(f)]
+
+
+class InputArbiter:
+    """
+    Decides which window gets the mouse. Every window has at most one
+    request outstanding; request() and release() return the grants they
+    cause as [(window, switched)], switched being True when the mouse moves
+    to a different window than the one that clicked last.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.holder = None
+        self.last = None
+        self.switches = 0
+        self._waiting = {}  # window: (urgency, seq, requested at)
+        self._seq = 0
+        self.waits = defaultdict(list)  # window: seconds waited for each grant
+
+    def request(self, window, urgency):
+        self._waiting[window] = (urgency, self._seq, self.clock())
+        self._seq += 1
+        return self._grant()
+
+    def release(self, window):
+        if self.holder == window:
+            self.holder = None
+        return self._grant()
+
+    def forget(self, window):
+        """Drop a window that went away, including the mouse if it had it"""
+        self._waiting.pop(window, None)
+        return self.release(window)
+
+    def _grant(self):
+        if self.holder is not None or not self._waiting:
+            return []
+        window = min(self._waiting, key=lambda w: (self._waiting[w][0], w != self.last, self._waiting[w][1]))
+        urgency, seq, requested = self._waiting.pop(window)
+        self.waits[window].append(self.clock() - requested)
+        switched = self.last is not None and window != self.last
+        self.switches += switched
+        self.holder = self.last = window
+        return [(window, switched)]
+
+    def report(self):
+        if not self.waits:
+            return
+        print("\n--- INPUT ARBITER ---")
+        for window, waits in sorted(self.waits.items()):
+            print(f"{window:>12}: {len(waits):5d} clicks | median wait {statistics.median(waits) * 1000:6.1f}ms | "
+                  f"max wait {max(waits) * 1000:6.1f}ms")
+        print(f"  {self.switches} switches between windows")
+
+
+class ArbiterClient:
+    """The worker side of the arbiter: blocks until the coordinator grants the mouse"""
+
+    def __init__(self, window, requests, grants):
+        self.window = window
+        self.requests = requests
+        self.grants = grants
+
+    def acquire(self, urgency):
+        """Wait for the mouse; returns True if another window had it last"""
+        self.requests.put(("acquire", self.window, urgency))
+        return self.grants.get()
+
+    def release(self):
+        self.requests.put(("release", self.window, None))
+
+
+class WindowBackend(Backend):
+    """
+    One window of a shared screen: regions and clicks are relative to the
+    window, and every click waits for the arbiter.
+    """
+
+    def __init__(self, inner, window, arbiter):
+        self.inner = inner
+        self.window = window
+        self.arbiter = arbiter
+        self.level = SCAN_URGENCY
+
+    def _region(self, region):
+        x, y, w, h = self.window.region
+        if region is None:
+            return (x, y, w, h)
+        return (region[0] + x, region[1] + y, region[2], region[3])
+
+    def screenshot(self, region=None):
+        return self.inner.screenshot(self._region(region))
+
+    def grab(self, region=None, out=None):
+        return self.inner.grab(self._region(region), out=out)
+
+    def click(self, x, y, delay=0.4):
+        wx, wy = self.window.region[:2]
+        switched = self.arbiter.acquire(self.level)
+        try:
+            if switched and self.window.focus_point:
+                fx, fy = self.window.focus_point
+                self.inner.click(fx + wx, fy + wy, delay=0.05)
+            self.inner.click(x + wx, y + wy, delay=delay)
+        finally:
+            self.arbiter.release()
+
+    def tap(self, x, y, count=1, interval=0.0, delay=0.0):
+        wx, wy = self.window.region[:2]
+        switched = self.arbiter.acquire(self.level)
+        try:
+            if switched and self.window.focus_point:
+                fx, fy = self.window.focus_point
+                self.inner.tap(fx + wx, fy + wy, delay=0.05)
+            self.inner.tap(x + wx, y + wy, count=count, interval=interval, delay=delay)
+        finally:
+            self.arbiter.release()
+
+    def urgency(self, level):
+        return _Urgency(self, level)
+
+    def close(self):
+        self.inner.close()
+
+
+class _Urgency:
+    def __init__(self, backend, level):
+        self.backend = backend
+        self.level = level
+
+    def __enter__(self):
+        self.previous = self.backend.level
+        self.backend.level = min(self.level, self.previous)
+        return self
+
+    def __exit__(self, *exc):
+        self.backend.level = self.previous
+        return False
+
+
+def live_backend(window):
+    from backends import LiveBackend
+    return LiveBackend(failsafe_hotkey='ctrl+e')
+
+
+def synthetic_backend(window):
+    """A synthetic shop of its own for every window, for trying the coordinator out offline"""
+    from backends import SyntheticShopBackend
+    return SyntheticShopBackend()
+
+
+def state_path(path, folder):
+    """path moved into folder with the same file name (unchanged if folder is None)"""
+    if not path or not folder:
+        return path
+    return os.path.join(folder, os.path.basename(path))
+
+
+def window_path(path, window):
+    """path with the window name added, e.g. shop_layout.json -> shop_layout.alt1.json"""
+    if not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{window.name}{ext}"
+
+
+class _Prefixed:
+    """Prefix every line written to a stream, so the windows' output can be told apart"""
+
+    def __init__(self, stream, prefix):
+        self.stream = stream
+        self.prefix = prefix
+        self.at_line_start = True
+
+    def write(self, text):
+        for line in text.splitlines(keepends=True):
+            if self.at_line_start:
+                self.stream.write(self.prefix)
+            self.stream.write(line)
+            self.at_line_start = line.endswith("\n")
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def run_window(window, backend_factory, requests, grants, cycles, state_folder=None):
+    """Worker process: one SeedBot scanning window, writing its files to state_folder if given"""
+    sys.stdout = _Prefixed(sys.stdout, f"[{window.name}] ")
+    import SeedBot as bot
+
+    # Files a bot rewrites get one copy per window; the tracking database is shared
+    bot.TRACKING_DB = state_path(bot.TRACKING_DB, state_folder)
+    bot.LAYOUT_FILE = window_path(state_path(bot.LAYOUT_FILE, state_folder), window)
+    bot.OCR_CACHE_FILE = window_path(state_path(bot.OCR_CACHE_FILE, state_folder), window)
+    bot.CALIBRATION_FILE = window_path(state_path(bot.CALIBRATION_FILE, state_folder), window)
+    bot.METRICS_TRACE_FILE = window_path(state_path(bot.METRICS_TRACE_FILE, state_folder), window)
+    bot.METRICS_PROMETHEUS_FILE = window_path(state_path(bot.METRICS_PROMETHEUS_FILE, state_folder), window)
+    bot.DEBUG_FOLDER = os.path.join(state_path(bot.DEBUG_FOLDER, state_folder), window.name)
+
+    client = ArbiterClient(window.name, requests, grants)
+    bot.set_backend(WindowBackend(backend_factory(window), window, client))
+    reason = "finished"
+    try:
+        bot.run(cycles)
+    except KeyboardInterrupt:
+        reason = "stopped by user"
+    finally:
+        bot.shutdown(reason, export_csv=False)
+        requests.put(("done", window.name, None))
+
+
+class Coordinator:
+    def __init__(self, windows, backend_factory=live_backend, cycles=None, state_folder=None):
+        """
+        Args:
+            windows: ShopWindows to scan, with distinct names
+            backend_factory: backend_factory(window) -> Backend, called in the
+                             worker process; must be a module-level function
+            cycles: scans per window before it stops (None: keep going)
+            state_folder: folder for the files the bots write (None: the working directory)
+        """
+        self.windows = windows
+        self.backend_factory = backend_factory
+        self.cycles = cycles
+        self.state_folder = state_folder
+        self.arbiter = InputArbiter()
+
+    def run(self):
+        """Start a worker per window and hand out the mouse until they are all done"""
+        context = multiprocessing.get_context("spawn")
+        requests = context.Queue()
+        grants = {window.name: context.Queue() for window in self.windows}
+        workers = {}
+        for window in self.windows:
+            process = context.Process(target=run_window, name=f"seedbot-{window.name}",
+                                      args=(window, self.backend_factory, requests,
+                                            grants[window.name], self.cycles, self.state_folder))
+            process.start()
+            workers[window.name] = process
+
+        running = set(workers)
+        try:
+            while running:
+                try:
+                    kind, name, urgency = requests.get(timeout=0.5)
+                except queue.Empty:
+                    for name in [name for name in running if not workers[name].is_alive()]:
+                        print(f"Window {name} stopped unexpectedly.")
+                        running.discard(name)
+                        self._send(grants, self.arbiter.forget(name))
+                    continue
+                if kind == "acquire":
+                    self._send(grants, self.arbiter.request(name, urgency))
+                elif kind == "release":
+                    self._send(grants, self.arbiter.release(name))
+                elif kind == "done":
+                    running.discard(name)
+                    self._send(grants, self.arbiter.forget(name))
+        finally:
+            for process in workers.values():
+                process.join()
+        self.arbiter.report()
+
+    @staticmethod
+    def _send(grants, granted):
+        for window, switched in granted:
+            grants[window].put(switched)
+
+
+def run_coordinator(coordinator):
+    """Run coordinator until every window is done or Ctrl+C"""
+    try:
+        coordinator.run()
+    except KeyboardInterrupt:
+        print("\nCoordinator stopped by user.")
+        coordinator.arbiter.report()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scan several game windows sharing one mouse")
+    parser.add_argument("windows", nargs="?", help="JSON file listing the windows")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="scan N synthetic shops instead")
+    parser.add_argument("--cycles", type=int, help="scans per window before stopping (default: forever)")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        windows = [ShopWindow(f"shop{i + 1}", (0, 0, 1920, 1080)) for i in range(args.synthetic)]
+        # Synthetic shops mustn't end up in the real tracking history or layouts
+        with tempfile.TemporaryDirectory(prefix="seedbot_synthetic_") as folder:
+            run_coordinator(Coordinator(windows, synthetic_backend, cycles=args.cycles,
+                                        state_folder=folder))
+    elif args.windows:
+        run_coordinator(Coordinator(load_windows(args.windows), live_backend, cycles=args.cycles))
+        import SeedBot as bot
+        bot.save_tracking_data_to_csv()
+    else:
+        parser.error("give a windows file or --synthetic N")
+
+
+if __name__ == "__main__":
+    main()
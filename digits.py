@@ -0,0 +1,220 @@
+"""
+Glyph-template reader for the numeric fields (stock counts and the restock
+timer), which use a single game font with only 0-9, x and ':'.
+
+A crop is binarized, split into connected components (components that overlap
+horizontally, like the two dots of ':', are merged), grouped into words by
+the gaps between them, and every glyph of the requested word is classified at
+once by correlating it against the learned glyph templates. The reader
+reports the lowest glyph score as its confidence so callers can fall back to
+Tesseract when it is unsure.
+
+Glyph templates are bootstrapped from debug crops:
+
+    python -m digits bootstrap debug --output templates/glyphs.npz
+
+which reads every stock_*.png / restock_time*.png crop once with Tesseract
+and keeps the glyphs of crops where the text and the segmentation agree.
+"""
+import argparse
+import glob
+import os
+
+import cv2
+import numpy as np
+
+GLYPH_SIZE = (12, 20)  # (w, h) every glyph is resampled to
+ALPHABET = "0123456789x:"
+BOOTSTRAP_CONFIG = '--psm 7 -c tessedit_char_whitelist=0123456789xX:'
+
+
+def binarize(img):
+    """Grayscale + Otsu threshold with the text as the (minority) white pixels"""
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    _, binary = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    if np.count_nonzero(binary) > binary.size // 2:
+        binary = cv2.bitwise_not(binary)
+    return binary
+
+
+def segment(binary, min_area=4, word_gap=0.4):
+    """
+    Split a binarized crop into words of glyph boxes.
+
+    Returns a list of words, each a list of (x, y, w, h) boxes left to right.
+    Components overlapping horizontally are merged into one glyph; a gap wider
+    than word_gap times the median glyph height starts a new word.
+    """
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    boxes = [tuple(stats[i, :4]) for i in range(1, count) if stats[i, 4] >= min_area]
+    if not boxes:
+        return []
+    boxes.sort()
+    merged = [list(boxes[0])]
+    for x, y, w, h in boxes[1:]:
+        last = merged[-1]
+        if x < last[0] + last[2]:
+            x1, y1 = min(last[0], x), min(last[1], y)
+            x2, y2 = max(last[0] + last[2], x + w), max(last[1] + last[3], y + h)
+            merged[-1] = [x1, y1, x2 - x1, y2 - y1]
+        else:
+            merged.append([x, y, w, h])
+
+    gap_limit = word_gap * float(np.median([box[3] for box in merged]))
+    words = [[tuple(merged[0])]]
+    for prev, box in zip(merged, merged[1:]):
+        if box[0] - (prev[0] + prev[2]) > gap_limit:
+            words.append([])
+        words[-1].append(tuple(box))
+    return words
+
+
+def glyph_features(binary, word):
+    """
+    Feature vectors and aspect ratios for the glyphs of one word.
+
+    Every glyph is cut over the full height of its word, so small glyphs such
+    as ':' and 'x' keep their vertical position, resampled to GLYPH_SIZE and
+    normalized to zero mean and unit length. Returns (vectors, aspects).
+    """
+    top = min(y for _, y, _, _ in word)
+    bottom = max(y + h for _, y, _, h in word)
+    line_h = max(1, bottom - top)
+    vectors = np.empty((len(word), GLYPH_SIZE[0] * GLYPH_SIZE[1]), dtype=np.float32)
+    aspects = np.empty(len(word), dtype=np.float32)
+    for i, (x, _, w, _) in enumerate(word):
+        glyph = cv2.resize(binary[top:bottom, x:x + w], GLYPH_SIZE, interpolation=cv2.INTER_AREA)
+        vectors[i] = glyph.ravel()
+        aspects[i] = w / line_h
+    vectors -= vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.maximum(norms, 1e-6)
+    return vectors, aspects
+
+
+class DigitReader:
+    def __init__(self, chars=(), vectors=None, aspects=None, aspect_weight=0.5):
+        """
+        Args:
+            chars: label of every glyph template
+            vectors: (len(chars), GLYPH_SIZE[0] * GLYPH_SIZE[1]) template features
+            aspects: width / line height of every template
+            aspect_weight: score penalty per unit of aspect ratio difference
+        """
+        self.chars = np.array(list(chars), dtype="<U1")
+        dim = GLYPH_SIZE[0] * GLYPH_SIZE[1]
+        self.vectors = np.zeros((0, dim), np.float32) if vectors is None else np.asarray(vectors, np.float32)
+        self.aspects = np.zeros(0, np.float32) if aspects is None else np.asarray(aspects, np.float32)
+        self.aspect_weight = aspect_weight
+
+    def __len__(self):
+        return len(self.chars)
+
+    @classmethod
+    def load(cls, path):
+        """Load glyph templates saved by save(); returns None if the file doesn't exist"""
+        if not os.path.exists(path):
+            return None
+        data = np.load(path)
+        return cls(data["chars"].tolist(), data["vectors"], data["aspects"])
+
+    def save(self, path):
+        np.savez(path, chars=self.chars, vectors=self.vectors, aspects=self.aspects)
+
+    def read(self, img, word=0):
+        """
+        Read one word from a crop (RGB/BGR or grayscale array).
+
+        Returns (text, confidence), where confidence is the lowest glyph score
+        in the word (1.0 is a perfect match), or ("", 0.0) if there is nothing
+        to read or no templates are loaded.
+        """
+        if len(self.chars) == 0:
+            return "", 0.0
+        binary = binarize(img)
+        words = segment(binary)
+        if len(words) <= word:
+            return "", 0.0
+        vectors, aspects = glyph_features(binary, words[word])
+        scores = vectors @ self.vectors.T
+        scores -= self.aspect_weight * np.abs(aspects[:, None] - self.aspects[None, :])
+        best = scores.argmax(axis=1)
+        confidence = float(scores[np.arange(len(best)), best].min())
+        return "".join(self.chars[best]), confidence
+
+    def learn(self, img, text, word=0):
+        """
+        Add the glyphs of one word of a crop as templates for the characters
+        of text. Nothing is learned unless text has exactly one character per
+        glyph. Returns True if the glyphs were added.
+        """
+        text = text.strip().lower()
+        if not text or any(c not in ALPHABET for c in text):
+            return False
+        binary = binarize(img)
+        words = segment(binary)
+        if len(words) <= word or len(words[word]) != len(text):
+            return False
+        vectors, aspects = glyph_features(binary, words[word])
+        self.chars = np.concatenate([self.chars, np.array(list(text), dtype="<U1")])
+        self.vectors = np.vstack([self.vectors, vectors])
+        self.aspects = np.concatenate([self.aspects, aspects])
+        return True
+
+    def condense(self, per_char=4):
+        """Keep at most per_char templates for every character (the most typical ones)"""
+        keep = []
+        for char in np.unique(self.chars):
+            idx = np.flatnonzero(self.chars == char)
+            if len(idx) > per_char:
+                mean = self.vectors[idx].mean(axis=0)
+                idx = idx[np.argsort(-(self.vectors[idx] @ mean))[:per_char]]
+            keep.extend(idx.tolist())
+        keep.sort()
+        self.chars = self.chars[keep]
+        self.vectors = self.vectors[keep]
+        self.aspects = self.aspects[keep]
+
+
+def bootstrap(folder, patterns=("stock_*.png", "restock_time*.png"), reader=None):
+    """Learn glyph templates from the debug crops in folder using Tesseract as the labeler"""
+    import pytesseract
+    reader = reader or DigitReader()
+    used = skipped = 0
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.join(folder, pattern))):
+            img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if img is None:
+                continue
+            words = pytesseract.image_to_string(binarize(img), config=BOOTSTRAP_CONFIG).split()
+            if words and reader.learn(img, words[0]):
+                used += 1
+            else:
+                skipped += 1
+    print(f"Learned glyphs from {used} crops ({skipped} skipped): "
+          f"{''.join(sorted(set(reader.chars.tolist())))}")
+    return reader
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Glyph templates for the numeric fields")
+    sub = parser.add_subparsers(dest="command", required=True)
+    boot = sub.add_parser("bootstrap", help="learn glyph templates from debug crops")
+    boot.add_argument("folder", help="folder with stock_*.png / restock_time*.png crops")
+    boot.add_argument("--output", default=os.path.join("templates", "glyphs.npz"))
+    boot.add_argument("--per-char", type=int, default=4, help="templates kept per character")
+    boot.add_argument("--tesseract", metavar="PATH", help="override the tesseract executable")
+    args = parser.parse_args(argv)
+
+    if args.tesseract:
+        import pytesseract
+        pytesseract.pytesseract.tesseract_cmd = args.tesseract
+    reader = bootstrap(args.folder)
+    reader.condense(args.per_char)
+    reader.save(args.output)
+    print(f"Saved {len(reader)} glyph templates to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
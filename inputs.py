@@ -0,0 +1,95 @@
+"""
+Input layer: how the cursor gets to a click.
+
+Natural moves (the cursor travels there in small randomized steps) cost a
+few hundred milliseconds per click, which is wasted on repeat clicks at the
+spot the cursor is already on, like the buy button or the scroll arrow.
+InputLayer sends those as fast taps instead, where the backend teleports the
+cursor and sends the clicks as one batch, and keeps natural moves for the
+long ones. It tracks where the cursor is and how long input takes per mode,
+so the gain shows up in its report.
+"""
+import math
+import time
+from collections import defaultdict
+
+MODES = ("natural", "fast", "auto")
+
+
+def distance(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+class InputLayer:
+    def __init__(self, backend, mode="auto", fast_distance=8, tap_interval=0.03, tap_delay=0.0,
+                 clock=time.perf_counter):
+        """
+        Args:
+            backend: function returning the backend to click through
+            mode: "natural" moves every time, "fast" always taps, "auto" taps
+                  when the cursor is within fast_distance pixels of the target
+                  (repeat clicks) and moves naturally otherwise
+            fast_distance: pixels from the cursor still counted as the same spot
+            tap_interval: seconds between repeated fast clicks
+            tap_delay: seconds to pause after a fast click, before the settle wait
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown input mode {mode!r}, expected one of {MODES}")
+        self.backend = backend
+        self.mode = mode
+        self.fast_distance = fast_distance
+        self.tap_interval = tap_interval
+        self.tap_delay = tap_delay
+        self.clock = clock
+        self.position = None  # last click, None until the first one
+        self.seconds = defaultdict(float)  # mode: seconds spent clicking
+        self.clicks = defaultdict(int)
+        self.travel = 0.0
+
+    def is_fast(self, x, y):
+        if self.mode != "auto":
+            return self.mode == "fast"
+        return self.position is not None and distance(self.position, (x, y)) <= self.fast_distance
+
+    def click(self, x, y, delay=0.4, count=1):
+        """Click (x, y) count times; returns the mode used"""
+        backend = self.backend()
+        mode = "fast" if self.is_fast(x, y) else "natural"
+        if self.position is not None:
+            self.travel += distance(self.position, (x, y))
+        start = self.clock()
+        if mode == "natural":
+            backend.click(x, y, delay=delay)
+            self._count("natural", 1, start)
+            count -= 1
+            if self.mode == "natural":
+                for _ in range(count):
+                    start = self.clock()
+                    backend.click(x, y, delay=delay)
+                    self._count("natural", 1, start)
+                count = 0
+            start = self.clock()
+        if count > 0:
+            # Repeat clicks land where the cursor already is
+            backend.tap(x, y, count=count, interval=self.tap_interval, delay=self.tap_delay)
+            self._count("fast", count, start)
+        self.position = (x, y)
+        return mode
+
+    def _count(self, mode, clicks, start):
+        self.seconds[mode] += self.clock() - start
+        self.clicks[mode] += clicks
+
+    def stats(self):
+        return {mode: {"clicks": self.clicks[mode], "seconds": self.seconds[mode]}
+                for mode in ("natural", "fast") if self.clicks[mode]}
+
+    def report(self):
+        stats = self.stats()
+        if not stats:
+            return
+        print("\n--- INPUT ---")
+        for mode, s in stats.items():
+            print(f"{mode:>12}: {s['clicks']:5d} clicks | {s['seconds']:6.2f}s | "
+                  f"{s['seconds'] / s['clicks'] * 1000:6.1f}ms per click")
+        print(f"  cursor travel {self.travel:.0f}px")
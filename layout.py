@@ -0,0 +1,109 @@
+"""
+Learned shop layout.
+
+The seed order in the shop doesn't change between restocks, so every full
+scan is used to learn seed name -> list position -> rarity. Once the same
+order has been seen LAYOUT_MIN_CONFIRMATIONS times in a row, a targeted scan
+can go straight to the positions of the seeds worth buying instead of
+walking every row. Any mismatch between what the layout predicts and what is
+on screen means the shop changed and the next scan walks the full list again.
+"""
+import datetime
+import json
+import os
+import re
+
+
+def normalize_name(name):
+    """Lowercase letters and digits only, so OCR spacing/punctuation noise doesn't matter"""
+    return re.sub(r'[^a-z0-9]', '', name.lower())
+
+
+class ShopLayout:
+    def __init__(self, path=None, min_confirmations=2):
+        """
+        Args:
+            path: JSON file the layout is loaded from and saved to (None: memory only)
+            min_confirmations: identical full scans needed before the layout is trusted
+        """
+        self.path = path
+        self.min_confirmations = min_confirmations
+        self.seeds = []  # [(name, rarity)] in list order
+        self.confirmations = 0
+        self.updated = None
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not load shop layout {self.path}: {e}")
+            return
+        self.seeds = [(seed["name"], seed["rarity"]) for seed in data.get("seeds", [])]
+        self.confirmations = data.get("confirmations", 0)
+        self.updated = data.get("updated")
+
+    def save(self):
+        if not self.path:
+            return
+        data = {
+            "seeds": [{"position": i, "name": name, "rarity": rarity}
+                      for i, (name, rarity) in enumerate(self.seeds)],
+            "confirmations": self.confirmations,
+            "updated": self.updated,
+        }
+        with open(self.path, "w") as f:
+            json.dump(data, f, indent=2)
+
+    def trusted(self):
+        return bool(self.seeds) and self.confirmations >= self.min_confirmations
+
+    def learn(self, seeds):
+        """
+        Update the layout from the (name, rarity) order of a full scan. The
+        same order as before counts as a confirmation; anything else replaces
+        the layout and starts counting again.
+        """
+        seeds = [(name.strip(), rarity) for name, rarity in seeds if name and rarity]
+        if not seeds:
+            return
+        if self._same(seeds):
+            self.confirmations += 1
+        else:
+            if self.seeds:
+                print("Shop layout changed, relearning seed positions.")
+            self.seeds = seeds
+            self.confirmations = 1
+        self.updated = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.save()
+
+    def invalidate(self):
+        """Stop trusting the layout until full scans confirm it again"""
+        self.confirmations = 0
+        self.save()
+
+    def _same(self, seeds):
+        return len(seeds) == len(self.seeds) and all(
+            normalize_name(a[0]) == normalize_name(b[0]) and a[1] == b[1]
+            for a, b in zip(seeds, self.seeds))
+
+    def targets(self, rarities):
+        """[(position, name, rarity)] of every seed of the given rarities, in list order"""
+        return [(i, name, rarity) for i, (name, rarity) in enumerate(self.seeds) if rarity in rarities]
+
+    def position(self, name, rarity):
+        """Position of (name, rarity) in the layout, or None"""
+        key = normalize_name(name)
+        for i, (seed_name, seed_rarity) in enumerate(self.seeds):
+            if seed_rarity == rarity and normalize_name(seed_name) == key:
+                return i
+        return None
+
+    def matches(self, position, name, rarity):
+        """True if (name, rarity) is what the layout expects at position"""
+        if not 0 <= position < len(self.seeds):
+            return False
+        expected_name, expected_rarity = self.seeds[position]
+        return rarity == expected_rarity and normalize_name(name) == normalize_name(expected_name)
@@ -0,0 +1,174 @@
+"""
+Precompiled rarity matcher.
+
+Built once from the dict returned by load_templates(): grayscale (and
+downscaled) templates are kept, only the vertical band where a rarity box can
+sit is searched, and peaks are picked with a vectorized local-maximum pass
+instead of walking every hit above the threshold.
+
+Matching is coarse-to-fine: every template is matched against a downscaled
+copy of the band to find candidate locations, then each candidate is scored
+again at full resolution in a small window around it, where the best-scoring
+rarity wins.
+"""
+import threading
+
+import cv2
+import numpy as np
+
+
+def _score_maps(img, grays):
+    """
+    TM_CCOEFF_NORMED scores of every template, aligned on box centers.
+
+    Returns a (len(grays), H, W) array where [i, y, x] is the score of
+    template i centered at (x, y) in img. Centers a template can't reach keep
+    a score of -1.
+    """
+    scores = np.full((len(grays),) + img.shape[:2], -1.0, dtype=np.float32)
+    for index, gray in enumerate(grays):
+        h, w = gray.shape
+        if img.shape[0] < h or img.shape[1] < w:
+            continue
+        res = cv2.matchTemplate(img, gray, cv2.TM_CCOEFF_NORMED)
+        scores[index, h // 2:h // 2 + res.shape[0], w // 2:w // 2 + res.shape[1]] = res
+    return scores
+
+
+def _local_maxima(score, threshold, radius):
+    """(ys, xs) of points >= threshold that are the maximum of their neighbourhood"""
+    kernel = np.ones((2 * radius + 1, 2 * radius + 1), np.uint8)
+    peaks = (score >= threshold) & (score == cv2.dilate(score, kernel))
+    return np.nonzero(peaks)
+
+
+class RarityMatcher:
+    def __init__(self, templates, band=None, threshold=0.85, radius=10, downscale=3,
+                 coarse_threshold=None, refine_margin=0.1):
+        """
+        Args:
+            templates: {rarity: BGR template image} as returned by load_templates
+            band: (min_y, max_y) range of valid box centers in shop image coordinates,
+                  or None to search the whole image
+            threshold: minimum full-resolution TM_CCOEFF_NORMED score for a match
+            radius: matches closer than this (in pixels) count as one location
+            downscale: shrink factor for the coarse pass
+            coarse_threshold: minimum coarse score for a candidate, defaults to
+                              threshold - 0.25
+            refine_margin: rarities scoring within this of the best coarse score
+                           at a candidate are re-scored at full resolution
+        """
+        self.rarities = []
+        self.grays = []
+        self._local = threading.local()  # grayscale buffer per scanning thread
+        for rarity, template in templates.items():
+            if template is None:
+                continue
+            if template.ndim == 3:
+                template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+            self.rarities.append(rarity)
+            self.grays.append(np.ascontiguousarray(template))
+        self.band = band
+        self.threshold = threshold
+        self.radius = radius
+        self.downscale = max(1, int(downscale))
+        self.coarse_threshold = threshold - 0.25 if coarse_threshold is None else coarse_threshold
+        self.refine_margin = refine_margin
+        self.max_h = max((g.shape[0] for g in self.grays), default=0)
+        self.max_w = max((g.shape[1] for g in self.grays), default=0)
+        self.coarse_grays = [self._shrink(g) for g in self.grays]
+
+    def __len__(self):
+        return len(self.grays)
+
+    def _shrink(self, img):
+        if self.downscale == 1:
+            return img
+        f = 1.0 / self.downscale
+        return cv2.resize(img, None, fx=f, fy=f, interpolation=cv2.INTER_AREA)
+
+    def _band_rows(self, height):
+        """(start, end) rows of the image to search and (lo, hi) valid center rows"""
+        if self.band is None:
+            return 0, height, 0, height - 1
+        lo, hi = self.band
+        start = max(0, lo - self.max_h)
+        end = min(height, hi + self.max_h)
+        return start, end, max(lo, start), min(hi, end - 1)
+
+    def _candidates(self, band_img):
+        """
+        Coarse pass over the band. Returns approximate box centers (ys, xs) in
+        band_img coordinates and, for each, the indices of the templates worth
+        re-scoring at full resolution.
+        """
+        small = self._shrink(band_img)
+        scores = _score_maps(small, self.coarse_grays)
+        best = scores.max(axis=0)
+        ys, xs = _local_maxima(best, self.coarse_threshold, max(1, self.radius // self.downscale))
+        # Per-template scores around each peak; templates of different sizes
+        # can peak a pixel apart at the coarse scale.
+        padded = np.pad(scores, ((0, 0), (1, 1), (1, 1)), constant_values=-1.0)
+        near = np.stack([padded[:, ys + dy, xs + dx] for dy in range(3) for dx in range(3)]).max(axis=0)
+        worth = near >= best[ys, xs] - self.refine_margin
+        return ys * self.downscale, xs * self.downscale, worth.T
+
+    def _refine(self, shop_gray, cx, cy, indices):
+        """Best (score, template index, x, y) near an approximate center"""
+        margin = self.downscale + 1
+        x0 = max(0, cx - self.max_w // 2 - margin)
+        y0 = max(0, cy - self.max_h // 2 - margin)
+        x1 = min(shop_gray.shape[1], cx + self.max_w // 2 + margin + 1)
+        y1 = min(shop_gray.shape[0], cy + self.max_h // 2 + margin + 1)
+        scores = _score_maps(shop_gray[y0:y1, x0:x1], [self.grays[i] for i in indices])
+        k, y, x = np.unravel_index(np.argmax(scores), scores.shape)
+        return float(scores[k, y, x]), int(indices[k]), int(x + x0), int(y + y0)
+
+    def _gray(self, img):
+        """img in grayscale, converted into a buffer reused across calls"""
+        if img.ndim == 2:
+            return img
+        buf = getattr(self._local, "gray", None)
+        if buf is None or buf.shape != img.shape[:2]:
+            buf = self._local.gray = np.empty(img.shape[:2], dtype=np.uint8)
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=buf)
+
+    def find(self, shop_img):
+        """
+        Find rarity boxes in a BGR (or grayscale) shop image.
+
+        Returns a list of {'rarity', 'center', 'size', 'score'} dicts in shop
+        image coordinates, one per location, sorted top to bottom.
+        """
+        if not self.grays:
+            return []
+        shop_gray = self._gray(shop_img)
+        start, end, lo, hi = self._band_rows(shop_gray.shape[0])
+        ys, xs, worth = self._candidates(shop_gray[start:end])
+
+        matches = []
+        for y, x, mask in zip((ys + start).tolist(), xs.tolist(), worth):
+            score, index, mx, my = self._refine(shop_gray, x, y, np.flatnonzero(mask))
+            if score >= self.threshold and lo <= my <= hi:
+                matches.append((score, my, mx, index))
+        if not matches:
+            return []
+
+        # Neighbouring candidates can refine onto the same box; keep the best
+        # scoring match of each cluster.
+        arr = np.array(matches, dtype=np.float64)
+        arr = arr[np.lexsort((arr[:, 2], arr[:, 1], -arr[:, 0]))]
+        close = (np.abs(arr[:, None, 1] - arr[None, :, 1]) <= self.radius) & \
+                (np.abs(arr[:, None, 2] - arr[None, :, 2]) <= self.radius)
+        arr = arr[~np.tril(close, k=-1).any(axis=1)]
+
+        found = []
+        for score, y, x, index in sorted(arr.tolist(), key=lambda m: (m[1], m[2])):
+            h, w = self.grays[int(index)].shape
+            found.append({
+                'rarity': self.rarities[int(index)],
+                'center': (int(x), int(y)),
+                'size': (w, h),
+                'score': score,
+            })
+        return found
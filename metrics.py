@@ -0,0 +1,206 @@
+"""
+Stage timings and counters.
+
+Code marks a stage with a span (`with metrics.span("capture"):` or the
+`@metrics.timed("capture")` decorator) and counts events with
+`metrics.count("clicks")`. When enabled, every span is kept as a duration
+sample and as a trace event, and can be exported as:
+
+- a trace, one Chrome trace event per line; `python -m metrics chrome
+  trace.jsonl trace.json` turns it into a file chrome://tracing and Perfetto
+  open
+- Prometheus text format: counters and a histogram per stage
+
+When disabled, span() returns a shared no-op context manager and count()
+returns immediately, so instrumented code costs one attribute check.
+"""
+import argparse
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics._record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class Metrics:
+    def __init__(self, enabled=False, history=1000, max_events=100000):
+        """
+        Args:
+            enabled: record anything at all
+            history: duration samples kept per stage for the printed report
+            max_events: trace events kept in memory between exports
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self.durations = defaultdict(lambda: deque(maxlen=history))
+        self.buckets = defaultdict(lambda: [0] * (len(BUCKETS) + 1))  # last bucket is +Inf
+        self.sums = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.events = deque(maxlen=max_events)
+
+    def span(self, name):
+        """Context manager timing one stage"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def timed(self, name):
+        """Decorator timing every call of a function as the stage name"""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with _Span(self, name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += n
+
+    def _record(self, name, start, end):
+        duration = end - start
+        bucket = bisect.bisect_left(BUCKETS, duration)
+        event = {"name": name, "ph": "X", "ts": round((start - self._origin) * 1e6, 1),
+                 "dur": round(duration * 1e6, 1), "pid": self._pid, "tid": threading.get_ident()}
+        with self._lock:
+            self.durations[name].append(duration)
+            self.buckets[name][bucket] += 1
+            self.sums[name] += duration
+            self.events.append(event)
+
+    def stats(self):
+        """{stage: {count, total, median, p95, max}}; count and total cover the whole run"""
+        with self._lock:
+            samples = {name: np.fromiter(d, dtype=np.float64) for name, d in self.durations.items()}
+            counts = {name: sum(b) for name, b in self.buckets.items()}
+            sums = dict(self.sums)
+        result = {}
+        for name, arr in samples.items():
+            if not len(arr):
+                continue
+            result[name] = {
+                "count": counts[name],
+                "total": sums[name],
+                "median": float(np.median(arr)),
+                "p95": float(np.percentile(arr, 95)),
+                "max": float(arr.max()),
+            }
+        return result
+
+    def report(self):
+        if not self.enabled:
+            return
+        stats = self.stats()
+        print("\n--- STAGE TIMINGS ---")
+        for name, s in sorted(stats.items(), key=lambda item: -item[1]["total"]):
+            print(f"{name:>18}: {s['count']:5d} calls | total {s['total']:7.2f}s | "
+                  f"median {s['median'] * 1000:6.1f}ms | p95 {s['p95'] * 1000:6.1f}ms | "
+                  f"max {s['max'] * 1000:6.1f}ms")
+        if self.counters:
+            print("  " + " | ".join(f"{name}: {count}" for name, count in sorted(self.counters.items())))
+
+    def export_trace(self, path):
+        """Append the trace events recorded since the last export, one per line"""
+        with self._lock:
+            events = list(self.events)
+            self.events.clear()
+        if not events:
+            return 0
+        with open(path, "a") as f:
+            for event in events:
+                f.write(json.dumps(event) + "\n")
+        return len(events)
+
+    def prometheus_text(self, prefix="seedbot"):
+        lines = []
+        with self._lock:
+            counters = dict(self.counters)
+            buckets = {name: list(b) for name, b in self.buckets.items()}
+            sums = dict(self.sums)
+        for name, value in sorted(counters.items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        if buckets:
+            metric = f"{prefix}_stage_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for name, counts in sorted(buckets.items()):
+                cumulative = 0
+                for bound, n in zip(BUCKETS + ("+Inf",), counts):
+                    cumulative += n
+                    lines.append(f'{metric}_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{stage="{name}"}} {sums[name]:.6f}')
+                lines.append(f'{metric}_count{{stage="{name}"}} {cumulative}')
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, path):
+        """Write counters and stage histograms in Prometheus text format (e.g. for node_exporter's textfile collector)"""
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+
+def chrome_trace(trace_path, output_path):
+    """Wrap a trace written by export_trace into a Chrome trace JSON file"""
+    with open(trace_path) as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    with open(output_path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return len(events)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SeedBot stage metrics")
+    sub = parser.add_subparsers(dest="command", required=True)
+    chrome = sub.add_parser("chrome", help="convert a trace to Chrome trace JSON")
+    chrome.add_argument("trace", help="trace written by the bot")
+    chrome.add_argument("output", help="JSON file to write")
+    args = parser.parse_args(argv)
+    count = chrome_trace(args.trace, args.output)
+    print(f"Wrote {count} events to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Seed name canonicalization.
+
+Tesseract rarely reads a name the same way twice: "Cacao Seed" comes back as
+"Cacaa Seed", "Carrot Seed" as "Carr0t Seed". Keyed on the raw text, every
+misread became a seed of its own: an extra row in the history, a split total
+and, in the single-entry scan, a "new" seed that kept the scan going.
+
+SeedNames holds the canonical seed names, from an optional seed file (one
+name per line) and from the names seen often enough in the tracking history,
+with an index of their letter pairs. An OCR read resolves to the closest
+canonical name within a few edits, with a confidence, or is flagged as
+unresolved and kept as read. The index narrows the names down to those
+sharing enough letter pairs with the read to be that close, so the edit
+distance is only computed for one or two of them; repeated reads come
+straight from a memo. Names that keep coming back unresolved (a seed
+added by a game update) become canonical once seen min_seen times, but only
+if no canonical name is within reach: a read as close to two names as to
+each other is a misread of one of them, not a new seed.
+
+SeedNames is shared by the recognition workers and the main thread, so
+resolving and adding names take a lock.
+
+    python -m names review              # how the names in the history resolve
+    python -m names resolve "Cacaa Seed"
+"""
+import argparse
+import re
+import threading
+from collections import Counter, defaultdict
+
+# Characters Tesseract mixes up with letters in seed names
+LOOKALIKES = str.maketrans("015", "ols")
+
+
+def name_key(name):
+    """Lowercase letters and digits, look-alike digits mapped to letters: what names are compared on"""
+    return re.sub(r'[^a-z0-9]', '', name.lower()).translate(LOOKALIKES)
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings (Myers' bit-parallel algorithm, one pass over b)"""
+    if not a or not b:
+        return len(a) or len(b)
+    peq = {}
+    for i, c in enumerate(a):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    full = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    pv, mv, score = full, 0, len(a)
+    for c in b:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return score
+
+
+def bigrams(key):
+    """Letter pairs of key, padded at both ends so the first and last letters count as much as the rest"""
+    padded = f"^{key}$"
+    return Counter(padded[i:i + 2] for i in range(len(padded) - 1))
+
+
+class NgramIndex:
+    """Finds the keys within some edit distance of a query, checking only those sharing enough letter pairs"""
+
+    def __init__(self):
+        self.postings = defaultdict(list)  # bigram: [(key, times in key)]
+        self.keys = set()
+
+    def add(self, key):
+        if key in self.keys:
+            return
+        self.keys.add(key)
+        for gram, times in bigrams(key).items():
+            self.postings[gram].append((key, times))
+
+    def search(self, key, max_distance):
+        """[(distance, key)] of every key within max_distance, closest first"""
+        shared = defaultdict(int)
+        for gram, times in bigrams(key).items():
+            for other, other_times in self.postings.get(gram, ()):
+                shared[other] += min(times, other_times)
+        if len(key) + 1 <= 2 * max_distance:
+            # Short enough to be close to keys it shares no pairs with
+            shared.update((other, shared.get(other, 0)) for other in self.keys)
+        found = []
+        for other, count in shared.items():
+            # One edit changes at most two letter pairs
+            if abs(len(other) - len(key)) > max_distance or count < max(len(key), len(other)) + 1 - 2 * max_distance:
+                continue
+            d = edit_distance(key, other)
+            if d <= max_distance:
+                found.append((d, other))
+        found.sort()
+        return found
+
+
+class Resolution:
+    """How one OCR read resolved"""
+    __slots__ = ("text", "name", "key", "confidence", "distance", "near")
+
+    def __init__(self, text, name, key, confidence, distance, near=1):
+        self.text = text  # as read
+        self.name = name  # canonical name, or the read text if unresolved
+        self.key = key  # canonical ID: name_key of the canonical name
+        self.confidence = confidence  # 1.0 for an exact match, 0.0 if unresolved
+        self.distance = distance  # edits from the canonical name, None if unresolved
+        self.near = near  # canonical names within the allowed edits (several: ambiguous)
+
+    @property
+    def resolved(self):
+        return self.distance is not None
+
+    def __repr__(self):
+        return f"Resolution({self.text!r} -> {self.name!r}, confidence={self.confidence:.2f})"
+
+
+class SeedNames:
+    def __init__(self, max_edit_ratio=0.25, min_seen=3, memo_size=4096):
+        """
+        Args:
+            max_edit_ratio: edits allowed per character of the read name (at least one)
+            min_seen: times an unresolved name must be read before it becomes canonical
+            memo_size: resolutions remembered by raw text
+        """
+        self.max_edit_ratio = max_edit_ratio
+        self.min_seen = min_seen
+        self.memo_size = memo_size
+        self.names = {}  # key: canonical name
+        self.index = NgramIndex()
+        self.unresolved = Counter()  # read text: times read, since the last report
+        self._pending = Counter()  # key of an unresolved name: times read
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def add(self, name):
+        """Make name canonical; returns its key"""
+        with self._lock:
+            return self._add(name)
+
+    def _add(self, name):
+        name = " ".join(name.split())
+        key = name_key(name)
+        if key and key not in self.names:
+            self.names[key] = name
+            self.index.add(key)
+            self._memo.clear()
+        return key
+
+    def load_file(self, path):
+        """Add the names listed in a seed file, one per line ('#' starts a comment)"""
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                name = line.split("#", 1)[0].strip()
+                if name:
+                    self.add(name)
+
+    def learn(self, counts):
+        """
+        Add names from history, given {name: times seen}. The most seen are
+        added first, so a misread that still resolves to one of them doesn't
+        become canonical itself.
+        """
+        for name, seen in sorted(counts.items(), key=lambda item: -item[1]):
+            if seen >= self.min_seen and not self.resolve(name, count=False).near:
+                self.add(name)
+
+    def max_distance(self, key):
+        return max(1, int(len(key) * self.max_edit_ratio))
+
+    def resolve(self, text, count=True):
+        """The Resolution of an OCR read; count=False doesn't count it toward learning or review"""
+        with self._lock:
+            resolution = self._memo.get(text)
+            if resolution is None:
+                resolution = self._resolve(text)
+                if len(self._memo) >= self.memo_size:
+                    self._memo.clear()
+                self._memo[text] = resolution
+            if count and not resolution.resolved and resolution.key:
+                self.unresolved[resolution.text] += 1
+                # Only a name far from every canonical one can be a new seed
+                if not resolution.near:
+                    self._pending[resolution.key] += 1
+                    if self._pending[resolution.key] >= self.min_seen:
+                        del self._pending[resolution.key]
+                        self._add(resolution.name)
+            return resolution
+
+    def _resolve(self, text):
+        read = " ".join(text.split())
+        key = name_key(read)
+        name = self.names.get(key)
+        if name is not None:
+            return Resolution(read, name, key, 1.0, 0)
+        matches = self.index.search(key, self.max_distance(key)) if key else []
+        # Two names equally close: can't tell which one it is
+        if matches and (len(matches) == 1 or matches[1][0] > matches[0][0]):
+            distance, match = matches[0]
+            confidence = 1.0 - distance / max(len(key), len(match))
+            return Resolution(read, self.names[match], match, confidence, distance, near=len(matches))
+        return Resolution(read, read, key, 0.0, None, near=len(matches))
+
+    def report(self):
+        """Print the names read since the last report that didn't resolve"""
+        with self._lock:
+            unresolved = self.unresolved.most_common()
+            self.unresolved.clear()
+        if not unresolved:
+            return
+        print("\n--- UNRESOLVED SEED NAMES ---")
+        for text, times in unresolved:
+            print(f"  {text!r}: read {times} time(s)")
+        print("  Add the real names to the seed names file if these are seeds")
+
+
+def load_seed_names(path=None, history=(), **kwargs):
+    """SeedNames from an optional seed file and {name: times seen} history"""
+    names = SeedNames(**kwargs)
+    if path:
+        try:
+            names.load_file(path)
+        except FileNotFoundError:
+            pass
+    names.learn(dict(history))
+    return names
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed name canonicalization")
+    parser.add_argument("--db", default="seed_tracking.db", help="tracking database")
+    parser.add_argument("--names", default="seed_names.txt", help="seed names file")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("review", help="show how every name in the history resolves")
+    resolve = sub.add_parser("resolve", help="resolve names as the bot would")
+    resolve.add_argument("text", nargs="+")
+    args = parser.parse_args(argv)
+
+    from tracking import TrackingStore
+    store = TrackingStore(args.db)
+    try:
+        history = store.name_counts()
+    finally:
+        store.close()
+    names = load_seed_names(args.names, history)
+
+    texts = args.text if args.command == "resolve" else sorted(history)
+    from tabulate import tabulate
+    rows = []
+    for text in texts:
+        resolution = names.resolve(text, count=False)
+        rows.append([text, resolution.name if resolution.resolved else "UNRESOLVED",
+                     f"{resolution.confidence:.2f}", history.get(text, "")])
+    print(tabulate(rows, headers=["Read", "Canonical", "Confidence", "Seen"], tablefmt="grid"))
+    print(f"{len(names.names)} canonical names")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Resident OCR service.
+
+pytesseract.image_to_string starts a new tesseract process for every call,
+writes a temp image and parses stdout. OcrPool keeps the engines loaded
+instead: with tesserocr installed, every worker thread holds its own
+in-process Tesseract API per config (psm, whitelist) for the life of the bot.
+Without it, calls still go through pytesseract but batches run on the worker
+threads in parallel, so a seed's name and stock are read at the same time.
+
+OcrCache sits in front of the pool: the same seed names and stock counts are
+on screen every scan, so their crops are hashed and looked up before any OCR
+runs.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:  # Optional: falls back to one tesseract process per call
+    tesserocr = None
+
+
+def parse_config(config):
+    """
+    Turn a tesseract command line config such as '--psm 7 digits' or
+    '--psm 7 -c tessedit_char_whitelist=0123' into (psm, {variable: value}).
+    """
+    psm = 3
+    variables = {}
+    tokens = config.split()
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token == "--psm" and i + 1 < len(tokens):
+            psm = int(tokens[i + 1])
+            i += 1
+        elif token == "-c" and i + 1 < len(tokens):
+            key, _, value = tokens[i + 1].partition("=")
+            variables[key] = value
+            i += 1
+        elif token == "digits":
+            variables.setdefault("tessedit_char_whitelist", "0123456789")
+        i += 1
+    return psm, variables
+
+
+def _to_array(img):
+    if isinstance(img, np.ndarray):
+        return img
+    return np.asarray(img)
+
+
+def _gray(img):
+    """Grayscale array of a crop: NumPy arrays are BGR like the captures, PIL images RGB"""
+    arr = _to_array(img)
+    if arr.ndim == 2:
+        return arr
+    return cv2.cvtColor(arr, cv2.COLOR_BGR2GRAY if isinstance(img, np.ndarray) else cv2.COLOR_RGB2GRAY)
+
+
+class OcrCache:
+    """
+    Bounded LRU cache of OCR results keyed by a hash of the cropped pixels.
+
+    Crops are hashed exactly (blake2b of the raw pixels) unless their config is
+    in perceptual_configs, in which case a difference hash of a downscaled
+    grayscale copy is used so that a pixel or two of noise still hits.
+    """
+
+    def __init__(self, max_entries=2048, path=None, perceptual_configs=(), hash_size=(32, 8)):
+        """
+        Args:
+            max_entries: least recently used entries are evicted beyond this
+            path: JSON file to load from and save to, or None to keep it in memory
+            perceptual_configs: tesseract configs whose crops are keyed by dHash
+            hash_size: (width, height) of the dHash grid
+        """
+        self.max_entries = max_entries
+        self.path = path
+        self.perceptual_configs = set(perceptual_configs)
+        self.hash_size = hash_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def key(self, img, config):
+        arr = _to_array(img)
+        if config in self.perceptual_configs:
+            gray = _gray(img)
+            w, h = self.hash_size
+            small = cv2.resize(gray, (w + 1, h), interpolation=cv2.INTER_AREA)
+            digest = np.packbits(small[:, 1:] > small[:, :-1]).tobytes().hex()
+            return f"{config}|p|{arr.shape[0]}x{arr.shape[1]}|{digest}"
+        arr = np.ascontiguousarray(arr)
+        digest = hashlib.blake2b(arr.tobytes(), digest_size=16)
+        digest.update(repr(arr.shape).encode())
+        return f"{config}|x|{digest.hexdigest()}"
+
+    def get(self, key):
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key, text):
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def load(self, path=None):
+        path = path or self.path
+        try:
+            with open(path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not load OCR cache {path}: {e}")
+            return
+        with self._lock:
+            for key, text in entries[-self.max_entries:]:
+                self._entries[key] = text
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            entries = list(self._entries.items())
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
+
+
+class OcrPool:
+    def __init__(self, workers=2, tessdata=None, lang="eng", cache=None):
+        """
+        Args:
+            workers: number of OCR worker threads (one engine set per thread)
+            tessdata: tessdata folder for the in-process engines; defaults to the
+                      one next to pytesseract's tesseract_cmd
+            lang: tesseract language
+            cache: optional OcrCache consulted before running OCR
+        """
+        self.workers = max(1, int(workers))
+        self.lang = lang
+        self.cache = cache
+        self.tessdata = tessdata or self._default_tessdata()
+        self.in_process = tesserocr is not None
+        self.calls = 0
+        self._local = threading.local()
+        self._apis = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ocr")
+
+    @staticmethod
+    def _default_tessdata():
+        if os.environ.get("TESSDATA_PREFIX"):
+            return None  # tesseract finds it on its own
+        folder = os.path.join(os.path.dirname(pytesseract.pytesseract.tesseract_cmd), "tessdata")
+        return folder if os.path.isdir(folder) else None
+
+    def _api(self, config):
+        """This thread's engine for config, created on first use"""
+        apis = getattr(self._local, "apis", None)
+        if apis is None:
+            apis = self._local.apis = {}
+        api = apis.get(config)
+        if api is None:
+            psm, variables = parse_config(config)
+            kwargs = {"lang": self.lang, "psm": psm}
+            if self.tessdata:
+                kwargs["path"] = self.tessdata
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+            for key, value in variables.items():
+                api.SetVariable(key, value)
+            apis[config] = api
+            with self._lock:
+                self._apis.append(api)
+        return api
+
+    def _read(self, img, config):
+        self.calls += 1
+        if isinstance(img, np.ndarray) and img.ndim == 3:
+            # Crops are BGR like the captures; both Tesseract paths expect RGB
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        if not self.in_process:
+            return pytesseract.image_to_string(img, config=config)
+        api = self._api(config)
+        if isinstance(img, np.ndarray):
+            # Hand the pixels over directly rather than through a PIL image
+            arr = np.ascontiguousarray(img)
+            h, w = arr.shape[:2]
+            channels = 1 if arr.ndim == 2 else arr.shape[2]
+            api.SetImageBytes(arr.tobytes(), w, h, channels, w * channels)
+        else:
+            api.SetImage(img)
+        return api.GetUTF8Text()
+
+    def warm_up(self, configs):
+        """Load an engine for every config on every worker ahead of the first scan"""
+        if not self.in_process:
+            return
+        blank = Image.new("L", (32, 16), 255)
+        jobs = [(blank, config) for config in configs for _ in range(self.workers)]
+        self.read_batch(jobs)
+
+    def read(self, img, config, cache=True):
+        """
+        OCR a single image (PIL image, or NumPy array in BGR order like the
+        captures) with a tesseract config string.
+        Pass cache=False for fields that change every read, like the restock timer.
+        """
+        return self.read_batch([(img, config)], cache=cache)[0]
+
+    def read_batch(self, jobs, cache=True):
+        """OCR a list of (image, config) pairs in parallel, returning texts in order"""
+        texts = [None] * len(jobs)
+        keys = [None] * len(jobs)
+        futures = {}
+        for i, (img, config) in enumerate(jobs):
+            if cache and self.cache is not None:
+                keys[i] = self.cache.key(img, config)
+                texts[i] = self.cache.get(keys[i])
+                if texts[i] is not None:
+                    continue
+            futures[i] = self._executor.submit(self._read, img, config)
+        for i, future in futures.items():
+            texts[i] = future.result()
+            # Empty reads are failures worth retrying, not results
+            if keys[i] is not None and texts[i].strip():
+                self.cache.put(keys[i], texts[i])
+        return texts
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.save()
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for api in self._apis:
+                api.End()
+            self._apis = []
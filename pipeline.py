@@ -0,0 +1,119 @@
+"""
+Pipelined scan scheduler.
+
+The clicking thread captures a page and hands the slow recognition work (OCR)
+to a worker pool, then keeps clicking while that page is still being read.
+Results go into a decision queue that is committed strictly in capture
+order, so seeds are recorded in the order they appear in the list and a
+purchase decision is only ever made from the result of the page it belongs
+to (the clicking thread waits for that page before it buys anything).
+
+Queue depths and stage timings are sampled on every submit so the effect of
+the pipeline can be checked.
+"""
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class ScanPipeline:
+    def __init__(self, workers=1, history=1000):
+        """
+        Args:
+            workers: recognition worker threads
+            history: queue depth and timing samples kept per stage
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(workers)),
+                                            thread_name_prefix="recognize")
+        self._pending = deque()  # (seq, future, on_commit) in capture order
+        self._seq = 0
+        self.depths = {"recognition": deque(maxlen=history), "decision": deque(maxlen=history)}
+        self.timings = {"recognize": deque(maxlen=history), "blocked": deque(maxlen=history)}
+
+    def _timed(self, fn, args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.timings["recognize"].append(time.perf_counter() - start)
+
+    def submit(self, fn, *args, on_commit=None):
+        """
+        Run fn(*args) on a recognition worker. on_commit(result) is called on
+        the clicking thread, in submission order, once the result is committed.
+        Returns a sequence number for wait().
+        """
+        seq = self._seq
+        self._seq += 1
+        future = self._executor.submit(self._timed, fn, args)
+        self._pending.append((seq, future, on_commit))
+        done = sum(1 for _, f, _ in self._pending if f.done())
+        self.depths["recognition"].append(len(self._pending) - done)
+        self.depths["decision"].append(done)
+        return seq
+
+    def _commit_head(self):
+        seq, future, on_commit = self._pending.popleft()
+        if not future.done():
+            start = time.perf_counter()
+            future.result()
+            self.timings["blocked"].append(time.perf_counter() - start)
+        result = future.result()
+        if on_commit is not None:
+            on_commit(result)
+        return seq, result
+
+    def commit_ready(self):
+        """Commit every finished result at the head of the queue without blocking"""
+        while self._pending and self._pending[0][1].done():
+            self._commit_head()
+
+    def wait(self, seq):
+        """Block until seq is recognized, commit it and everything before it, return its result"""
+        while self._pending and self._pending[0][0] <= seq:
+            committed, result = self._commit_head()
+            if committed == seq:
+                return result
+        raise KeyError(f"Result {seq} was already committed")
+
+    def wait_all(self):
+        while self._pending:
+            self._commit_head()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def stats(self):
+        result = {}
+        for stage, samples in self.depths.items():
+            arr = np.fromiter(samples, dtype=np.float64)
+            result[f"{stage}_depth"] = {
+                "mean": float(arr.mean()) if len(arr) else 0.0,
+                "max": int(arr.max()) if len(arr) else 0,
+            }
+        for stage, samples in self.timings.items():
+            arr = np.fromiter(samples, dtype=np.float64)
+            result[f"{stage}_s"] = {
+                "count": len(arr),
+                "total": float(arr.sum()),
+                "mean": float(arr.mean()) if len(arr) else 0.0,
+            }
+        return result
+
+    def report(self):
+        stats = self.stats()
+        print("\n--- SCAN PIPELINE ---")
+        for stage in ("recognition", "decision"):
+            depth = stats[f"{stage}_depth"]
+            print(f"{stage:>12} queue: mean depth {depth['mean']:.2f} | max {depth['max']}")
+        recognize = stats["recognize_s"]
+        blocked = stats["blocked_s"]
+        print(f"{'recognition':>12}: {recognize['count']} pages | mean {recognize['mean'] * 1000:.0f}ms")
+        print(f"{'blocked':>12}: {blocked['count']} waits | {blocked['total']:.2f}s total "
+              f"waiting on recognition")
+
+    def close(self):
+        self.wait_all()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,142 @@
+"""
+In-memory debug recorder.
+
+Captures and crops are kept in a bounded ring buffer instead of being written
+to disk as they are taken, so capturing costs no PNG encoding. The buffer is
+written out on a background thread when something goes wrong (no rarity box,
+unreadable stock, a purchase that didn't go through) or when asked, so the
+frames leading up to a problem are still there to look at. Only the last
+max_files written are kept on disk, so the folder stays bounded however long
+the bot runs.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+def _image_bytes(img):
+    if isinstance(img, np.ndarray):
+        return img.nbytes
+    return img.width * img.height * len(img.getbands())
+
+
+def _write_image(path, img):
+    if isinstance(img, np.ndarray):
+        cv2.imwrite(path, img)
+    else:
+        img.save(path)
+
+
+class DebugRecorder:
+    def __init__(self, folder="debug", max_frames=100, max_bytes=128 * 1024 * 1024, write_all=False,
+                 max_files=1000):
+        """
+        Args:
+            folder: where frames are written when the buffer is flushed
+            max_frames: frames and crops kept in memory
+            max_bytes: memory cap for the kept frames (oldest are dropped first)
+            write_all: write every frame as it is added (still off the calling thread)
+            max_files: files kept in folder (the oldest written are deleted first)
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.write_all = write_all
+        self.max_files = max_files
+        self._files = OrderedDict()  # paths written, oldest first (writer thread only)
+        self._frames = deque(maxlen=max(1, int(max_frames)))  # (seq, filename, img, size)
+        self._bytes = 0
+        self._seq = 0
+        self._written_seq = -1  # frames up to this seq have been queued for writing
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="debug")
+        self._pending = []
+        self.anomalies = []
+
+    def add(self, filename, img):
+        """
+        Keep img (a PIL image or array) under filename. Arrays are copied,
+        since captures are pooled buffers and crops are views into them;
+        images are not.
+        """
+        if img is None:
+            return
+        with self._lock:
+            evicted = None
+            if len(self._frames) == self._frames.maxlen:
+                evicted = self._frames[0]
+                self._bytes -= evicted[3]
+            if isinstance(img, np.ndarray):
+                img = self._copy(img, evicted)
+            size = _image_bytes(img)
+            self._frames.append((self._seq, filename, img, size))
+            self._seq += 1
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._frames) > 1:
+                self._bytes -= self._frames.popleft()[3]
+        if self.write_all:
+            self.flush()
+
+    def _copy(self, img, evicted):
+        """Copy img, into the array of the frame being dropped if it was never queued for writing"""
+        if evicted is not None:
+            seq, _, old, _ = evicted
+            if seq > self._written_seq and isinstance(old, np.ndarray) and \
+                    old.shape == img.shape and old.dtype == img.dtype:
+                np.copyto(old, img)
+                return old
+        return img.copy()
+
+    def flush(self, reason=None):
+        """
+        Write the buffered frames that haven't been written yet on the
+        background thread. Returns how many frames were queued.
+        """
+        with self._lock:
+            frames = [(filename, img) for seq, filename, img, size in self._frames
+                      if seq > self._written_seq]
+            self._written_seq = self._seq - 1
+        if reason:
+            self.anomalies.append((time.time(), reason))
+            print(f"Debug: {reason}, writing {len(frames)} buffered frames to {self.folder}/")
+        if frames:
+            self._pending = [f for f in self._pending if not f.done()]
+            self._pending.append(self._writer.submit(self._write, frames))
+        return len(frames)
+
+    def _write(self, frames):
+        os.makedirs(self.folder, exist_ok=True)
+        for filename, img in frames:
+            path = os.path.join(self.folder, filename)
+            try:
+                _write_image(path, img)
+            except Exception as e:
+                print(f"Error writing debug image {filename}: {e}")
+                continue
+            self._files[path] = None
+            self._files.move_to_end(path)
+        while len(self._files) > self.max_files:
+            path, _ = self._files.popitem(last=False)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def wait(self):
+        """Block until every queued write has finished"""
+        for future in self._pending:
+            future.result()
+        self._pending = []
+
+    def stats(self):
+        with self._lock:
+            return {"frames": len(self._frames), "bytes": self._bytes,
+                    "anomalies": len(self.anomalies)}
+
+    def close(self):
+        self.wait()
+        self._writer.shutdown(wait=True)
@@ -0,0 +1,172 @@
+"""
+Scan state machine.
+
+The single-entry scan walks the list one seed at a time: select a row, read
+it, buy it, close it, and scroll back up at the end. Each of those is a state
+of ScanMachine, which runs the handler of the current state until one returns
+None. Progress is only written to the Checkpoint once the screen confirms it
+(a row read, seeds bought), so when a state fails (nothing recognizable on
+screen, an exception, or the Watchdog finding it ran too long) the recovery
+handler can work out where the list is from one capture and resume from the
+next unconfirmed row, instead of starting the scan over.
+"""
+import time
+import traceback
+from collections import defaultdict
+
+SELECTING = "selecting"
+READING = "reading"
+BUYING = "buying"
+CLOSING = "closing"
+SCROLLING = "scrolling"
+STATES = (SELECTING, READING, BUYING, CLOSING, SCROLLING)
+
+
+class LostPosition(Exception):
+    """The screen doesn't show what the scan expected at this point"""
+
+
+class StateTimeout(Exception):
+    """A state ran longer than the watchdog allows"""
+
+
+class Checkpoint:
+    """What the scan has confirmed so far"""
+
+    def __init__(self):
+        self.rows = []  # seed id of every row read, in list order
+        self.top = 0  # row in the first slot of the list
+        self.selected = None  # row the last selection went to
+        self.purchase = None  # [row, seed id, seeds bought] of a purchase not finished yet
+        self.done = False  # every row has been read
+
+    @property
+    def row(self):
+        """Last row read, -1 before the first"""
+        return len(self.rows) - 1
+
+    def next_row(self):
+        """Row to select next: the one being bought from if a purchase was cut short"""
+        if self.purchase is not None:
+            return self.purchase[0]
+        return len(self.rows)
+
+    def position(self, seed):
+        """Row of a seed id read this scan, or None"""
+        for row in range(len(self.rows) - 1, -1, -1):
+            if self.rows[row] == seed:
+                return row
+        return None
+
+
+class Watchdog:
+    """
+    Bounds how long each state may run. check() is called between the
+    steps of a state (before every click) and raises StateTimeout once the
+    current state is over its limit.
+    """
+
+    def __init__(self, limits, clock=time.monotonic):
+        """
+        Args:
+            limits: {state: seconds}; states not listed run unbounded
+        """
+        self.limits = limits
+        self.clock = clock
+        self.state = None
+        self.started = None
+        self.durations = defaultdict(list)  # state: seconds of every run
+        self.timeouts = defaultdict(int)
+
+    def enter(self, state):
+        self.leave()
+        self.state = state
+        self.started = self.clock()
+
+    def leave(self):
+        if self.state is not None:
+            self.durations[self.state].append(self.clock() - self.started)
+            self.state = None
+
+    def check(self):
+        if self.state is None:
+            return
+        limit = self.limits.get(self.state)
+        elapsed = self.clock() - self.started
+        if limit is not None and elapsed > limit:
+            self.timeouts[self.state] += 1
+            raise StateTimeout(f"{self.state} took over {limit:.1f}s")
+
+
+class ScanMachine:
+    def __init__(self, handlers, recover, watchdog, max_recoveries=3, progress=None):
+        """
+        Args:
+            handlers: {state: handler()}; a handler does the state's work and
+                      returns the next state, or None when the scan is done
+            recover: recover(state, error) -> state to resume from, or None to
+                     stop; called when a handler raises
+            watchdog: Watchdog timing the states
+            max_recoveries: failures in a row tolerated before giving up
+            progress: progress() -> a value that changes whenever the scan
+                      gets further; failures only count as in a row while it
+                      stays the same (None: every failure counts)
+        """
+        self.handlers = handlers
+        self.recover = recover
+        self.watchdog = watchdog
+        self.max_recoveries = max_recoveries
+        self.progress = progress or (lambda: None)
+        self.recoveries = 0
+        self.failures = 0  # in a row, without progress
+        self._progress_at_failure = None
+
+    def run(self, state=SELECTING):
+        """Run until a handler returns None; returns False if the scan was given up"""
+        try:
+            while state is not None:
+                self.watchdog.enter(state)
+                try:
+                    next_state = self.handlers[state]()
+                    self.watchdog.check()
+                except Exception as e:
+                    self.watchdog.leave()
+                    next_state = self._recover(state, e)
+                    if next_state is False:
+                        return False
+                state = next_state
+            return True
+        finally:
+            self.watchdog.leave()
+
+    def _recover(self, state, error):
+        """The state to resume from after error, None when done, or False to give up"""
+        while True:
+            self.recoveries += 1
+            progress = self.progress()
+            if progress != self._progress_at_failure:
+                self.failures = 0
+                self._progress_at_failure = progress
+            self.failures += 1
+            if not isinstance(error, (LostPosition, StateTimeout)):
+                traceback.print_exception(type(error), error, error.__traceback__)
+            if self.failures > self.max_recoveries:
+                print(f"Giving up the scan after {self.max_recoveries} failed recoveries ({error}).")
+                return False
+            print(f"Scan failed while {state}: {error}")
+            try:
+                return self.recover(state, error)
+            except Exception as e:
+                error = e
+
+    def report(self):
+        durations = self.watchdog.durations
+        if not durations:
+            return
+        print("\n--- SCAN STATES ---")
+        for state in STATES:
+            if state in durations:
+                runs = durations[state]
+                print(f"{state:>12}: {len(runs):5d} runs | max {max(runs) * 1000:7.1f}ms | "
+                      f"{self.watchdog.timeouts[state]} timeouts")
+        print(f"  {self.recoveries} recoveries")
@@ -0,0 +1,105 @@
+"""
+Restock scheduler.
+
+Instead of reading the restock timer once and sleeping that long plus a
+safety buffer, the timer is read several times and every reading is turned
+into a deadline on the monotonic clock. Readings that disagree with the rest
+(OCR misreads) are dropped. The scheduler sleeps until shortly before the
+deadline, lets the bot warm up, then watches the timer region: it only
+re-reads the timer when its pixels change, and fires as soon as the timer
+jumps back up, i.e. the shop has restocked.
+"""
+import time
+
+import numpy as np
+
+
+class RestockScheduler:
+    def __init__(self, read_timer, capture, samples=5, sample_interval=0.25, tolerance=1.5,
+                 prewarm_lead=3.0, poll_interval=0.1, late_limit=10.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        """
+        Args:
+            read_timer: read_timer(img) -> seconds left on the restock timer, or None
+            capture: capture() -> image of the restock timer region
+            samples: timer readings taken to estimate the deadline
+            sample_interval: seconds between readings
+            tolerance: seconds a reading may disagree with the others and still count
+            prewarm_lead: wake up this many seconds before the deadline
+            poll_interval: seconds between checks of the timer around the deadline
+            late_limit: give up waiting for the timer this long after the deadline
+        """
+        self.read_timer = read_timer
+        self.capture = capture
+        self.samples = samples
+        self.sample_interval = sample_interval
+        self.tolerance = tolerance
+        self.prewarm_lead = prewarm_lead
+        self.poll_interval = poll_interval
+        self.late_limit = late_limit
+        self.clock = clock
+        self.sleep = sleep
+        self.readings = []  # (monotonic time, seconds left) of the last estimate
+        self.rejected = 0
+
+    def estimate(self):
+        """
+        Read the timer samples times and return the restock deadline on the
+        monotonic clock, or None if the readings don't agree.
+        """
+        self.readings = []
+        for i in range(self.samples):
+            if i:
+                self.sleep(self.sample_interval)
+            now = self.clock()
+            seconds = self.read_timer(self.capture())
+            if seconds is not None:
+                self.readings.append((now, seconds))
+        if not self.readings:
+            return None
+        deadlines = np.array([now + seconds for now, seconds in self.readings], dtype=float)
+        median = np.median(deadlines)
+        inliers = deadlines[np.abs(deadlines - median) <= self.tolerance]
+        self.rejected = len(deadlines) - len(inliers)
+        if len(inliers) <= len(deadlines) // 2:
+            return None
+        return float(np.median(inliers))
+
+    def seconds_left(self, deadline):
+        return deadline - self.clock()
+
+    def wait(self, deadline, prewarm=None, progress=None):
+        """
+        Sleep until the restock. prewarm() is called prewarm_lead seconds
+        before the deadline, progress(seconds_left) about every 30s while
+        sleeping. Returns "restocked" when the timer was seen to reset, or
+        "late" if it wasn't by late_limit seconds after the deadline.
+        """
+        last_report = None
+        while True:
+            left = self.seconds_left(deadline) - self.prewarm_lead
+            if left <= 0:
+                break
+            if progress and (last_report is None or last_report - left >= 30):
+                progress(self.seconds_left(deadline))
+                last_report = left
+            self.sleep(min(left, 1.0))
+
+        if prewarm:
+            prewarm()
+
+        previous = None
+        while True:
+            left = self.seconds_left(deadline)
+            if left < -self.late_limit:
+                return "late"
+            img = np.asarray(self.capture())
+            if previous is None or img.shape != previous.shape or \
+                    np.abs(img.astype(np.int16) - previous).mean() > 1.0:
+                previous = img.astype(np.int16)
+                seconds = self.read_timer(img)
+                # The timer started over: around the deadline it shows more time than was left
+                if seconds is not None and left <= self.tolerance and \
+                        seconds > max(left, 0) + self.tolerance + 1:
+                    return "restocked"
+            self.sleep(self.poll_interval)
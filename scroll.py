@@ -0,0 +1,136 @@
+"""
+Scroll position tracking.
+
+The shop list is only ever moved by clicks, so instead of assuming how far a
+click moved it, consecutive captures of the list are registered against each
+other: the vertical shift that lines their pixels up is how far the list
+scrolled. The top strip of one capture is searched for in the other, both
+ways round, on half resolution grayscale, and the best match is refined at
+full resolution. Phase correlation was tried first, but every row of the list
+looks alike, so its peak often lands a row or two off; a strip holding a
+whole row's name and icon only matches where that row really is.
+
+ScrollTracker adds the shifts up into an offset from the top of the list,
+which tells how many scroll clicks get back to the top, and notices when a
+move that should have scrolled the list didn't (the end of the list).
+"""
+import cv2
+import numpy as np
+
+
+def _gray(img):
+    return img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+def _shrink(gray, shrink):
+    return cv2.resize(gray, None, fx=1.0 / shrink, fy=1.0 / shrink,
+                      interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def _strip_match(a, b, n):
+    """(shift, rms difference) of the best place for the top n rows of b in a"""
+    scores = cv2.matchTemplate(a, b[:n], cv2.TM_SQDIFF)[:, 0]
+    y = int(scores.argmin())
+    return y, float(np.sqrt(max(scores[y], 0.0) / b[:n].size))
+
+
+def vertical_shift(prev, curr, strip=0.3, shrink=2, max_cost=6.0):
+    """
+    Pixels the content moved up from prev to curr (positive when the list
+    scrolled down), or None if the two captures don't line up within
+    max_cost gray levels. Shifts larger than (1 - strip) of the height can't
+    be measured.
+    """
+    if prev is None or curr is None or prev.shape != curr.shape:
+        return None
+    gray_prev, gray_curr = _gray(prev), _gray(curr)
+    a, b = _shrink(gray_prev, shrink), _shrink(gray_curr, shrink)
+    n = max(1, int(a.shape[0] * strip))
+    down, down_cost = _strip_match(a, b, n)
+    up, up_cost = _strip_match(b, a, n)
+    coarse = down * shrink if down_cost <= up_cost else -up * shrink
+
+    # Refine at full resolution around the coarse shift
+    h = gray_prev.shape[0]
+    n = int(h * strip)
+    top_prev = gray_prev[:n].astype(np.int16)
+    top_curr = gray_curr[:n].astype(np.int16)
+    best = None
+    for shift in range(coarse - shrink, coarse + shrink + 1):
+        if shift >= 0 and shift + n <= h:
+            cost = float(np.abs(gray_prev[shift:shift + n].astype(np.int16) - top_curr).mean())
+        elif shift < 0 and n - shift <= h:
+            cost = float(np.abs(top_prev - gray_curr[-shift:n - shift].astype(np.int16)).mean())
+        else:
+            continue
+        if best is None or cost < best[0]:
+            best = (cost, shift)
+    if best is None or best[0] > max_cost:
+        return None
+    return best[1]
+
+
+def row_pitch(centers, default):
+    """Median distance between consecutive rarity box centers (y), or default"""
+    ys = sorted(y for _, y in centers)
+    if len(ys) < 2:
+        return default
+    return float(np.median(np.diff(ys)))
+
+
+class ScrollTracker:
+    def __init__(self, pitch, viewport_top=0):
+        """
+        Args:
+            pitch: pixels from one row of the list to the next, until measured
+            viewport_top: first row of the captures that belongs to the
+                          scrolling list (anything above it stays put)
+        """
+        self.pitch = pitch
+        self.viewport_top = viewport_top
+        self.offset = 0.0  # pixels scrolled down from the top
+        self.known = True
+        self.top_frame = None
+        self.previous = None
+        self.last_shift = None
+
+    def _viewport(self, frame):
+        return frame[self.viewport_top:].copy()
+
+    def reset(self, frame):
+        """The list is at the top, showing frame"""
+        self.offset = 0.0
+        self.known = True
+        self.top_frame = self.previous = self._viewport(frame)
+        self.last_shift = None
+
+    def measure_pitch(self, centers):
+        self.pitch = row_pitch(centers, self.pitch)
+
+    def update(self, frame):
+        """Register a new capture of the list; returns the shift from the last one, or None"""
+        viewport = self._viewport(frame)
+        shift = vertical_shift(self.previous, viewport)
+        if shift is None:
+            self.known = False  # lost track: scroll all the way to be sure
+        else:
+            self.offset = max(0.0, self.offset + shift)
+        self.previous = viewport
+        self.last_shift = shift
+        return shift
+
+    def rows(self):
+        """Rows scrolled down from the top, or None if the position is lost"""
+        if not self.known:
+            return None
+        return int(round(self.offset / self.pitch))
+
+    def stalled(self, expected_rows):
+        """True if the last move should have scrolled expected_rows rows but the list stopped short"""
+        if self.last_shift is None or expected_rows <= 0:
+            return False
+        return self.last_shift < (expected_rows - 0.5) * self.pitch
+
+    def at_top(self, frame):
+        """True if frame shows the list where it was at the last reset"""
+        return self.top_frame is not None and vertical_shift(self.top_frame, self._viewport(frame)) == 0
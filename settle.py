@@ -0,0 +1,93 @@
+"""
+Adaptive "UI settled" waits.
+
+Instead of sleeping a fixed time after every click, SettleWaiter polls a small
+capture region and returns as soon as consecutive frames stop changing (the
+UI has finished animating), or when the timeout runs out. Every wait is
+logged per label so the observed settle times can be reviewed.
+"""
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+
+
+class SettleWaiter:
+    def __init__(self, capture, region, min_wait=0.05, stable_time=0.08, timeout=1.5,
+                 poll_interval=0.02, threshold=1.0, history=500):
+        """
+        Args:
+            capture: function taking a region (x, y, w, h) and returning a BGR array or a PIL image
+            region: default region to watch
+            min_wait: always wait this long first, so the UI has time to react
+            stable_time: frames must stay unchanged for this long to count as settled
+            timeout: give up waiting after this many seconds
+            poll_interval: pause between captures
+            threshold: mean absolute gray-level difference still counted as unchanged
+            history: settle times kept per label
+        """
+        self.capture = capture
+        self.region = region
+        self.min_wait = min_wait
+        self.stable_time = stable_time
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.threshold = threshold
+        self.times = defaultdict(lambda: deque(maxlen=history))
+        self.timeouts = defaultdict(int)
+
+    def _grab(self, region):
+        # Half resolution grayscale is plenty to see movement
+        frame = self.capture(region)
+        if isinstance(frame, np.ndarray):
+            # Green follows brightness closely enough, and skips a color conversion
+            return frame[::2, ::2, 1].astype(np.int16)
+        return np.asarray(frame.convert("L"), dtype=np.int16)[::2, ::2]
+
+    def wait(self, label="ui", region=None, timeout=None):
+        """Block until the region stops changing; returns the seconds waited"""
+        region = region or self.region
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        time.sleep(self.min_wait)
+        previous = self._grab(region)
+        stable_since = time.perf_counter()
+        while True:
+            now = time.perf_counter()
+            if now - stable_since >= self.stable_time:
+                break
+            if now - start >= timeout:
+                self.timeouts[label] += 1
+                break
+            time.sleep(self.poll_interval)
+            frame = self._grab(region)
+            if np.abs(frame - previous).mean() > self.threshold:
+                stable_since = time.perf_counter()
+            previous = frame
+        waited = time.perf_counter() - start
+        self.times[label].append(waited)
+        return waited
+
+    def stats(self):
+        """{label: {count, median, p95, max, timeouts}} of the logged settle times"""
+        result = {}
+        for label, times in self.times.items():
+            arr = np.fromiter(times, dtype=np.float64)
+            result[label] = {
+                "count": len(arr),
+                "median": float(np.median(arr)),
+                "p95": float(np.percentile(arr, 95)),
+                "max": float(arr.max()),
+                "timeouts": self.timeouts[label],
+            }
+        return result
+
+    def report(self):
+        stats = self.stats()
+        if not stats:
+            return
+        print("\n--- UI SETTLE TIMES ---")
+        for label, s in sorted(stats.items()):
+            print(f"{label:>12}: {s['count']:4d} waits | median {s['median'] * 1000:4.0f}ms | "
+                  f"p95 {s['p95'] * 1000:4.0f}ms | max {s['max'] * 1000:4.0f}ms | "
+                  f"{s['timeouts']} timeouts")
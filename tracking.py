@@ -0,0 +1,270 @@
+"""
+Append-only tracking store.
+
+Every seed seen in stock and every purchase is appended once to a SQLite
+database in WAL mode; nothing is ever rewritten. Per-seed totals live in
+aggregate tables that are updated in the same transaction as the rows they
+summarize, so reports cost O(distinct seeds) no matter how long the bot has
+been running. In the bot itself, rows are Observation and Purchase records
+with epoch timestamps, and SeedTotals keeps the same per-seed totals in
+memory, updated as each record is made. The CSV files the bot used to rewrite after every scan are
+produced on demand from the database:
+
+    python -m tracking export            # writes the five CSV files
+    python -m tracking summary           # prints the aggregate tables
+"""
+import argparse
+import datetime
+import os
+import sqlite3
+import sys
+from collections import defaultdict
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    name TEXT NOT NULL,
+    rarity TEXT NOT NULL,
+    stock INTEGER
+);
+CREATE TABLE IF NOT EXISTS purchases (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    name TEXT NOT NULL,
+    rarity TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stock_totals (
+    name TEXT NOT NULL,
+    rarity TEXT NOT NULL,
+    stock INTEGER NOT NULL DEFAULT 0,
+    observations INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, rarity)
+);
+CREATE TABLE IF NOT EXISTS purchase_totals (
+    name TEXT NOT NULL,
+    rarity TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, rarity)
+);
+"""
+
+
+def format_timestamp(timestamp):
+    """Epoch seconds as the local time string used in the CSV files"""
+    if isinstance(timestamp, str):
+        return timestamp  # rows written before timestamps were stored as epoch seconds
+    return datetime.datetime.fromtimestamp(timestamp).strftime(TIMESTAMP_FORMAT)
+
+
+class Observation:
+    """One seed seen in the shop"""
+    __slots__ = ("timestamp", "name", "rarity", "stock")
+
+    def __init__(self, timestamp, name, rarity, stock):
+        self.timestamp = timestamp
+        self.name = name
+        self.rarity = rarity
+        self.stock = stock
+
+    def row(self):
+        return (self.timestamp, self.name, self.rarity, self.stock)
+
+
+class Purchase:
+    """One seed bought"""
+    __slots__ = ("timestamp", "name", "rarity")
+
+    def __init__(self, timestamp, name, rarity):
+        self.timestamp = timestamp
+        self.name = name
+        self.rarity = rarity
+
+    def row(self):
+        return (self.timestamp, self.name, self.rarity)
+
+
+class SeedTotals:
+    """
+    Running stock and purchase totals per (name, rarity). Names and rarities
+    are interned and every record updates one counter, so a report costs
+    O(distinct seeds) however many records have been added.
+    """
+
+    def __init__(self):
+        self._keys = {}
+        self.stock = defaultdict(int)
+        self.purchased = defaultdict(int)
+
+    def key(self, name, rarity):
+        """The shared (name, rarity) key, so records of the same seed share strings"""
+        key = self._keys.get((name, rarity))
+        if key is None:
+            key = (sys.intern(name), sys.intern(rarity))
+            self._keys[key] = key
+        return key
+
+    def observation(self, timestamp, name, rarity, stock):
+        """Make an Observation and count it"""
+        name, rarity = self.key(name, rarity)
+        self.stock[(name, rarity)] += stock if stock is not None else 0
+        return Observation(timestamp, name, rarity, stock)
+
+    def retract(self, observation):
+        """Take back an Observation made by observation() that won't be kept"""
+        self.stock[(observation.name, observation.rarity)] -= observation.stock if observation.stock is not None else 0
+
+    def purchase(self, timestamp, name, rarity):
+        """Make a Purchase and count it"""
+        name, rarity = self.key(name, rarity)
+        self.purchased[(name, rarity)] += 1
+        return Purchase(timestamp, name, rarity)
+
+    def load(self, stock_totals, purchase_totals):
+        """Start from [name, rarity, total] rows, e.g. the tracking store's totals"""
+        for name, rarity, total in stock_totals:
+            self.stock[self.key(name, rarity)] += total
+        for name, rarity, count in purchase_totals:
+            self.purchased[self.key(name, rarity)] += count
+
+    def _rows(self, counts):
+        return [[name, rarity, count]
+                for (name, rarity), count in sorted(counts.items(), key=lambda item: (item[0][1], item[0][0]))]
+
+    def stock_rows(self):
+        """[[name, rarity, total stock]] sorted by rarity and name"""
+        return self._rows(self.stock)
+
+    def purchase_rows(self):
+        """[[name, rarity, count]] sorted by rarity and name"""
+        return self._rows(self.purchased)
+
+
+class TrackingStore:
+    def __init__(self, path="seed_tracking.db"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def append(self, observations=(), purchases=()):
+        """
+        Append Observation and Purchase records, updating the totals in the
+        same transaction.
+        """
+        observations = [record.row() for record in observations]
+        purchases = [record.row() for record in purchases]
+        if not observations and not purchases:
+            return
+        stock_delta = defaultdict(lambda: [0, 0])
+        for _, name, rarity, stock in observations:
+            delta = stock_delta[(name, rarity)]
+            delta[0] += stock if stock is not None else 0
+            delta[1] += 1
+        purchase_delta = defaultdict(int)
+        for _, name, rarity in purchases:
+            purchase_delta[(name, rarity)] += 1
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO observations (timestamp, name, rarity, stock) VALUES (?, ?, ?, ?)",
+                observations)
+            self.conn.executemany(
+                "INSERT INTO purchases (timestamp, name, rarity) VALUES (?, ?, ?)",
+                purchases)
+            self.conn.executemany(
+                "INSERT INTO stock_totals (name, rarity, stock, observations) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name, rarity) DO UPDATE SET "
+                "stock = stock + excluded.stock, observations = observations + excluded.observations",
+                [(name, rarity, stock, count) for (name, rarity), (stock, count) in stock_delta.items()])
+            self.conn.executemany(
+                "INSERT INTO purchase_totals (name, rarity, count) VALUES (?, ?, ?) "
+                "ON CONFLICT(name, rarity) DO UPDATE SET count = count + excluded.count",
+                [(name, rarity, count) for (name, rarity), count in purchase_delta.items()])
+
+    def stock_totals(self):
+        """[[name, rarity, total stock]] sorted by rarity and name, like aggregate_seeds"""
+        rows = self.conn.execute(
+            "SELECT name, rarity, stock FROM stock_totals ORDER BY rarity, name")
+        return [list(row) for row in rows]
+
+    def purchase_totals(self):
+        """[[name, rarity, count]] sorted by rarity and name, like aggregate_seeds"""
+        rows = self.conn.execute(
+            "SELECT name, rarity, count FROM purchase_totals ORDER BY rarity, name")
+        return [list(row) for row in rows]
+
+    def name_counts(self):
+        """{name: times seen in stock}, over all rarities"""
+        rows = self.conn.execute(
+            "SELECT name, SUM(observations) FROM stock_totals GROUP BY name")
+        return {name: count for name, count in rows}
+
+    def export_csv(self, folder="."):
+        """Write the raw, aggregated and combined CSV files, streaming rows from the database"""
+        def path(filename):
+            return os.path.join(folder, filename)
+
+        observations = "SELECT timestamp, name, rarity, stock FROM observations ORDER BY id"
+        purchases = "SELECT timestamp, name, rarity FROM purchases ORDER BY id"
+
+        with open(path("seeds_in_stock_raw.csv"), "w") as f:
+            f.write("Timestamp,Name,Rarity,Stock\n")
+            for timestamp, name, rarity, stock in self.conn.execute(observations):
+                f.write(f"{format_timestamp(timestamp)},\"{name}\",{rarity},{stock}\n")
+
+        with open(path("seeds_purchased_raw.csv"), "w") as f:
+            f.write("Timestamp,Name,Rarity\n")
+            for timestamp, name, rarity in self.conn.execute(purchases):
+                f.write(f"{format_timestamp(timestamp)},\"{name}\",{rarity}\n")
+
+        with open(path("seeds_in_stock_aggregated.csv"), "w") as f:
+            f.write("Name,Rarity,Stock\n")
+            for name, rarity, stock in self.stock_totals():
+                f.write(f"\"{name}\",{rarity},{stock}\n")
+
+        with open(path("seeds_purchased_aggregated.csv"), "w") as f:
+            f.write("Name,Rarity,Count\n")
+            for name, rarity, count in self.purchase_totals():
+                f.write(f"\"{name}\",{rarity},{count}\n")
+
+        with open(path("all_seed_data.csv"), "w") as f:
+            f.write("Type,Timestamp,Name,Rarity,Stock/Count\n")
+            for timestamp, name, rarity, stock in self.conn.execute(observations):
+                stock = stock if stock is not None else 0
+                f.write(f"In_Stock,{format_timestamp(timestamp)},\"{name}\",{rarity},{stock}\n")
+            for timestamp, name, rarity in self.conn.execute(purchases):
+                f.write(f"Purchased,{format_timestamp(timestamp)},\"{name}\",{rarity},1\n")
+
+    def close(self):
+        self.conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed tracking database")
+    parser.add_argument("--db", default="seed_tracking.db", help="tracking database")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="write the CSV files")
+    export.add_argument("--folder", default=".", help="folder to write the CSV files to")
+    sub.add_parser("summary", help="print the aggregate tables")
+    args = parser.parse_args(argv)
+
+    store = TrackingStore(args.db)
+    try:
+        if args.command == "export":
+            store.export_csv(args.folder)
+            print(f"Exported tracking data from {args.db} to {args.folder}")
+        else:
+            from tabulate import tabulate
+            print(tabulate(store.stock_totals(), headers=["Name", "Rarity", "Stock"], tablefmt="grid"))
+            print(tabulate(store.purchase_totals(), headers=["Name", "Rarity", "Count"], tablefmt="grid"))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()